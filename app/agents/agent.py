@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import re
-from typing import Dict
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
 
-from .schemas import AgentResponse, AgentResult
-from .tools import Tool
+from .schemas import AgentBatchItem, AgentResponse, AgentResult
+from .tools import AsyncTool, BatchTool, StreamTool, Tool
 
 _DIGIT_CHARS = set("0123456789")
 _OP_CHARS = set("+-*/()")
@@ -17,6 +21,8 @@ TOOL_ALIASES = {
     "echo": "echo",
     "ping": "ping",
     "rag": "rag_search",
+    "hybrid": "rag_hybrid",
+    "rag_hybrid": "rag_hybrid",
     "rag_answer": "rag_answer",
 }
 
@@ -24,44 +30,183 @@ TOOL_ALIASES = {
 class Agent:
     """
     Minimal agent
-      - decide_tool: naive rule-based planner
+      - decide_tool: naive rule-based planner; plan adds the tool's payload
       - run: execute tool, append to history, return structured response
+      - history keeps the last history_size results (oldest dropped first)
+      - arun: same, awaiting async_tools implementations (e.g. rag_answer) when present
+      - astream: arun as events, forwarding tokens from stream_tools when present
+      - arun_batch: many texts at once; async (I/O-bound) tools run concurrently,
+        batch_tools (e.g. calculator) take all their payloads in one call
     """
 
-    def __init__(self, tools: Dict[str, Tool]) -> None:
+    def __init__(
+        self,
+        tools: Dict[str, Tool],
+        async_tools: Optional[Dict[str, AsyncTool]] = None,
+        stream_tools: Optional[Dict[str, StreamTool]] = None,
+        history_size: int = 10,
+        batch_tools: Optional[Dict[str, BatchTool]] = None,
+    ) -> None:
         self.tools = tools
-        self.history: list[AgentResult] = []
-        self._last_payload = ""
+        self.async_tools = async_tools or {}
+        self.stream_tools = stream_tools or {}
+        self.batch_tools = batch_tools or {}
+        self.history: Deque[AgentResult] = deque(maxlen=max(1, history_size))
 
     def decide_tool(self, text: str) -> str:
         t = text.strip()
         if ":" in t:
-            alias, payload = t.split(":", 1)
-            alias = alias.strip().lower()
+            alias = t.split(":", 1)[0].strip().lower()
             tool_name = TOOL_ALIASES.get(alias)
             if tool_name and tool_name in self.tools:
-                self._last_payload = payload.strip()
                 return tool_name
         if t.lower() == "ping":
-            self._last_payload = ""
             return "ping"
         if MATH_RE.match(t) or any((ch in _DIGIT_CHARS) or (ch in _OP_CHARS) for ch in t):
-            self._last_payload = t
             return "calculator"
-        self._last_payload = t
         return "echo"
 
-    def run(self, text: str) -> AgentResponse:
+    def plan(self, text: str) -> Tuple[str, str]:
+        """(tool name, payload): the text after an alias prefix, "" for ping, else the text."""
         tool_name = self.decide_tool(text)
+        t = text.strip()
+        if ":" in t:
+            alias, payload = t.split(":", 1)
+            if TOOL_ALIASES.get(alias.strip().lower()) == tool_name:
+                return tool_name, payload.strip()
+        if tool_name == "ping" and t.lower() == "ping":
+            return tool_name, ""
+        return tool_name, t
+
+    @property
+    def history_bytes(self) -> int:
+        """Approximate size of the kept history (characters of tool names and outputs)."""
+        return sum(len(r.tool) + len(r.output) for r in self.history)
+
+    def run(self, text: str) -> AgentResponse:
+        tool_name, payload = self.plan(text)
         tool = self.tools.get(tool_name)
         if not tool:
-            result = AgentResult(tool="none", output="no_suitable_tool")
-            self.history.append(result)
-            return AgentResponse(tool=result.tool, output=result.output, history=self.history[-10:])
+            return self._record("none", "no_suitable_tool")
+        try:
+            output = tool(payload)
+        except Exception as e:
+            output = f"tool_error: {type(e).__name__}"
+        return self._record(tool_name, output)
+
+    async def arun(self, text: str) -> AgentResponse:
+        tool_name, payload = self.plan(text)
+        atool = self.async_tools.get(tool_name) if tool_name in self.tools else None
+        if atool is None:
+            # cheap tools (calculator, echo, ping) run inline
+            return self.run(text)
         try:
-            output = tool(self._last_payload)
+            output = await atool(payload)
         except Exception as e:
             output = f"tool_error: {type(e).__name__}"
-        result = AgentResult(tool=tool_name, output=output)
-        self.history.append(result)
-        return AgentResponse(tool=tool_name, output=output, history=self.history[-10:])
+        return self._record(tool_name, output)
+
+    async def astream(self, text: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields ("token", {"text"}) events while a streaming tool generates, then
+        ("result", {"tool", "output", ...}) with the recorded output; streaming
+        tools add their final fields (e.g. confidence, sources).
+        """
+        tool_name, payload = self.plan(text)
+        stool = self.stream_tools.get(tool_name) if tool_name in self.tools else None
+        if stool is None:
+            resp = await self.arun(text)
+            yield "result", {"tool": resp.tool, "output": resp.output}
+            return
+        final: Dict[str, Any] = {}
+        try:
+            async for event, data in stool(payload):
+                if event == "token":
+                    yield event, data
+                else:
+                    final = data
+            output = json.dumps({k: final[k] for k in ("answer", "sources") if k in final})
+        except Exception as e:
+            output, final = f"tool_error: {type(e).__name__}", {}
+        self._record(tool_name, output)
+        yield "result", {**final, "tool": tool_name, "output": output}
+
+    async def arun_batch(self, texts: List[str], concurrency: int = 8) -> List[AgentBatchItem]:
+        """
+        Run every text, results in input order with per-item errors and timings.
+        Tools without an async implementation (calculator, echo, ping, ...) are
+        cheap and run inline (one call per tool when it has a batch_tools variant);
+        async tools (e.g. rag_answer) run concurrently, at most concurrency at a
+        time. Batch runs are not added to the history.
+        """
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def bounded(atool: AsyncTool, payload: str, tool_name: str) -> AgentBatchItem:
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    output = await atool(payload)
+                except Exception as e:
+                    return self._batch_error(tool_name, e, start)
+                return self._batch_item(tool_name, output, start)
+
+        items: List[Any] = []
+        batched: Dict[str, List[Tuple[int, str]]] = {}
+        for text in texts:
+            start = time.perf_counter()
+            if not text.strip():
+                items.append(
+                    AgentBatchItem(tool="none", output="", error="empty_text", elapsed_ms=0.0)
+                )
+                continue
+            tool_name, payload = self.plan(text)
+            tool = self.tools.get(tool_name)
+            atool = self.async_tools.get(tool_name) if tool else None
+            if atool is not None:
+                items.append(asyncio.ensure_future(bounded(atool, payload, tool_name)))
+            elif tool is not None and tool_name in self.batch_tools:
+                batched.setdefault(tool_name, []).append((len(items), payload))
+                items.append(None)
+            elif tool is None:
+                items.append(self._batch_item("none", "no_suitable_tool", start))
+            else:
+                try:
+                    items.append(self._batch_item(tool_name, tool(payload), start))
+                except Exception as e:
+                    items.append(self._batch_error(tool_name, e, start))
+        for tool_name, members in batched.items():
+            self._run_batched(tool_name, members, items)
+        tasks = [item for item in items if isinstance(item, asyncio.Future)]
+        if tasks:
+            await asyncio.gather(*tasks)
+        return [item.result() if isinstance(item, asyncio.Future) else item for item in items]
+
+    def _run_batched(
+        self, tool_name: str, members: List[Tuple[int, str]], items: List[Any]
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            outputs = self.batch_tools[tool_name]([payload for _, payload in members])
+        except Exception as e:
+            for i, _ in members:
+                items[i] = self._batch_error(tool_name, e, start)
+            return
+        # one call served them all: each item reports its share of the time
+        share = round(1000.0 * (time.perf_counter() - start) / len(members), 3)
+        for (i, _), output in zip(members, outputs):
+            items[i] = AgentBatchItem(tool=tool_name, output=output, elapsed_ms=share)
+
+    @staticmethod
+    def _batch_item(tool_name: str, output: str, start: float) -> AgentBatchItem:
+        elapsed = 1000.0 * (time.perf_counter() - start)
+        return AgentBatchItem(tool=tool_name, output=output, elapsed_ms=round(elapsed, 3))
+
+    @staticmethod
+    def _batch_error(tool_name: str, e: Exception, start: float) -> AgentBatchItem:
+        item = Agent._batch_item(tool_name, f"tool_error: {type(e).__name__}", start)
+        item.error = f"{type(e).__name__}: {e}"
+        return item
+
+    def _record(self, tool_name: str, output: str) -> AgentResponse:
+        self.history.append(AgentResult(tool=tool_name, output=output))
+        return AgentResponse(tool=tool_name, output=output, history=list(self.history))
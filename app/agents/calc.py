@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MAX_LENGTH = 512  # characters of expression, whitespace included
+MAX_DEPTH = 32  # nesting of parentheses
+MAX_MAGNITUDE = 1e15  # largest absolute operand and result
+
+# operator precedence; compiled programs also use "k" to push the next constant
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "neg": 3, "pos": 3}
+_CHARS = set("0123456789.+-*/()")
+_NUMBER = set("0123456789.")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class CalcError(ValueError):
+    """Expression rejected: malformed, over a limit, or not finite (e.g. division by zero)."""
+
+
+class Program(NamedTuple):
+    """Compiled expression: postfix opcodes plus the constants "k" pushes, in order."""
+
+    code: Tuple[str, ...]
+    consts: Tuple[float, ...]
+
+
+def normalize(expr: str) -> str:
+    """Cache key: whitespace dropped, except one space between two numbers ("1 2" stays invalid)."""
+
+    def space(m: re.Match) -> str:
+        between = 0 < m.start() and m.end() < len(expr)
+        return (
+            " " if between and expr[m.start() - 1] in _NUMBER and expr[m.end()] in _NUMBER else ""
+        )
+
+    return _SPACE_RE.sub(space, expr)
+
+
+def _tokens(expr: str) -> List[Union[str, float]]:
+    out: List[Union[str, float]] = []
+    i, n = 0, len(expr)
+    while i < n:
+        ch = expr[i]
+        if ch == " ":
+            i += 1
+        elif ch in _NUMBER:
+            j = i
+            while j < n and expr[j] in _NUMBER:
+                j += 1
+            try:
+                value = float(expr[i:j])
+            except ValueError:
+                raise CalcError(f"bad number {expr[i:j]!r}") from None
+            if abs(value) > MAX_MAGNITUDE:
+                raise CalcError("operand too large")
+            out.append(value)
+            i = j
+        elif ch in _CHARS:
+            out.append(ch)
+            i += 1
+        else:
+            raise CalcError(f"unexpected character {ch!r}")
+    return out
+
+
+def compile_expr(expr: str) -> Program:
+    """
+    Shunting-yard parse of + - * / with unary signs and parentheses into postfix.
+    Iterative, so deep nesting costs no stack; MAX_DEPTH and MAX_LENGTH bound the work.
+    """
+    expr = normalize(expr)
+    if not expr:
+        raise CalcError("empty expression")
+    if len(expr) > MAX_LENGTH:
+        raise CalcError("expression too long")
+    code: List[str] = []
+    consts: List[float] = []
+    ops: List[str] = []
+    depth = 0
+    operand = False  # whether the previous token ended an operand
+    for tok in _tokens(expr):
+        if isinstance(tok, float):
+            if operand:
+                raise CalcError("missing operator")
+            code.append("k")
+            consts.append(tok)
+            operand = True
+        elif tok == "(":
+            if operand:
+                raise CalcError("missing operator")
+            depth += 1
+            if depth > MAX_DEPTH:
+                raise CalcError("expression nested too deeply")
+            ops.append(tok)
+        elif tok == ")":
+            if not operand:
+                raise CalcError("missing operand")
+            while ops and ops[-1] != "(":
+                code.append(ops.pop())
+            if not ops:
+                raise CalcError("unbalanced parentheses")
+            ops.pop()
+            depth -= 1
+        elif not operand:
+            # a sign: right-associative, binds tighter than * and /
+            if tok not in ("+", "-"):
+                raise CalcError("missing operand")
+            ops.append("neg" if tok == "-" else "pos")
+        else:
+            while ops and ops[-1] != "(" and _PRECEDENCE[ops[-1]] >= _PRECEDENCE[tok]:
+                code.append(ops.pop())
+            ops.append(tok)
+            operand = False
+    if not operand:
+        raise CalcError("missing operand")
+    while ops:
+        top = ops.pop()
+        if top == "(":
+            raise CalcError("unbalanced parentheses")
+        code.append(top)
+    return Program(tuple(code), tuple(consts))
+
+
+def _check(value: float) -> float:
+    if not math.isfinite(value) or abs(value) > MAX_MAGNITUDE:
+        raise CalcError("result out of range")
+    return value
+
+
+def run(program: Program) -> float:
+    consts = iter(program.consts)
+    stack: List[float] = []
+    for opcode in program.code:
+        if opcode == "k":
+            stack.append(next(consts))
+        elif opcode == "neg":
+            stack[-1] = -stack[-1]
+        elif opcode == "pos":
+            continue
+        else:
+            right = stack.pop()
+            left = stack[-1]
+            if opcode == "+":
+                stack[-1] = _check(left + right)
+            elif opcode == "-":
+                stack[-1] = _check(left - right)
+            elif opcode == "*":
+                stack[-1] = _check(left * right)
+            elif right == 0:
+                raise CalcError("division by zero")
+            else:
+                stack[-1] = _check(left / right)
+    return stack[0]
+
+
+def run_many(code: Tuple[str, ...], consts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run one opcode sequence over a (rows, n_consts) matrix of constants at once.
+    Returns (values, ok): rows that hit a limit or divide by zero have ok False.
+    """
+    col = 0
+    stack: List[np.ndarray] = []
+    with np.errstate(all="ignore"):
+        for opcode in code:
+            if opcode == "k":
+                stack.append(consts[:, col])
+                col += 1
+            elif opcode == "neg":
+                stack[-1] = -stack[-1]
+            elif opcode == "pos":
+                continue
+            else:
+                right = stack.pop()
+                left = stack[-1]
+                if opcode == "+":
+                    stack[-1] = left + right
+                elif opcode == "-":
+                    stack[-1] = left - right
+                elif opcode == "*":
+                    stack[-1] = left * right
+                else:
+                    stack[-1] = np.where(right == 0, np.nan, left / right)
+                # out-of-range intermediates poison the row, as _check does in run
+                stack[-1] = np.where(np.abs(stack[-1]) <= MAX_MAGNITUDE, stack[-1], np.nan)
+    values = stack[0]
+    return values, np.isfinite(values)
+
+
+class ProgramCache:
+    """
+    Bounded LRU of compiled programs keyed by the normalized expression.
+    Rejected expressions are cached too (as their CalcError message), so
+    repeated bad input is not re-parsed; hits / misses feed stats(). Input over
+    MAX_LENGTH is rejected before it is normalized and never cached.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, Union[Program, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, expr: str) -> Program:
+        if len(expr) > MAX_LENGTH:
+            raise CalcError("expression too long")
+        key = normalize(expr)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            try:
+                entry = compile_expr(key)
+            except CalcError as e:
+                entry = str(e)
+            with self._lock:
+                self.misses += 1
+                if self.max_entries:
+                    self._data[key] = entry
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.max_entries:
+                        self._data.popitem(last=False)
+        if isinstance(entry, str):
+            raise CalcError(entry)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+PROGRAMS = ProgramCache()
+
+
+def format_result(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def evaluate(expr: str) -> float:
+    """Compile (cached) and run one expression; raises CalcError."""
+    return run(PROGRAMS.get(expr))
+
+
+def evaluate_many(exprs: Sequence[str]) -> List[Optional[float]]:
+    """
+    Evaluate many expressions, None for rejected ones. Expressions sharing an
+    opcode sequence (e.g. "1+2" and "30+4") are run together as NumPy columns.
+    """
+    out: List[Optional[float]] = [None] * len(exprs)
+    groups: Dict[Tuple[str, ...], List[Tuple[int, Tuple[float, ...]]]] = {}
+    for i, expr in enumerate(exprs):
+        try:
+            program = PROGRAMS.get(expr)
+        except CalcError:
+            continue
+        groups.setdefault(program.code, []).append((i, program.consts))
+    for code, members in groups.items():
+        if len(members) == 1:
+            i, consts = members[0]
+            try:
+                out[i] = run(Program(code, consts))
+            except CalcError:
+                pass
+            continue
+        matrix = np.array([consts for _, consts in members], dtype=np.float64)
+        values, ok = run_many(code, matrix)
+        for (i, _), value, good in zip(members, values.tolist(), ok.tolist()):
+            out[i] = value if good else None
+    return out
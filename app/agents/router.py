@@ -1,13 +1,81 @@
-from fastapi import APIRouter
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.summarize.config import settings
+from app.summarize.utils import sse_event
 
 from .agent import Agent
-from .schemas import AgentRequest, AgentResponse
-from .tools import REGISTRY
+from .schemas import AgentBatchRequest, AgentBatchResponse, AgentRequest, AgentResponse
+from .sessions import SessionTable
+from .tools import ASYNC_REGISTRY, BATCH_REGISTRY, REGISTRY, STREAM_REGISTRY
 
 router = APIRouter(prefix="/agent", tags=["agent"])
-_agent = Agent(REGISTRY)
+
+
+def _new_agent() -> Agent:
+    return Agent(
+        REGISTRY,
+        ASYNC_REGISTRY,
+        STREAM_REGISTRY,
+        history_size=settings.agent_history_size,
+        batch_tools=BATCH_REGISTRY,
+    )
+
+
+SESSIONS = SessionTable(
+    _new_agent,
+    max_sessions=settings.agent_max_sessions,
+    ttl=settings.agent_session_ttl,
+    max_bytes=settings.agent_sessions_max_bytes,
+)
+
+
+def _agent_for(req: AgentRequest) -> Agent:
+    # without a session id the request gets a throwaway agent: no history is shared or kept
+    return SESSIONS.get(req.session_id) if req.session_id else _new_agent()
 
 
 @router.post("", response_model=AgentResponse)
-def run_agent(req: AgentRequest):
-    return _agent.run(req.text)
+async def run_agent(req: AgentRequest):
+    agent = _agent_for(req)
+    resp = await agent.arun(req.text)
+    if req.session_id:
+        SESSIONS.update(req.session_id, agent)
+        resp.session_id = req.session_id
+    return resp
+
+
+@router.post("/batch", response_model=AgentBatchResponse)
+async def run_agent_batch(req: AgentBatchRequest):
+    """Many commands in one call; results in input order, each with its own error and timing."""
+    if len(req.texts) > settings.agent_batch_max_items:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.agent_batch_max_items} texts per batch"
+        )
+    start = time.perf_counter()
+    results = await _new_agent().arun_batch(
+        req.texts, concurrency=req.concurrency or settings.agent_batch_concurrency
+    )
+    return {"results": results, "elapsed_ms": round(1000.0 * (time.perf_counter() - start), 3)}
+
+
+@router.post("/stream")
+async def stream_agent(req: AgentRequest):
+    """Server-Sent Events: "token" events from streaming tools, then one "result" event."""
+
+    agent = _agent_for(req)
+
+    async def events():
+        async for event, data in agent.astream(req.text):
+            yield sse_event(event, data)
+        if req.session_id:
+            SESSIONS.update(req.session_id, agent)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.get("/sessions")
+async def session_stats():
+    return SESSIONS.stats()
@@ -1,8 +1,16 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class AgentRequest(BaseModel):
     text: str = Field(..., min_length=1)
+    session_id: Optional[str] = Field(
+        None,
+        min_length=1,
+        max_length=128,
+        description="history is kept per session; none: no history",
+    )
 
 
 class AgentResult(BaseModel):
@@ -14,3 +22,21 @@ class AgentResponse(BaseModel):
     tool: str
     output: str
     history: list[AgentResult]
+    session_id: Optional[str] = None
+
+
+class AgentBatchRequest(BaseModel):
+    texts: list[str] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="concurrent I/O-bound tools")
+
+
+class AgentBatchItem(BaseModel):
+    tool: str
+    output: str
+    error: Optional[str] = None
+    elapsed_ms: float
+
+
+class AgentBatchResponse(BaseModel):
+    results: list[AgentBatchItem]
+    elapsed_ms: float
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from .agent import Agent
+
+
+class SessionTable:
+    """
+    Per-session agents, so callers only see their own history.
+    - LRU order with a TTL: sessions idle for ttl seconds are dropped, and the
+      least recently used go first once max_sessions is reached.
+    - Hard memory cap: the summed history size (Agent.history_bytes) of all
+      sessions stays under max_bytes; least recently used sessions are evicted
+      (the one just used last, and only if it alone exceeds the cap).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Agent],
+        max_sessions: int = 1024,
+        ttl: float = 1800.0,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.factory = factory
+        self.max_sessions = max(1, max_sessions)
+        self.ttl = ttl
+        self.max_bytes = max(0, max_bytes)
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, Tuple[float, Agent]] = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, session_id: str) -> Agent:
+        """The session's agent (created on first use); marks it most recently used."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire_locked(now)
+            entry = self._data.get(session_id)
+            agent = entry[1] if entry is not None else self.factory()
+            self._data[session_id] = (now, agent)
+            self._data.move_to_end(session_id)
+            self._sizes.setdefault(session_id, 0)
+            self._evict_locked(keep=session_id)
+            return agent
+
+    def update(self, session_id: str, agent: Agent) -> None:
+        """Re-account the session's history size after a run and enforce the memory cap."""
+        size = agent.history_bytes
+        with self._lock:
+            if self._data.get(session_id, (0.0, None))[1] is not agent:
+                return  # evicted (or replaced) while the request ran
+            self._bytes += size - self._sizes.get(session_id, 0)
+            self._sizes[session_id] = size
+            self._evict_locked(keep=session_id)
+            if self._bytes > self.max_bytes:
+                self._drop_locked(session_id)
+
+    def _expire_locked(self, now: float) -> None:
+        while self._data:
+            session_id, (last_used, _) = next(iter(self._data.items()))
+            if now - last_used < self.ttl:
+                break
+            self._drop_locked(session_id)
+
+    def _evict_locked(self, keep: str) -> None:
+        for session_id in list(self._data):
+            if len(self._data) <= self.max_sessions and self._bytes <= self.max_bytes:
+                return
+            if session_id != keep:
+                self._drop_locked(session_id)
+
+    def _drop_locked(self, session_id: str) -> None:
+        del self._data[session_id]
+        self._bytes -= self._sizes.pop(session_id, 0)
+        self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._data),
+                "history_bytes": self._bytes,
+                "evictions": self.evictions,
+            }
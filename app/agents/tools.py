@@ -1,53 +1,47 @@
 from __future__ import annotations
 
-import ast
+import asyncio
 import json
-import operator as op
-from typing import Callable, Dict
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
 
+from app.metrics.registry import TOOL_SECONDS, timed
 from app.rag.store import STORE
-from app.summarize.llm import summarize_with_retry
+from app.summarize.llm import astream_summary, asummarize_with_retry, summarize_with_retry
+
+from .calc import MAX_LENGTH, CalcError, evaluate, evaluate_many, format_result
 
 Tool = Callable[[str], str]
+AsyncTool = Callable[[str], Awaitable[str]]
+# yields ("token", {"text"}) events, then one ("answer", {...}) event
+StreamTool = Callable[[str], AsyncIterator[Tuple[str, Dict[str, Any]]]]
+# one call for many payloads, outputs in the same order
+BatchTool = Callable[[List[str]], List[str]]
 
-_ALLOWED_OPS = {
-    ast.Add: op.add,
-    ast.Sub: op.sub,
-    ast.Mult: op.mul,
-    ast.Div: op.truediv,
-    ast.USub: op.neg,
-    ast.UAdd: op.pos,
-}
+_NOT_CALC_RE = re.compile(r"[^0-9+\-*/(). ]")
 
 
-def _eval_node(node: ast.AST) -> float:
-    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
-        return float(node.value)
-    if isinstance(node, ast.UnaryOp) and type(node.op) in (ast.UAdd, ast.USub):
-        return _ALLOWED_OPS[type(node.op)](_eval_node(node.operand))
-    if isinstance(node, ast.BinOp) and type(node.op) in _ALLOWED_OPS:
-        left = _eval_node(node.left)
-        right = _eval_node(node.right)
-        return _ALLOWED_OPS[type(node.op)](left, right)
-    if isinstance(node, ast.Expression):
-        return _eval_node(node.body)
-    raise ValueError("unsupported expression")
+# agent text may carry prose around the expression, but not without bound
+_MAX_CALC_TEXT = 4 * MAX_LENGTH
 
 
-def _safe_calc(expr: str) -> str:
-    try:
-        parsed = ast.parse(expr, mode="eval").body
-        val = _eval_node(parsed)
-        return str(int(val)) if float(val).is_integer() else str(val)
-    except Exception:
-        return "calc_error"
+def _calc_expr(query: str) -> str:
+    if len(query) > _MAX_CALC_TEXT:
+        return query  # over MAX_LENGTH as is: rejected before it is normalized
+    return _NOT_CALC_RE.sub("", query)
 
 
 def calculator(query: str) -> str:
-    import re
+    try:
+        return format_result(evaluate(_calc_expr(query)))
+    except CalcError:
+        return "calc_error"
+
 
-    expr = "".join(re.findall(r"[0-9+\-*/(). ]", query))
-    return _safe_calc(expr) if expr.strip() else "calc_error"
+def calculator_many(queries: List[str]) -> List[str]:
+    """calculator over a batch; expressions of the same shape are evaluated together."""
+    values = evaluate_many([_calc_expr(q) for q in queries])
+    return ["calc_error" if v is None else format_result(v) for v in values]
 
 
 def echo(query: str) -> str:
@@ -66,6 +60,26 @@ def rag_search(query: str) -> str:
     return json.dumps(results)
 
 
+async def arag_search(query: str) -> str:
+    # STORE.query has no async variant; keep its scoring off the event loop
+    return await asyncio.to_thread(rag_search, query)
+
+
+def rag_hybrid(query: str) -> str:
+    """Keyword + semantic search fused with reciprocal rank fusion; compact JSON like rag_search."""
+    return _hybrid_json(STORE.query_hybrid(query, limit=3))
+
+
+async def arag_hybrid(query: str) -> str:
+    return _hybrid_json(await STORE.aquery_hybrid(query, limit=3))
+
+
+def _hybrid_json(results) -> str:
+    if not results:
+        return "no_results"
+    return json.dumps([{"id": r["id"], "text": r["chunk"], "score": r["score"]} for r in results])
+
+
 def rag_answer(query: str) -> str:
     """
     Retrieve top-k semantically similar docs, then summarize into an answer.
@@ -74,16 +88,74 @@ def rag_answer(query: str) -> str:
     results = STORE.query_vector(query, limit=3)
     if not results:
         return json.dumps({"answer": "no relevant context found", "sources": []})
-    context = "\n\n".join(f"- {r['text']}" for r in results)
-    prompt = f"Using only the context below, answer the question.\n\nQuestion: {query}\n\nContext:\n{context}\n\nAnswer:"
-    summary, conf, _ = summarize_with_retry(prompt, max_words=80)
+    summary, conf, _ = summarize_with_retry(_rag_prompt(query, results), max_words=80)
     return json.dumps({"answer": summary or "", "sources": [r["id"] for r in results]})
 
 
-REGISTRY: Dict[str, Tool] = {
+async def arag_answer(query: str) -> str:
+    """rag_answer awaiting the query embedding and the LLM instead of blocking."""
+    results = await STORE.aquery_vector(query, limit=3)
+    if not results:
+        return json.dumps({"answer": "no relevant context found", "sources": []})
+    summary, conf, _ = await asummarize_with_retry(_rag_prompt(query, results), max_words=80)
+    return json.dumps({"answer": summary or "", "sources": [r["id"] for r in results]})
+
+
+async def astream_rag_answer(query: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming rag_answer: forwards answer tokens as the LLM produces them, then
+    yields ("answer", {"answer", "confidence", "sources"}).
+    """
+    results = await STORE.aquery_vector(query, limit=3)
+    if not results:
+        yield "answer", {"answer": "no relevant context found", "confidence": 0.0, "sources": []}
+        return
+    summary, conf = "", 0.0
+    async for event, data in astream_summary(_rag_prompt(query, results), max_words=80):
+        if event == "token":
+            yield event, data
+        else:
+            summary, conf = data["summary"], data["confidence"]
+    yield "answer", {
+        "answer": summary or "",
+        "confidence": conf,
+        "sources": [r["id"] for r in results],
+    }
+
+
+def _rag_prompt(query: str, results) -> str:
+    # only the best-matching chunk of each document goes into the prompt
+    context = "\n\n".join(f"- {r['chunk']}" for r in results)
+    return f"Using only the context below, answer the question.\n\nQuestion: {query}\n\nContext:\n{context}\n\nAnswer:"
+
+
+# every tool call is timed into agent_tool_duration_seconds{tool}
+_TOOLS: Dict[str, Tool] = {
     "calculator": calculator,
     "echo": echo,
     "ping": ping,
     "rag_search": rag_search,
+    "rag_hybrid": rag_hybrid,
     "rag_answer": rag_answer,
 }
+
+REGISTRY: Dict[str, Tool] = {
+    name: timed(TOOL_SECONDS.labels(name))(tool) for name, tool in _TOOLS.items()
+}
+
+# Async implementations used by Agent.arun; tools not listed here run inline.
+ASYNC_REGISTRY: Dict[str, AsyncTool] = {
+    "rag_search": timed(TOOL_SECONDS.labels("rag_search"))(arag_search),
+    "rag_hybrid": timed(TOOL_SECONDS.labels("rag_hybrid"))(arag_hybrid),
+    "rag_answer": timed(TOOL_SECONDS.labels("rag_answer"))(arag_answer),
+}
+
+# Streaming implementations used by Agent.astream; other tools send one result event.
+STREAM_REGISTRY: Dict[str, StreamTool] = {
+    "rag_answer": timed(TOOL_SECONDS.labels("rag_answer"))(astream_rag_answer),
+}
+
+# Batch implementations used by Agent.arun_batch for inline tools.
+BATCH_REGISTRY: Dict[str, BatchTool] = {
+    "calculator": calculator_many,
+}
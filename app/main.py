@@ -1,13 +1,41 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from .agents.router import router as agents_router
+from .metrics.middleware import MetricsMiddleware
+from .metrics.profiling import ProfileMiddleware
+from .metrics.router import router as metrics_router
 from .ping.router import router as ping_router
 from .rag.router import router as rag_router
+from .rag.store import STORE
+from .summarize.clients import close_clients, open_clients
+from .summarize.config import settings
 from .summarize.router import router as summarize_router
 
-app = FastAPI(title="AI RAG Demo", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # one pooled (keep-alive) OpenAI client pair shared by every request
+    open_clients()
+    # map the persisted corpus instead of re-embedding it
+    if settings.rag_store_path:
+        STORE.open(settings.rag_store_path)
+    yield
+    if settings.rag_store_path:
+        STORE.snapshot()
+        STORE.close()
+    await close_clients()
+
+
+app = FastAPI(title="AI RAG Demo", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if settings.profile_enabled:
+    # off by default: not even installed, so unprofiled requests pay nothing
+    app.add_middleware(ProfileMiddleware)
 
 app.include_router(agents_router)
 app.include_router(ping_router)
 app.include_router(summarize_router)
 app.include_router(rag_router)
+app.include_router(metrics_router)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import time
+
+from .registry import HTTP_SECONDS
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing every HTTP request into
+    http_request_duration_seconds{router, method, status}. The router label is
+    the matched route's first tag (e.g. "rag"), "unmatched" otherwise, so
+    arbitrary paths cannot blow up label cardinality. Streaming responses are
+    timed until their last chunk is sent.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            tags = getattr(route, "tags", None)
+            router = str(tags[0]) if tags else "unmatched"
+            series = HTTP_SECONDS.labels(router, scope["method"], str(status))
+            series.observe(time.perf_counter() - start)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import hmac
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional
+
+import anyio.to_thread
+
+from app.summarize.config import settings
+
+PROFILE_HEADER = b"x-profile"
+TOKEN_HEADER = b"x-profile-token"
+MODES = ("cpu", "mem")
+_PROFILE_FILE_RE = re.compile(r"(\d+-[0-9a-f]{8})\.(?:prof|mem\.txt)")
+
+# cProfile and tracemalloc are process-wide, so one profiled request at a time
+_BUSY = threading.Lock()
+
+
+class _ThreadProfiles:
+    """cProfile runs of the worker-thread calls made for one profiled request."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.profilers: List[cProfile.Profile] = []
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.profilers.append(profiler)
+
+        return run
+
+
+_THREAD_PROFILES: ContextVar[Optional[_ThreadProfiles]] = ContextVar(
+    "thread_profiles", default=None
+)
+
+
+def _profiling_offload(to_thread):
+    @functools.wraps(to_thread)
+    async def offload(func, /, *args, **kwargs):
+        profiles = _THREAD_PROFILES.get()
+        if profiles is not None:
+            func = profiles.wrap(func)
+        return await to_thread(func, *args, **kwargs)
+
+    offload._profiling = True
+    return offload
+
+
+def _install_thread_hooks() -> None:
+    """
+    Before 3.12 a profiler only sees the thread that enabled it, so the two ways
+    work leaves the event loop (anyio's threadpool for sync routes, and
+    asyncio.to_thread) profile their calls in the worker thread while a
+    profiled request is in context. From 3.12 cProfile sees every thread.
+    """
+    if sys.version_info >= (3, 12):
+        return
+    if not getattr(asyncio.to_thread, "_profiling", False):
+        asyncio.to_thread = _profiling_offload(asyncio.to_thread)
+    if not getattr(anyio.to_thread.run_sync, "_profiling", False):
+        anyio.to_thread.run_sync = _profiling_offload(anyio.to_thread.run_sync)
+
+
+def _wanted(scope) -> Optional[List[str]]:
+    """Modes asked for by the X-Profile header ("cpu", "mem" or "cpu,mem"); None if not asked."""
+    value = token = None
+    for name, raw in scope["headers"]:
+        if name == PROFILE_HEADER:
+            value = raw.decode("latin-1")
+        elif name == TOKEN_HEADER:
+            token = raw.decode("latin-1")
+    if value is None:
+        return None
+    if settings.profile_token and not hmac.compare_digest(token or "", settings.profile_token):
+        return None
+    modes = [m for m in (p.strip().lower() for p in value.split(",")) if m in MODES]
+    return modes or ["cpu"]
+
+
+def prune(directory: str, keep: int) -> None:
+    """
+    Retention: keep the files of the newest keep profiles in directory. Only
+    <ms>-<hex>.prof / .mem.txt files written by this middleware are touched.
+    """
+    ids = {}
+    for name in os.listdir(directory):
+        match = _PROFILE_FILE_RE.fullmatch(name)
+        if match:
+            ids.setdefault(match.group(1), []).append(os.path.join(directory, name))
+    newest = sorted(ids, reverse=True)  # ids start with a millisecond timestamp
+    for profile_id in newest[max(0, keep) :]:
+        for path in ids[profile_id]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ProfileMiddleware:
+    """
+    Opt-in per-request profiling (plain ASGI). Only installed when PROFILE_ENABLED
+    is set; requests without an X-Profile header pass straight through.
+
+    X-Profile: cpu (cProfile) and/or mem (tracemalloc) profiles that request into
+    PROFILE_DIR as <id>.prof (pstats) and <id>.mem.txt (top allocations, peak),
+    keeping the newest PROFILE_MAX_FILES profiles. The id comes back in the
+    X-Profile-Id response header ("busy" when another request is being profiled;
+    the profilers are process-wide). With PROFILE_TOKEN set, X-Profile-Token must
+    match. Work the request hands to worker threads (sync routes, to_thread) is
+    included; other requests running on the event loop meanwhile show up in the
+    CPU profile too. Files are written off the event loop.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        _install_thread_hooks()
+
+    async def __call__(self, scope, receive, send) -> None:
+        modes = _wanted(scope) if scope["type"] == "http" else None
+        if modes is None:
+            await self.app(scope, receive, send)
+            return
+        if not _BUSY.acquire(blocking=False):
+            await self.app(scope, receive, self._with_id(send, "busy"))
+            return
+        try:
+            profile_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+            await self._profiled(scope, receive, self._with_id(send, profile_id), modes, profile_id)
+        finally:
+            _BUSY.release()
+
+    @staticmethod
+    def _with_id(send, profile_id: str):
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        return send_with_id
+
+    async def _profiled(self, scope, receive, send, modes: List[str], profile_id: str) -> None:
+        profiler = cProfile.Profile() if "cpu" in modes else None
+        threads = _ThreadProfiles()
+        before = None
+        if "mem" in modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        token = _THREAD_PROFILES.set(threads if profiler is not None else None)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            _THREAD_PROFILES.reset(token)
+            elapsed = time.perf_counter() - start
+            base = os.path.join(settings.profile_dir, profile_id)
+            await asyncio.to_thread(
+                _write_profile, scope, base, elapsed, profiler, threads.profilers, before
+            )
+
+
+def _write_profile(
+    scope,
+    base: str,
+    elapsed: float,
+    profiler: Optional[cProfile.Profile],
+    thread_profilers: List[cProfile.Profile],
+    before: Optional[tracemalloc.Snapshot],
+) -> None:
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    if profiler is not None:
+        stats = pstats.Stats(profiler)
+        for worker in list(thread_profilers):
+            stats.add(worker)
+        stats.dump_stats(base + ".prof")
+    if before is not None:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = after.compare_to(before, "lineno")[:25]
+        with open(base + ".mem.txt", "w", encoding="utf-8") as fh:
+            fh.write(f"{scope['method']} {scope['path']} {elapsed * 1000:.1f} ms\n")
+            fh.write(f"peak traced: {peak} bytes\n\n")
+            fh.writelines(f"{stat}\n" for stat in stats)
+    prune(settings.profile_dir, settings.profile_max_files)
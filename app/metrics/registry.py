@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# latency buckets in seconds: sub-millisecond scoring up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Timer:
+    __slots__ = ("series", "start")
+
+    def __init__(self, series: HistogramSeries) -> None:
+        self.series = series
+
+    def __enter__(self) -> _Timer:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class HistogramSeries:
+    """
+    One labelled histogram: per-bucket counts (pre-bucketed, found by bisect)
+    plus sum and count. Recording takes one uncontended lock per series.
+    """
+
+    __slots__ = ("bounds", "counts", "total", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket: +Inf
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += value
+
+    def time(self) -> _Timer:
+        """Context manager observing the elapsed wall time of its block (also on error)."""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.total
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.total = 0.0
+
+
+def timed(series: HistogramSeries) -> Callable[[F], F]:
+    """
+    Decorator observing each call's wall time into series; coroutine functions are
+    awaited and async generators timed until they finish (or are closed).
+    """
+
+    def wrap(fn: F) -> F:
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def agen(*args, **kwargs):
+                with series.time():
+                    async for item in fn(*args, **kwargs):
+                        yield item
+
+            return agen  # type: ignore[return-value]
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def arun(*args, **kwargs):
+                with series.time():
+                    return await fn(*args, **kwargs)
+
+            return arun  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with series.time():
+                return fn(*args, **kwargs)
+
+        return run  # type: ignore[return-value]
+
+    return wrap
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Series for these label values, created on first use; hot paths keep the reference."""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new())
+        return series
+
+    def clear(self) -> None:
+        # reset in place: instrumented code keeps references to its series
+        for _, series in self._items():
+            series.reset()
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._series.items())
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new(self) -> HistogramSeries:
+        return HistogramSeries(self.buckets)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for values, series in self._items():
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = _labels(self.labelnames, values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{label} {_number(total)}")
+            lines.append(f"{self.name}_count{label} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from fn, so there is nothing to record on the hot path."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]) -> None:
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return super().render() + [f"{self.name} {_number(self.fn())}"]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> _Metric:
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Zero every recorded series (gauges are computed, so they are unaffected)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+METRICS = MetricsRegistry()
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = ()) -> Histogram:
+    return METRICS.register(Histogram(name, help, labelnames))
+
+
+def gauge(name: str, help: str, fn: Callable[[], float]) -> Gauge:
+    return METRICS.register(Gauge(name, help, fn))
+
+
+# stage timers shared by the instrumented modules
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by router, method and status",
+    ("router", "method", "status"),
+)
+EMBED_SECONDS = histogram(
+    "embed_duration_seconds", "Embedding latency (cache hits included) by call", ("call",)
+)
+SEARCH_SECONDS = histogram(
+    "rag_search_duration_seconds",
+    "DocumentStore scoring latency, query embedding excluded",
+    ("kind",),
+)
+SUMMARIZE_SECONDS = histogram(
+    "summarize_duration_seconds",
+    "summarize_with_retry latency, by whether a strict retry ran",
+    ("retried",),
+)
+TOOL_SECONDS = histogram("agent_tool_duration_seconds", "Agent tool latency", ("tool",))
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.agents.router import SESSIONS
+from app.rag.store import STORE
+
+from .registry import METRICS, gauge
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+# computed at scrape time
+gauge("rag_documents", "Documents in the store", lambda: len(STORE.docs))
+gauge("rag_index_rows", "Chunk vectors in the index, dead rows included", lambda: len(STORE.index))
+gauge("rag_index_dead_rows", "Deleted rows awaiting compaction", lambda: STORE.index.n_dead)
+gauge("rag_vector_bytes", "Memory held by index vectors", lambda: STORE.index.nbytes)
+gauge("agent_sessions", "Live agent sessions", lambda: len(SESSIONS))
+
+
+@router.get("", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
@@ -4,5 +4,5 @@ router = APIRouter(prefix="/ping", tags=["ping"])
 
 
 @router.get("")
-def ping():
+async def ping():
     return {"status": "ok"}
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.summarize.config import settings
+
+# disk record: 32-byte key digest, uint32 dim, then dim float32 values
+_HEADER = struct.Struct("<32sI")
+
+
+def cache_key(backend: str, model: str, dim: int, text: str) -> bytes:
+    """Content-addressed key: SHA-256 over (backend, model, dim, text)."""
+    h = hashlib.sha256(f"{backend}\0{model}\0{dim}\0".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache.
+    - Memory tier: bounded LRU of up to max_entries vectors (0 disables caching).
+    - Disk tier (optional): append-only file of fixed-layout records; an offset
+      table is rebuilt on open so entries survive restarts.
+    - hits / misses / disk_hits counters are exposed through stats().
+    """
+
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None) -> None:
+        self.max_entries = max(0, max_entries)
+        self.path = path
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[bytes, List[float]] = OrderedDict()
+        self._offsets: Dict[bytes, Tuple[int, int]] = {}  # key -> (offset, dim)
+        self._fh: Optional[BinaryIO] = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if path:
+            self._open_disk(path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _open_disk(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fh = open(path, "a+b")
+        self._fh.seek(0)
+        data = self._fh.read()
+        pos = 0
+        while pos + _HEADER.size <= len(data):
+            key, dim = _HEADER.unpack_from(data, pos)
+            end = pos + _HEADER.size + 4 * dim
+            if end > len(data):
+                break  # torn trailing record from a crash; ignore it
+            self._offsets[key] = (pos + _HEADER.size, dim)
+            pos = end
+        if pos != len(data):
+            self._fh.truncate(pos)
+
+    def _read_disk(self, key: bytes) -> Optional[List[float]]:
+        loc = self._offsets.get(key)
+        if loc is None or self._fh is None:
+            return None
+        offset, dim = loc
+        self._fh.seek(offset)
+        return np.frombuffer(self._fh.read(4 * dim), dtype=np.float32).tolist()
+
+    def _remember(self, key: bytes, vec: List[float]) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            vec = self._mem.get(key)
+            if vec is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return list(vec)
+            vec = self._read_disk(key)
+            if vec is not None:
+                self._remember(key, vec)
+                self.hits += 1
+                self.disk_hits += 1
+                return list(vec)
+            self.misses += 1
+            return None
+
+    def put(self, key: bytes, vec: Sequence[float]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remember(key, list(vec))
+            if self._fh is not None and key not in self._offsets:
+                arr = np.asarray(vec, dtype=np.float32)
+                record = _HEADER.pack(key, arr.size) + arr.tobytes()
+                # other processes may append to the same file: take the advisory
+                # lock and read the offset back from the kernel after the O_APPEND
+                # write, so it names the bytes that were actually written
+                fd = self._fh.fileno()
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    self._fh.write(record)
+                    self._fh.flush()
+                    end = os.lseek(fd, 0, os.SEEK_CUR)
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                self._offsets[key] = (end - len(record) + _HEADER.size, arr.size)
+
+    def clear(self) -> None:
+        """Drop the memory tier and reset counters (the disk tier is kept)."""
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.misses = self.disk_hits = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "disk_entries": len(self._offsets),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+# content-addressed cache in front of embed()/embed_batch()
+CACHE = EmbeddingCache(settings.embed_cache_size, settings.embed_cache_path)
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Tuple
+
+Span = Tuple[int, int]  # [start, end) character offsets into the document
+
+UNITS = ("chars", "tokens")
+
+# end of a sentence (punctuation, optional closing quote/bracket, whitespace) or a blank line
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+# words and single punctuation marks: a tokenizer-free approximation of model tokens
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def _cut(text: str, start: int, limit: int) -> int:
+    """Where to end a window spanning text[start:limit]: last sentence end, else whitespace."""
+    lo = start + (limit - start) // 2  # never shrink a window below half its size
+    cut = -1
+    for match in _SENTENCE_END.finditer(text, lo, limit):
+        cut = match.end()
+    if cut > lo:
+        return cut
+    space = max(text.rfind(" ", lo, limit), text.rfind("\n", lo, limit))
+    return space + 1 if space > lo else limit
+
+
+def _trim(text: str, start: int, end: int) -> Span:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_spans(
+    text: str, size: int = 1000, overlap: int = 100, unit: str = "chars"
+) -> Iterator[Span]:
+    """
+    Lazily split text into overlapping windows, as (start, end) spans.
+      - windows hold at most size chars, or size tokens with unit="tokens"
+      - consecutive windows share up to overlap units, starting on a sentence
+        (else word) boundary
+      - a window ends at its last sentence boundary (else whitespace) past its midpoint
+    A text that fits in one window (or size <= 0) is the single span (0, len(text)).
+    """
+    if unit not in UNITS:
+        raise ValueError(f"unknown chunk unit: {unit}")
+    marks: List[int] = []
+    if unit == "tokens" and size > 0:
+        marks = [m.start() for m in _TOKEN.finditer(text)] + [len(text)]
+    n_units = len(marks) - 1 if marks else len(text)
+    if size <= 0 or n_units <= size:
+        yield 0, len(text)
+        return
+
+    def pos(u: int) -> int:
+        return marks[min(u, n_units)] if marks else min(u, n_units)
+
+    overlap = max(0, min(overlap, size - 1))
+    start_u = 0
+    while True:
+        start = pos(start_u)
+        if start_u + size >= n_units:
+            span = _trim(text, start, len(text))
+            if span[1] > span[0]:
+                yield span
+            return
+        end = _cut(text, start, pos(start_u + size))
+        span = _trim(text, start, end)
+        if span[1] > span[0]:
+            yield span
+        end_u = bisect_left(marks, end) if marks else end
+        nxt = pos(max(start_u + 1, end_u - overlap))
+        # start the overlap on a sentence, else a word, boundary
+        match = _SENTENCE_END.search(text, nxt, end)
+        space = text.find(" ", nxt, end)
+        if match and match.end() < end:
+            nxt = match.end()
+        elif not marks and space != -1 and space + 1 < end:
+            nxt = space + 1
+        start_u = max(start_u + 1, bisect_left(marks, nxt) if marks else nxt)
+
+
+def iter_chunks(
+    texts: Iterable[str], size: int = 1000, overlap: int = 100, unit: str = "chars"
+) -> Iterator[Tuple[int, Span]]:
+    """Streaming chunker stage: (document position, span) for every chunk, in order."""
+    for i, text in enumerate(texts):
+        for span in chunk_spans(text, size, overlap, unit):
+            yield i, span
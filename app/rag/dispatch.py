@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+BatchFn = Callable[[Sequence[str]], List[List[float]]]
+AsyncBatchFn = Callable[[Sequence[str]], Awaitable[List[List[float]]]]
+
+# upper bounds of the batch-size histogram buckets
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class _Batch:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.texts: List[str] = []
+        self.enqueued: List[float] = []
+        self.loop = loop
+        self.full = threading.Event()
+        self.result: Future = Future()
+        self.aresult: Optional[asyncio.Future] = loop.create_future() if loop else None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.started = False
+
+    def add(self, text: str) -> int:
+        self.texts.append(text)
+        self.enqueued.append(time.perf_counter())
+        return len(self.texts) - 1
+
+
+class EmbedDispatcher:
+    """
+    Micro-batcher that coalesces concurrent single-text embed requests.
+    - Requests arriving within max_wait seconds (or until max_batch texts) share
+      one batched provider call; each caller gets back its own vector.
+    - submit() serves threads: the first caller of a window waits for it to
+      close and then runs the batch. asubmit() serves one event loop with a timer.
+    - stats() reports batch sizes (histogram) and queue wait times.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        abatch_fn: AsyncBatchFn,
+        max_batch: int = 64,
+        max_wait: float = 0.002,
+    ) -> None:
+        self.batch_fn = batch_fn
+        self.abatch_fn = abatch_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self._aopen: Optional[_Batch] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.reset_stats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch > 1 and self.max_wait > 0
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.batches = 0
+            self.items = 0
+            self.max_batch_seen = 0
+            self.size_hist: Dict[int, int] = {b: 0 for b in _SIZE_BUCKETS}
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def _record(self, batch: _Batch) -> None:
+        now = time.perf_counter()
+        size = len(batch.texts)
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            bucket = next((b for b in _SIZE_BUCKETS if size <= b), _SIZE_BUCKETS[-1])
+            self.size_hist[bucket] += 1
+            for t in batch.enqueued:
+                self.wait_total += now - t
+                self.wait_max = max(self.wait_max, now - t)
+
+    # thread path
+    def submit(self, text: str) -> List[float]:
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            idx = batch.add(text)
+            if len(batch.texts) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._record(batch)
+            try:
+                batch.result.set_result(self.batch_fn(batch.texts))
+            except BaseException as e:
+                batch.result.set_exception(e)
+        return batch.result.result()[idx]
+
+    # asyncio path
+    async def asubmit(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        batch = self._aopen
+        if batch is None or batch.loop is not loop:
+            batch = self._aopen = _Batch(loop)
+            batch.timer = loop.call_later(self.max_wait, self._aflush, batch)
+        idx = batch.add(text)
+        if len(batch.texts) >= self.max_batch:
+            self._aflush(batch)
+        # shield: one cancelled caller must not cancel the shared batch
+        return (await asyncio.shield(batch.aresult))[idx]
+
+    def _aflush(self, batch: _Batch) -> None:
+        if self._aopen is batch:
+            self._aopen = None
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if batch.started:
+            return
+        batch.started = True
+        self._record(batch)
+        task = batch.loop.create_task(self._arun(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # a task cancelled before its first step never enters _arun; no-op once resolved
+        task.add_done_callback(lambda _: batch.aresult.cancel())
+
+    async def _arun(self, batch: _Batch) -> None:
+        try:
+            batch.aresult.set_result(await self.abatch_fn(batch.texts))
+        except Exception as e:
+            batch.aresult.set_exception(e)
+        except BaseException:
+            # cancelled (e.g. loop shutdown): waiters must not hang on the batch
+            batch.aresult.cancel()
+            raise
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": {f"le_{b}": n for b, n in self.size_hist.items()},
+                "mean_wait_ms": 1000.0 * self.wait_total / self.items if self.items else 0.0,
+                "max_wait_ms": 1000.0 * self.wait_max,
+            }
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
 import hashlib
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+from app.metrics.registry import EMBED_SECONDS, timed
+from app.summarize.clients import get_async_openai_client, get_openai_client
 from app.summarize.config import settings
 
+from .cache import CACHE, cache_key
+from .dispatch import EmbedDispatcher
+
+OPENAI_EMBED_MODEL = "text-embedding-3-small"
+MOCK_EMBED_DIM = 128
+
 
 def _l2_normalize(vec: np.ndarray) -> np.ndarray:
     """Normalize to unit length; returns zeros if norm~=0 to avoid NaNs."""
@@ -20,7 +24,22 @@ def _l2_normalize(vec: np.ndarray) -> np.ndarray:
     return (vec / norm).astype(np.float32)
 
 
-def embed_mock(text: str, dim: int = 128) -> List[float]:
+def _l2_normalize_rows(mat: np.ndarray) -> np.ndarray:
+    """Row-wise _l2_normalize for an (N, dim) matrix; zero/non-finite rows become zeros."""
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    ok = (norms != 0.0) & np.isfinite(norms)
+    out = np.zeros_like(mat, dtype=np.float32)
+    np.divide(mat, norms, out=out, where=ok)
+    return out.astype(np.float32, copy=False)
+
+
+def _chunks(items: Sequence[str], size: int) -> Iterator[Sequence[str]]:
+    size = max(1, size)
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def embed_mock(text: str, dim: int = MOCK_EMBED_DIM) -> List[float]:
     """
     Deterministic, offline embedding for tests/demo.
     - Uses SHA-256 of the text to produce a repeatable vector.
@@ -34,32 +53,185 @@ def embed_mock(text: str, dim: int = 128) -> List[float]:
     return _l2_normalize(vec).tolist()
 
 
-def embed_openai(text: str, model: str = "text-embedding-3-small") -> List[float]:
+def embed_mock_batch(texts: Sequence[str], dim: int = MOCK_EMBED_DIM) -> List[List[float]]:
+    """Vectorized embed_mock: one (N, dim) matrix, same vectors as per-text calls."""
+    if not texts:
+        return []
+    reps = (dim + 31) // 32
+    raw = b"".join((hashlib.sha256(t.encode("utf-8")).digest() * reps)[:dim] for t in texts)
+    mat = np.frombuffer(raw, dtype=np.uint8).reshape(len(texts), dim).astype(np.float32)
+    return _l2_normalize_rows(mat).tolist()
+
+
+def _require_openai() -> None:
+    # imported on first use only, so the mock backend never loads the provider SDK
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        raise RuntimeError(
+            "openai package not available; install `openai` to use embed_openai"
+        ) from None
+    if not settings.openai_api_key:
+        raise RuntimeError("OPENAI_API_KEY not set; cannot use embed_openai")
+
+
+def _rows_in_order(resp) -> List[List[float]]:
+    rows = [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+    return _l2_normalize_rows(np.array(rows, dtype=np.float32)).tolist()
+
+
+def embed_openai(text: str, model: str = OPENAI_EMBED_MODEL) -> List[float]:
     """
     Real embedding via OpenAI, if OPENAI_API_KEY is set.
     - Normalizes to unit length so cosine similarity works reliably.
+    - Uses the shared pooled client.
     """
-    if OpenAI is None:
-        raise RuntimeError("openai package not available; install `openai` to use embed_openai")
-    api_key = settings.openai_api_key
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not set; cannot use embed_openai")
-    client = OpenAI(api_key=api_key)
-    resp = client.embeddings.create(input=text, model=model)
+    _require_openai()
+    resp = get_openai_client().embeddings.create(input=text, model=model)
     vec = np.array(resp.data[0].embedding, dtype=np.float32)
     return _l2_normalize(vec).tolist()
 
 
+def embed_openai_batch(texts: Sequence[str], model: str = OPENAI_EMBED_MODEL) -> List[List[float]]:
+    """
+    Batched OpenAI embeddings.
+    - One multi-input request per settings.embed_batch_size texts on the shared client.
+    - Output order matches input order.
+    """
+    _require_openai()
+    if not texts:
+        return []
+    client = get_openai_client()
+    out: List[List[float]] = []
+    for chunk in _chunks(texts, settings.embed_batch_size):
+        out.extend(_rows_in_order(client.embeddings.create(input=list(chunk), model=model)))
+    return out
+
+
+async def aembed_openai_batch(
+    texts: Sequence[str], model: str = OPENAI_EMBED_MODEL
+) -> List[List[float]]:
+    """embed_openai_batch on the shared AsyncOpenAI client."""
+    _require_openai()
+    if not texts:
+        return []
+    client = get_async_openai_client()
+    out: List[List[float]] = []
+    for chunk in _chunks(texts, settings.embed_batch_size):
+        out.extend(_rows_in_order(await client.embeddings.create(input=list(chunk), model=model)))
+    return out
+
+
+# Coalesces concurrent single-text provider calls (embed/aembed cache misses)
+# into one batched request; looked up late so tests can patch the batch functions.
+DISPATCHER = EmbedDispatcher(
+    lambda texts: embed_openai_batch(texts),
+    lambda texts: aembed_openai_batch(texts),
+    max_batch=settings.embed_dispatch_max_batch,
+    max_wait=settings.embed_dispatch_wait_ms / 1000.0,
+)
+
+
+def _backend(chosen: str) -> str:
+    return "openai" if chosen == "openai" else "mock"
+
+
+def _cache_key(backend: str, text: str) -> bytes:
+    if backend == "openai":
+        return cache_key(backend, OPENAI_EMBED_MODEL, 0, text)
+    return cache_key(backend, "sha256", MOCK_EMBED_DIM, text)
+
+
+def _from_cache(
+    chosen: str, texts: Sequence[str]
+) -> Tuple[List[Optional[List[float]]], Dict[bytes, List[int]]]:
+    """Cached vectors (None on miss) plus the misses grouped by key, in first-seen order."""
+    keys = [_cache_key(chosen, t) for t in texts]
+    out: List[Optional[List[float]]] = [CACHE.get(k) for k in keys]
+    pending: Dict[bytes, List[int]] = {}
+    for i, vec in enumerate(out):
+        if vec is None:
+            pending.setdefault(keys[i], []).append(i)
+    return out, pending
+
+
+def _fill(out: List, pending: Dict[bytes, List[int]], fresh: Sequence[List[float]]) -> List:
+    for (key, positions), vec in zip(pending.items(), fresh):
+        CACHE.put(key, vec)
+        for i in positions:
+            out[i] = list(vec) if i != positions[0] else vec
+    return out
+
+
+@timed(EMBED_SECONDS.labels("embed"))
 def embed(text: str, *, backend: Optional[str] = None) -> List[float]:
     """
     Public entrypoint:
       - backend="openai" to force OpenAI
       - backend="mock" to force mock (for testing)
       - default: follows settings.llm_provider
+    Results are served from / stored in CACHE; concurrent OpenAI misses are
+    batched by DISPATCHER.
     """
-    chosen = (backend or settings.llm_provider or "").lower()
-    if chosen == "openai":
-        return embed_openai(text)
-    if chosen == "mock":
-        return embed_mock(text)
-    return embed_mock(text)
+    chosen = _backend((backend or settings.llm_provider or "").lower())
+    key = _cache_key(chosen, text)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+    if chosen != "openai":
+        vec = embed_mock(text)
+    elif DISPATCHER.enabled:
+        vec = DISPATCHER.submit(text)
+    else:
+        vec = embed_openai(text)
+    CACHE.put(key, vec)
+    return vec
+
+
+@timed(EMBED_SECONDS.labels("embed_batch"))
+def embed_batch(texts: Sequence[str], *, backend: Optional[str] = None) -> List[List[float]]:
+    """
+    Batched embed(): same backend selection, one vector per text in input order.
+    Only cache misses (de-duplicated) are sent to the provider.
+    """
+    chosen = _backend((backend or settings.llm_provider or "").lower())
+    out, pending = _from_cache(chosen, texts)
+    if pending:
+        todo = [texts[positions[0]] for positions in pending.values()]
+        fresh = embed_openai_batch(todo) if chosen == "openai" else embed_mock_batch(todo)
+        _fill(out, pending, fresh)
+    return out
+
+
+@timed(EMBED_SECONDS.labels("aembed"))
+async def aembed(text: str, *, backend: Optional[str] = None) -> List[float]:
+    """Async embed(): awaits the provider instead of blocking; same cache and batching."""
+    chosen = _backend((backend or settings.llm_provider or "").lower())
+    if chosen != "openai" or not DISPATCHER.enabled:
+        return (await _aembed_batch(chosen, [text]))[0]
+    key = _cache_key(chosen, text)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+    vec = await DISPATCHER.asubmit(text)
+    CACHE.put(key, vec)
+    return vec
+
+
+@timed(EMBED_SECONDS.labels("aembed_batch"))
+async def aembed_batch(texts: Sequence[str], *, backend: Optional[str] = None) -> List[List[float]]:
+    """Async embed_batch(); the mock backend is computed inline (no I/O)."""
+    return await _aembed_batch(_backend((backend or settings.llm_provider or "").lower()), texts)
+
+
+async def _aembed_batch(chosen: str, texts: Sequence[str]) -> List[List[float]]:
+    # untimed body of aembed_batch, so aembed() records a single observation
+    out, pending = _from_cache(chosen, texts)
+    if pending:
+        todo = [texts[positions[0]] for positions in pending.values()]
+        if chosen == "openai":
+            fresh = await aembed_openai_batch(todo)
+        else:
+            fresh = embed_mock_batch(todo)
+        _fill(out, pending, fresh)
+    return out
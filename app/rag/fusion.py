@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+FUSIONS = ("rrf", "weighted")
+RRF_K = 60  # rank offset from Cormack et al.; damps the weight of the very top ranks
+
+Ranked = Sequence[Tuple[str, float]]  # (doc id, raw score), best first
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Ranked], weights: Sequence[float], k: int = RRF_K
+) -> Dict[str, float]:
+    """sum(weight / (k + rank)) over the lists a document appears in (ranks from 1)."""
+    fused: Dict[str, float] = {}
+    for ranked, weight in zip(rankings, weights):
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+def weighted_score_fusion(rankings: Sequence[Ranked], weights: Sequence[float]) -> Dict[str, float]:
+    """
+    sum(weight * normalized score); each list is min-max scaled to [0, 1]
+    (all-equal lists count as 1) so keyword counts and cosines are comparable.
+    """
+    fused: Dict[str, float] = {}
+    for ranked, weight in zip(rankings, weights):
+        if not ranked:
+            continue
+        scores = [s for _, s in ranked]
+        lo, hi = min(scores), max(scores)
+        for doc_id, s in ranked:
+            norm = (s - lo) / (hi - lo) if hi > lo else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * norm
+    return fused
+
+
+def fuse(
+    rankings: Sequence[Ranked], weights: Sequence[float], method: str = "rrf"
+) -> List[Tuple[str, float]]:
+    """Fused (doc id, score) pairs, best first; ties keep first-seen order across the lists."""
+    if method == "rrf":
+        fused = reciprocal_rank_fusion(rankings, weights)
+    elif method == "weighted":
+        fused = weighted_score_fusion(rankings, weights)
+    else:
+        raise ValueError(f"unknown fusion: {method}")
+    return sorted(fused.items(), key=lambda kv: -kv[1])
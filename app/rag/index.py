@@ -0,0 +1,447 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .quant import PRECISIONS, FullPrecisionSpill, dequantize, quantize
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    - Uses argpartition instead of a full sort (O(N) + O(k log k)).
+    - Ties are broken by row order (earlier insert wins), matching a stable
+      sort on -score over insertion order.
+    """
+    n = scores.shape[0]
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+        # argpartition picks arbitrarily among rows tied with the k-th score,
+        # so pull every row at or above that threshold before ordering.
+        cand = np.flatnonzero(scores >= scores[part].min())
+    else:
+        cand = np.arange(n)
+    order = np.lexsort((cand, -scores[cand]))
+    return cand[order][:k]
+
+
+def shortlist(scores: np.ndarray, k: int, slack: float = 1e-5) -> np.ndarray:
+    """
+    Ascending indices of every score within slack of the k-th highest.
+    Absorbs the last-bit differences between BLAS kernels (dot vs gemv vs gemm)
+    so the true top-k always survives to the exact rescoring step.
+    """
+    n = scores.shape[0]
+    if k >= n:
+        return np.arange(n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(scores, n - k)[n - k]
+    return np.flatnonzero(scores >= kth - slack)
+
+
+class IndexState(NamedTuple):
+    """
+    What a search reads, published by writers as one atomic attribute swap.
+    Rows [0, n) of mat/scales/ids never change once published; writers only
+    append past n (or grow into a new buffer) and then publish a new state.
+    """
+
+    mat: np.ndarray
+    scales: np.ndarray
+    ids: List[str]  # append-only; only ids[:n] belong to this state
+    n: int
+    spill: Optional[FullPrecisionSpill] = None
+    extra: Any = None  # subclass structures (IVF: centroids and lists)
+    dead: Optional[np.ndarray] = None  # tombstones (bool per row), set in place by delete_rows
+
+
+class Compaction(NamedTuple):
+    """A compaction prepared outside the write lock (see VectorIndex.prepare_compact)."""
+
+    state: IndexState  # what the live rows were copied from
+    kept: np.ndarray  # old row numbers of the copied rows
+    scratch: VectorIndex  # unpublished index holding the copies
+
+
+class VectorIndex:
+    """
+    Dense (N, dim) matrix with a parallel id list.
+    - Rows are appended into a preallocated buffer that doubles when full.
+    - Scoring is a single matrix-vector product over the live rows.
+    - The dimension is fixed by the first vector added.
+    - precision selects the in-memory encoding: float32 (exact), float16, or
+      int8 with a per-vector scale. int8 keeps float32 originals on disk and
+      rescores the top k * rescore candidates with them.
+    - Writers (add/load/clear) serialize on an internal lock and publish an
+      IndexState; searches read one captured state and never take the lock.
+    - delete_rows() only sets tombstones, which searches skip; compact() rewrites
+      the storage without them, holding the write lock only to swap the result in.
+    """
+
+    def __init__(self, capacity: int = 1024, precision: str = "float32", rescore: int = 4) -> None:
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown vector precision: {precision}")
+        self._initial_capacity = max(1, capacity)
+        self.precision = precision
+        self.rescore = max(1, rescore)
+        self._write_lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._write_lock:
+            self._reset()
+            self._publish()
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self._mat = np.empty((0, 0), dtype=self.precision)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._dead: Optional[np.ndarray] = None  # allocated by the first delete
+        self.n_dead = 0
+        # a previous spill may still serve searches holding an older state;
+        # its temp file is closed when the last state referencing it goes away
+        self._spill: Optional[FullPrecisionSpill] = None
+
+    def _publish(self) -> None:
+        self.state = IndexState(
+            self._mat,
+            self._scales,
+            self.ids,
+            len(self.ids),
+            self._spill,
+            self._extra(),
+            self._dead,
+        )
+
+    def _extra(self) -> Any:
+        """Subclass structures to publish with the rows."""
+        return None
+
+    def __len__(self) -> int:
+        return self.state.n
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the live rows as stored (no copy; quantized unless float32)."""
+        state = self.state
+        return state.mat[: state.n]
+
+    @property
+    def nbytes(self) -> int:
+        """In-memory bytes of the live rows (matrix plus int8 scales)."""
+        n = len(self)
+        per_row = self._mat.itemsize * (self.dim or 0)
+        return n * per_row + (n * 4 if self.precision == "int8" else 0)
+
+    def dense(self, rows=slice(None), state: Optional[IndexState] = None) -> np.ndarray:
+        """Float32 view/copy of the selected live rows (dequantized if needed)."""
+        state = state or self.state
+        if self.precision == "float32":
+            return state.mat[: state.n][rows]
+        return dequantize(state.mat[: state.n][rows], state.scales[: state.n][rows])
+
+    def vectors(self) -> np.ndarray:
+        """Best available float32 copy of every stored row, e.g. for snapshots."""
+        state = self.state
+        return self.originals(np.arange(state.n), state)
+
+    def originals(self, rows: np.ndarray, state: Optional[IndexState] = None) -> np.ndarray:
+        """Best available float32 copy of the given rows (full precision for int8)."""
+        state = state or self.state
+        if state.spill is not None:
+            return state.spill.rows(rows)
+        return np.array(self.dense(rows, state), dtype=np.float32)
+
+    def load(self, doc_ids: List[str], mat: np.ndarray) -> None:
+        """
+        Adopt an existing float32 (N, dim) matrix, e.g. a read-only np.memmap.
+        float32 indexes use it without copying; the first append afterwards copies
+        the rows into a growable in-memory buffer. Quantized indexes encode it and
+        keep the mapped matrix as their full-precision originals.
+        """
+        with self._write_lock:
+            self.clear()
+            if not len(doc_ids):
+                return
+            if self.precision == "float32":
+                self.ids = list(doc_ids)
+                self.dim = int(mat.shape[1])
+                self._mat = mat
+                self._scales = np.ones(len(self.ids), dtype=np.float32)
+                self._publish()
+                self._on_append(0, len(self.ids))
+                return
+            self.dim = int(mat.shape[1])
+            if self.precision == "int8":
+                self._spill = FullPrecisionSpill(self.dim, base=mat)
+            self._append_rows(list(doc_ids), mat, spill=False)
+
+    def attach(
+        self,
+        doc_ids: List[str],
+        mat: np.ndarray,
+        dead: Optional[np.ndarray] = None,
+        n_dead: int = 0,
+    ) -> None:
+        """
+        Serve rows straight from an externally owned float32 buffer (e.g. a shared
+        mapping) of at least len(doc_ids) rows, without copying. The owner appends
+        past the published rows and calls attach() again with the same, extended
+        doc_ids list; a different list starts over. dead is the owner's tombstone map.
+        """
+        if self.precision != "float32":
+            raise ValueError("attach() needs a float32 index")
+        with self._write_lock:
+            start = len(self.ids) if doc_ids is self.ids else 0
+            if not start:
+                self._reset()
+            self.ids, self._mat, self._dead, self.n_dead = doc_ids, mat, dead, n_dead
+            if doc_ids:
+                self.dim = int(mat.shape[1])
+            self._publish()
+            self._on_append(start, len(doc_ids))
+
+    def _reserve(self, rows: int) -> None:
+        cap = self._mat.shape[0]
+        if rows <= cap:
+            return
+        new_cap = max(self._initial_capacity, cap)
+        while new_cap < rows:
+            new_cap *= 2
+        # grow into a new buffer; searches holding the old state keep reading the old one
+        grown = np.empty((new_cap, self.dim), dtype=self.precision)
+        scales = np.ones(new_cap, dtype=np.float32)
+        if self.ids:
+            grown[: len(self.ids)] = self._mat[: len(self.ids)]
+            scales[: len(self.ids)] = self._scales[: len(self.ids)]
+        self._mat, self._scales = grown, scales
+        if self._dead is not None:
+            # older states keep the old bitmap and only miss deletes made after this grow
+            dead = np.zeros(new_cap, dtype=bool)
+            dead[: len(self._dead)] = self._dead
+            self._dead = dead
+
+    def _append_rows(
+        self, doc_ids: List[str], arr: np.ndarray, spill: bool = True, publish: bool = True
+    ) -> None:
+        with self._write_lock:
+            n, m = len(self.ids), len(doc_ids)
+            self._reserve(n + m)
+            for lo in range(0, m, 65536):
+                hi = min(m, lo + 65536)
+                chunk = np.asarray(arr[lo:hi], dtype=np.float32)
+                self._mat[n + lo : n + hi], self._scales[n + lo : n + hi] = quantize(
+                    chunk, self.precision
+                )
+                if self.precision == "int8" and spill:
+                    if self._spill is None:
+                        self._spill = FullPrecisionSpill(self.dim)
+                    self._spill.append(chunk)
+            self.ids.extend(doc_ids)
+            if publish:
+                self._publish()
+            self._on_append(n, n + m)
+
+    def add(self, doc_id: str, vec: Sequence[float]) -> bool:
+        """Append one row; returns False (row skipped) on dimension mismatch."""
+        arr = np.asarray(vec, dtype=np.float32).ravel()
+        with self._write_lock:
+            if self.dim is None:
+                if arr.size == 0:
+                    return False
+                self.dim = arr.size
+            if arr.size != self.dim:
+                # dimension mismatch shouldn't happen if all via same backend
+                return False
+            self._append_rows([doc_id], arr[None, :])
+        return True
+
+    def add_many(self, doc_ids: Sequence[str], vecs: Sequence[Sequence[float]]) -> bool:
+        """Append many rows with a single reserve + copy; all-or-nothing on dimension."""
+        if not doc_ids:
+            return True
+        arr = np.asarray(vecs, dtype=np.float32)
+        if arr.ndim != 2 or arr.shape[0] != len(doc_ids) or arr.shape[1] == 0:
+            return False
+        with self._write_lock:
+            if self.dim is None:
+                self.dim = arr.shape[1]
+            if arr.shape[1] != self.dim:
+                return False
+            self._append_rows(list(doc_ids), arr)
+        return True
+
+    def _on_append(self, start: int, end: int) -> None:
+        """Hook for subclasses maintaining extra structure over rows [start, end)."""
+
+    def delete_rows(self, rows: Sequence[int]) -> int:
+        """Tombstone rows (searches skip them at once); returns how many were newly deleted."""
+        rows = np.asarray(rows, dtype=np.intp)
+        with self._write_lock:
+            if not rows.size:
+                return 0
+            if self._dead is None:
+                self._dead = np.zeros(max(self._mat.shape[0], len(self.ids)), dtype=bool)
+                self._publish()
+            fresh = int(np.count_nonzero(~self._dead[rows]))
+            self._dead[rows] = True
+            self.n_dead += fresh
+            return fresh
+
+    def compact(self) -> Optional[np.ndarray]:
+        """
+        Rewrite the storage without tombstoned rows, publishing the result in one step.
+        Returns the surviving old row numbers (new row i was old row kept[i]), or None
+        if there was nothing to drop. Searches holding an older state keep its buffers.
+        """
+        plan = self.prepare_compact()
+        return None if plan is None else self.finish_compact(plan)
+
+    def prepare_compact(self, state: Optional[IndexState] = None) -> Optional[Compaction]:
+        """
+        First half of compact(): copy the live rows of state (default: the current
+        one) into new storage without the write lock, so appends, deletes and searches
+        go on. None if there is nothing to drop. Callers serialize compactions.
+        """
+        state = state or self.state
+        if not self.n_dead or state.dead is None:
+            return None
+        kept = np.flatnonzero(~state.dead[: state.n])
+        scratch = self._scratch()
+        for lo in range(0, kept.size, 65536):
+            rows = kept[lo : lo + 65536]
+            scratch._append_rows([state.ids[r] for r in rows.tolist()], self.originals(rows, state))
+        return Compaction(state, kept, scratch)
+
+    def finish_compact(self, plan: Compaction) -> Optional[np.ndarray]:
+        """
+        Second half of compact(), under the write lock: append the rows added since
+        prepare_compact(), carry over the deletes made since, and publish. Returns
+        kept as compact() does, or None if the rows were replaced meanwhile (clear/load).
+        """
+        with self._write_lock:
+            if self.ids is not plan.state.ids:
+                return None
+            current, kept, scratch = self.state, plan.kept, plan.scratch
+            if current.n > plan.state.n:
+                rows = np.arange(plan.state.n, current.n)
+                scratch._append_rows(
+                    current.ids[plan.state.n : current.n], self.originals(rows, current)
+                )
+                kept = np.concatenate([kept, rows])
+            dead = np.flatnonzero(self._dead[kept])
+            if dead.size:
+                scratch.delete_rows(dead)
+            self._adopt(scratch)
+            self._publish()
+            return kept
+
+    def _scratch(self) -> VectorIndex:
+        """Empty index of the same kind and dimension for prepare_compact() to fill."""
+        scratch = VectorIndex(self._initial_capacity, self.precision, self.rescore)
+        scratch.dim = self.dim
+        return scratch
+
+    def _adopt(self, other: VectorIndex) -> None:
+        self.ids, self.dim = other.ids, other.dim
+        self._mat, self._scales, self._spill = other._mat, other._scales, other._spill
+        self._dead, self.n_dead = other._dead, other.n_dead
+
+    def _score(
+        self, queries: np.ndarray, rows: Optional[np.ndarray], state: IndexState
+    ) -> np.ndarray:
+        """(B, n) scores of all live rows (or the given row numbers) against (B, dim) queries."""
+        live = state.mat[: state.n]
+        if self.precision == "float32":
+            mat = live if rows is None else live[rows]
+            return queries @ mat.T  # cosine similarity because vectors are normalized
+        n = state.n if rows is None else rows.size
+        out = np.empty((queries.shape[0], n), dtype=np.float32)
+        # dequantize in blocks to bound the temporary float32 copy
+        for lo in range(0, n, 65536):
+            hi = min(n, lo + 65536)
+            sel = slice(lo, hi) if rows is None else rows[lo:hi]
+            out[:, lo:hi] = queries @ live[sel].astype(np.float32).T
+            if self.precision == "int8":
+                out[:, lo:hi] *= state.scales[sel]
+        return out
+
+    def _select(
+        self, queries: np.ndarray, k: int, rows: Optional[np.ndarray], state: IndexState
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Per-query top-k among all rows (or the given ascending row numbers).
+        The block matmul only shortlists candidates; each is rescored with a
+        per-row dot (from the float32 originals for int8), so final scores are
+        bitwise independent of how many queries or rows shared the block.
+        """
+        spill = state.spill if self.precision == "int8" else None
+        wanted = k * self.rescore if spill is not None else k
+        dead = None
+        if state.dead is not None:
+            dead = state.dead[: state.n] if rows is None else state.dead[rows]
+        out = []
+        for qv, scores in zip(queries, self._score(queries, rows, state)):
+            if dead is not None:
+                # tombstones sink below every live row and are dropped after the shortlist
+                scores[dead] = -np.inf
+                cand = shortlist(scores, wanted)
+                cand = cand[~dead[cand]]
+            else:
+                cand = shortlist(scores, wanted)
+            cand = np.sort(cand if rows is None else rows[cand])
+            full = spill.rows(cand) if spill is not None else self.dense(cand, state)
+            # per-row dot, exactly as the original per-document loop scored
+            exact = np.array([qv @ row for row in full], dtype=np.float32)
+            out.append([(int(cand[i]), float(exact[i])) for i in top_k_indices(exact, k)])
+        return out
+
+    def search(
+        self, qv: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine score) pairs; empty on dimension mismatch."""
+        return self.search_many(qv.reshape(1, -1), k, nprobe=nprobe)[0]
+
+    def search_many(
+        self, queries: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Top-k per row of a (B, dim) query matrix via Q @ D^T, in query order.
+        Single-query search() goes through here too, so both rank identically.
+        nprobe is ignored by the exact index.
+        """
+        state = self.state
+        return [
+            [(state.ids[row], score) for row, score in hits]
+            for hits in self.search_rows(queries, k, nprobe=nprobe, state=state)
+        ]
+
+    def search_rows(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        state: Optional[IndexState] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        search_many() returning row numbers (append order) instead of ids.
+        Reads only the given state (default: the current one), so it is safe
+        to run while other threads append.
+        """
+        state = state or self.state
+        dim = state.mat.shape[1] if state.n else None
+        if dim is None or queries.ndim != 2 or queries.shape[1] != dim:
+            return [[] for _ in range(len(queries))]
+        # bound the (B, N) score matrix to ~16M floats per block of queries
+        step = max(1, (1 << 24) // max(1, state.n))
+        out: List[List[Tuple[int, float]]] = []
+        for lo in range(0, queries.shape[0], step):
+            out.extend(self._select(queries[lo : lo + step], k, None, state))
+        return out
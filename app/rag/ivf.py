@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import sys
+import threading
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from .index import IndexState, VectorIndex, top_k_indices
+
+
+def spherical_kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Unit-norm k-means centroids (cosine assignment) for rows of data."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        filled = norms[:, 0] > 0  # empty clusters keep their previous centroid
+        centroids[filled] = sums[filled] / norms[filled]
+    return centroids.astype(np.float32)
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file ANN index over the same (N, dim) matrix as VectorIndex.
+    - Centroids are trained with spherical k-means on a background thread once
+      an append brings the index to min_train rows; until then search is exact.
+    - After training, every appended row is assigned to its nearest centroid.
+    - search() scores only the rows of the nprobe closest lists.
+    """
+
+    def __init__(
+        self,
+        nlist: int = 256,
+        nprobe: int = 8,
+        min_train: Optional[int] = None,
+        capacity: int = 1024,
+        precision: str = "float32",
+    ) -> None:
+        self.nlist = max(1, nlist)
+        self.nprobe = max(1, nprobe)
+        self.min_train = min_train if min_train is not None else 8 * self.nlist
+        self._trainer: Optional[threading.Thread] = None
+        super().__init__(capacity=capacity, precision=precision)
+
+    def _reset(self) -> None:
+        super()._reset()
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        # per list: (length it was built at, row array); rebuilt once the list grows
+        self._list_arrays: List[Tuple[int, np.ndarray]] = []
+
+    def _extra(self) -> Any:
+        return (self.centroids, self._lists, self._list_arrays)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self) -> None:
+        """
+        (Re)train centroids on a sample of the current rows and reassign every row.
+        k-means and the assignment of the captured rows run without the write lock;
+        it is only held to assign rows appended meanwhile and publish. Starts over
+        if the rows were replaced meanwhile (clear, load or compact).
+        """
+        while True:
+            state = self.state
+            if state.n == 0:
+                return
+            nlist = min(self.nlist, state.n)
+            rng = np.random.default_rng(0)
+            sample_size = min(state.n, 64 * nlist)
+            rows = np.sort(rng.choice(state.n, size=sample_size, replace=False))
+            centroids = spherical_kmeans(np.asarray(self.dense(rows, state)), nlist)
+            lists: List[List[int]] = [[] for _ in range(nlist)]
+            self._assign(0, state.n, centroids, lists, state)
+            with self._write_lock:
+                if self.ids is not state.ids:
+                    continue
+                self.centroids = centroids
+                self._lists = lists
+                self._list_arrays = [(0, np.empty(0, dtype=np.intp)) for _ in range(nlist)]
+                self._assign(state.n, len(self.ids), centroids, lists)
+                self._publish()
+                return
+
+    def wait_trained(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background training run to finish; returns whether centroids exist."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+        return self.trained
+
+    def _assign(
+        self,
+        start: int,
+        end: int,
+        centroids: Optional[np.ndarray] = None,
+        lists: Optional[List[List[int]]] = None,
+        state: Optional[IndexState] = None,
+        chunk: int = 65536,
+    ) -> None:
+        # lists only grow, so searches of older states just ignore rows >= their n
+        centroids = self.centroids if centroids is None else centroids
+        lists = self._lists if lists is None else lists
+        for lo in range(start, end, chunk):
+            hi = min(end, lo + chunk)
+            nearest = np.argmax(self.dense(slice(lo, hi), state) @ centroids.T, axis=1)
+            for row, c in enumerate(nearest.tolist(), start=lo):
+                lists[c].append(row)
+
+    def _scratch(self) -> IVFIndex:
+        # keeps the trained centroids: copied rows are assigned as prepare_compact() appends them
+        scratch = IVFIndex(
+            self.nlist, self.nprobe, sys.maxsize, self._initial_capacity, self.precision
+        )
+        scratch.dim, centroids = self.dim, self.centroids
+        if centroids is not None:
+            scratch.centroids = centroids
+            scratch._lists = [[] for _ in range(len(centroids))]
+            scratch._list_arrays = [(0, np.empty(0, dtype=np.intp)) for _ in scratch._lists]
+        return scratch
+
+    def _adopt(self, other: VectorIndex) -> None:
+        super()._adopt(other)
+        self.centroids, self._lists = other.centroids, other._lists
+        self._list_arrays = other._list_arrays
+        if not self.trained:
+            self._maybe_train()  # untrained when compaction started: train the compacted rows
+
+    def _on_append(self, start: int, end: int) -> None:
+        # called with the write lock held
+        if self.trained:
+            self._assign(start, end)
+        else:
+            self._maybe_train()
+
+    def _maybe_train(self) -> None:
+        if len(self.ids) >= self.min_train and not (self._trainer and self._trainer.is_alive()):
+            self._trainer = threading.Thread(target=self.train, name="ivf-train", daemon=True)
+            self._trainer.start()
+
+    @staticmethod
+    def _list_rows(lists, arrays, c: int, n: int) -> np.ndarray:
+        posting = lists[c]
+        size = len(posting)
+        built, arr = arrays[c]
+        if built != size:
+            arr = np.asarray(posting[:size], dtype=np.intp)
+            arrays[c] = (size, arr)
+        return arr[: np.searchsorted(arr, n)]  # rows are ascending
+
+    def search_rows(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+        state: Optional[IndexState] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """Per-query top-k over the nprobe closest inverted lists (defaults to self.nprobe)."""
+        state = state or self.state
+        if not state.n or queries.ndim != 2 or queries.shape[1] != state.mat.shape[1]:
+            return [[] for _ in range(len(queries))]
+        # exact until the background training publishes centroids
+        centroids, lists, arrays = state.extra
+        probes = max(1, nprobe or self.nprobe)
+        if centroids is None or probes >= len(lists):
+            return super().search_rows(queries, k, state=state)
+        out = []
+        for qv, cscores in zip(queries, queries @ centroids.T):
+            closest = top_k_indices(cscores, probes)
+            # sorted rows keep ties in insertion order, like the exact path
+            rows = np.sort(
+                np.concatenate(
+                    [self._list_rows(lists, arrays, c, state.n) for c in closest.tolist()]
+                )
+            )
+            out.extend(self._select(qv[None, :], k, rows, state))
+        return out
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def ngrams(text: str, n: int) -> Set[str]:
+    """Distinct character n-grams of text (empty if text is shorter than n)."""
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """
+    Incrementally maintained character n-gram (trigram by default) posting index.
+    - Each document gets an ordinal in insertion order; postings hold ordinals.
+    - Documents are indexed lowercased, so lookups are case-insensitive.
+    - candidates() only narrows the search: callers must still verify the match.
+    - remove() tombstones a document's ordinal; its postings stay until the owner
+      rebuilds the index (see DocumentStore.compact).
+    """
+
+    def __init__(self, n: int = 3) -> None:
+        self.n = n
+        self.clear()
+
+    def clear(self) -> None:
+        self.ids: List[str] = []
+        self.lowered: List[str] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.dead = bytearray()  # 1 per removed ordinal
+        self.n_dead = 0
+        self._ordinal: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: str, text: str) -> None:
+        ordinal = len(self.ids)
+        lowered = text.lower()
+        self.ids.append(doc_id)
+        self.lowered.append(lowered)
+        self.dead.append(0)
+        self._ordinal[doc_id] = ordinal
+        # ordinals only grow, so every posting list stays sorted
+        for gram in ngrams(lowered, self.n):
+            self.postings[gram].append(ordinal)
+
+    def remove(self, doc_id: str) -> bool:
+        ordinal = self._ordinal.pop(doc_id, None)
+        if ordinal is None:
+            return False
+        self.dead[ordinal] = 1
+        self.n_dead += 1
+        return True
+
+    def candidates(self, keyword: str, limit: Optional[int] = None) -> Iterable[int]:
+        """
+        Ordinals (ascending) of documents that may contain the lowercased keyword.
+        Keywords shorter than n fall back to every document. Removed ones are skipped.
+        limit bounds the ordinals to the first limit documents, so a reader can
+        ignore documents a concurrent add() has only partly indexed.
+        """
+        limit = len(self.lowered) if limit is None else limit
+        dead = self.dead
+        if len(keyword) < self.n:
+            return range(limit) if not self.n_dead else [o for o in range(limit) if not dead[o]]
+        lists = []
+        for gram in ngrams(keyword, self.n):
+            posting = self.postings.get(gram)
+            if not posting:
+                return ()
+            lists.append(posting)
+        lists.sort(key=len)
+        found = set(lists[0])
+        for posting in lists[1:]:
+            found.intersection_update(posting)
+            if not found:
+                return ()
+        return sorted(o for o in found if o < limit and not dead[o])
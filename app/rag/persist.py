@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+SNAPSHOT_VERSION = 2  # 2 added vector_spans.i64; version 1 snapshots still load
+SNAPSHOT_DIR = "snapshot"
+WAL_FILE = "wal.log"
+
+# Snapshot layout (all little-endian, inside <path>/snapshot/):
+#   meta.json                 {"version", "count", "rows", "dim"}
+#   ids.bin / ids.off         UTF-8 id blob + int64 offsets (count + 1)
+#   texts.bin / texts.off     UTF-8 text blob + int64 offsets (count + 1)
+#   vectors.f32               raw float32 matrix (rows, dim), opened with np.memmap
+#   vector_rows.i64           doc ordinal of every vector row
+#   vector_spans.i64          (rows, 2) [start, end) chunk offsets into the doc text
+
+
+@dataclass
+class Snapshot:
+    ids: List[str]
+    texts: List[str]
+    vector_rows: np.ndarray  # (rows,) int64 doc ordinals
+    vectors: np.ndarray  # (rows, dim) float32, memory-mapped read-only
+    vector_spans: Optional[np.ndarray] = None  # (rows, 2) int64; None: whole documents
+
+
+def _write_strings(path: str, name: str, items: Sequence[str]) -> None:
+    encoded = [s.encode("utf-8") for s in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(path, f"{name}.bin"), "wb") as fh:
+        fh.write(b"".join(encoded))
+    offsets.tofile(os.path.join(path, f"{name}.off"))
+
+
+def _read_strings(path: str, name: str, count: int) -> List[str]:
+    offsets = np.fromfile(os.path.join(path, f"{name}.off"), dtype=np.int64, count=count + 1)
+    with open(os.path.join(path, f"{name}.bin"), "rb") as fh:
+        blob = fh.read()
+    bounds = offsets.tolist()
+    return [blob[bounds[i] : bounds[i + 1]].decode("utf-8") for i in range(count)]
+
+
+def _fsync_dir(path: str) -> None:
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_snapshot(
+    path: str,
+    ids: Sequence[str],
+    texts: Sequence[str],
+    vector_rows: Sequence[int],
+    vectors: np.ndarray,
+    vector_spans: Optional[Sequence[Sequence[int]]] = None,
+) -> None:
+    """
+    Write a snapshot to <path>/snapshot atomically (tmp dir + rename). The previous
+    snapshot is kept as snapshot.old until the new one is in place, and read_snapshot
+    falls back to it, so a crash between the two renames loses nothing.
+    """
+    os.makedirs(path, exist_ok=True)
+    final = os.path.join(path, SNAPSHOT_DIR)
+    tmp = final + ".tmp"
+    old = final + ".old"
+    if not os.path.exists(final) and os.path.exists(old):
+        # an earlier write crashed between the renames: old is the last good snapshot
+        os.rename(old, final)
+        _fsync_dir(path)
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    mat = np.ascontiguousarray(vectors, dtype=np.float32)
+    _write_strings(tmp, "ids", ids)
+    _write_strings(tmp, "texts", texts)
+    mat.tofile(os.path.join(tmp, "vectors.f32"))
+    np.asarray(vector_rows, dtype=np.int64).tofile(os.path.join(tmp, "vector_rows.i64"))
+    if vector_spans is None:
+        lengths = [len(texts[r]) for r in vector_rows]
+        vector_spans = [(0, n) for n in lengths]
+    spans = np.asarray(vector_spans, dtype=np.int64).reshape(-1, 2)
+    spans.tofile(os.path.join(tmp, "vector_spans.i64"))
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "count": len(ids),
+        "rows": int(mat.shape[0]),
+        "dim": int(mat.shape[1]) if mat.ndim == 2 else 0,
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+    for name in os.listdir(tmp):
+        with open(os.path.join(tmp, name), "rb") as fh:
+            os.fsync(fh.fileno())
+
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(final):
+        os.rename(final, old)
+    os.rename(tmp, final)
+    _fsync_dir(path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Map the snapshot under <path>/snapshot, or snapshot.old when a write crashed
+    between its renames; None if there is none yet.
+    """
+    for snap in (os.path.join(path, SNAPSHOT_DIR), os.path.join(path, SNAPSHOT_DIR + ".old")):
+        meta_path = os.path.join(snap, "meta.json")
+        if os.path.exists(meta_path):
+            break
+    else:
+        return None
+    with open(meta_path) as fh:
+        meta = json.load(fh)
+    if meta.get("version") not in (1, SNAPSHOT_VERSION):
+        raise RuntimeError(f"unsupported snapshot version: {meta.get('version')}")
+    count, rows, dim = meta["count"], meta["rows"], meta["dim"]
+    if rows and dim:
+        vectors = np.memmap(
+            os.path.join(snap, "vectors.f32"), dtype=np.float32, mode="r", shape=(rows, dim)
+        )
+    else:
+        vectors = np.empty((0, dim), dtype=np.float32)
+    return Snapshot(
+        ids=_read_strings(snap, "ids", count),
+        texts=_read_strings(snap, "texts", count),
+        vector_rows=np.fromfile(os.path.join(snap, "vector_rows.i64"), dtype=np.int64),
+        vectors=vectors,
+        vector_spans=(
+            np.fromfile(os.path.join(snap, "vector_spans.i64"), dtype=np.int64).reshape(-1, 2)
+            if meta["version"] >= 2
+            else None
+        ),
+    )
+
+
+class WriteAheadLog:
+    """
+    Append-only JSON-lines log of store mutations since the last snapshot.
+    Records: {"op": "add", "id", "text", "spans", "vecs"} (one vector per chunk span),
+    {"op": "put", ...} (same fields; replaces the document), {"op": "delete", "id"}
+    and {"op": "clear"}; version 1 adds {"op": "add", "id", "text", "vec"} still replay.
+    A torn trailing line (crash mid-write) is ignored on replay.
+
+    With fsync (RAG_WAL_FSYNC, the default) every write is fsynced before it
+    returns, so an acknowledged write survives power loss; without it writes are
+    only flushed to the OS and survive a process crash but not a machine crash.
+    """
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        self.path = os.path.join(path, WAL_FILE)
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        self._drop_torn_tail()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _drop_torn_tail(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as fh:
+            data = fh.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                fh.truncate(end)
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                if not line.endswith("\n"):
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+    def _write(self, records: Sequence[Dict[str, Any]]) -> None:
+        self._fh.write("".join(json.dumps(r) + "\n" for r in records))
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+
+    def log_add(
+        self,
+        doc_ids: Sequence[str],
+        texts: Sequence[str],
+        spans: Sequence[Sequence[Sequence[int]]],
+        vecs: Sequence[Any],
+        op: str = "add",
+    ) -> None:
+        """Log documents with their chunk spans; vecs holds one vector per span, flattened."""
+        records, row = [], 0
+        for d, t, sp in zip(doc_ids, texts, spans):
+            chunk_vecs = vecs[row : row + len(sp)]
+            row += len(sp)
+            records.append(
+                {
+                    "op": op,
+                    "id": d,
+                    "text": t,
+                    "spans": [list(s) for s in sp],
+                    "vecs": np.asarray(chunk_vecs, dtype=float).tolist(),
+                }
+            )
+        self._write(records)
+
+    def log_delete(self, doc_ids: Sequence[str]) -> None:
+        self._write([{"op": "delete", "id": d} for d in doc_ids])
+
+    def log_clear(self) -> None:
+        self._write([{"op": "clear"}])
+
+    def reset(self) -> None:
+        """Truncate after a successful snapshot."""
+        self._fh.close()
+        self._fh = open(self.path, "w", encoding="utf-8")
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Optional, Tuple
+
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def quantize(arr: np.ndarray, precision: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode (n, dim) float32 rows for storage; returns (rows, per-row scales).
+    - float32 / float16: plain cast, scales are all 1
+    - int8: symmetric per-vector scale max|v| / 127
+    """
+    scales = np.ones(arr.shape[0], dtype=np.float32)
+    if precision == "int8":
+        peak = np.abs(arr).max(axis=1) if arr.size else scales
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        return np.rint(arr / scales[:, None]).astype(np.int8), scales
+    return arr.astype(precision), scales
+
+
+def dequantize(rows: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    out = rows.astype(np.float32)
+    if rows.dtype == np.int8:
+        out *= scales[:, None]
+    return out
+
+
+class FullPrecisionSpill:
+    """
+    Float32 originals of quantized rows, kept on disk instead of in RAM.
+    - base: optional read-only (n, dim) matrix, e.g. a snapshot memmap, holding rows [0, n)
+    - later rows are appended to an anonymous temp file (removed on close/exit)
+      and read back via np.memmap
+    Used to rescore the top quantized candidates in full precision.
+    """
+
+    def __init__(self, dim: int, base: Optional[np.ndarray] = None, dir: Optional[str] = None):
+        self.dim = dim
+        self.base = base
+        self._n_base = 0 if base is None else int(base.shape[0])
+        self._fh = tempfile.TemporaryFile(prefix="vectors-", suffix=".f32", dir=dir)
+        self._n = 0
+        self._map: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self._n_base + self._n
+
+    def append(self, arr: np.ndarray) -> None:
+        self._fh.seek(0, os.SEEK_END)
+        self._fh.write(np.ascontiguousarray(arr, dtype=np.float32).tobytes())
+        self._fh.flush()
+        self._n += arr.shape[0]
+
+    def _mapped(self) -> np.ndarray:
+        # append() bumps _n only after the bytes are written, so mapping _n rows is safe
+        # while another thread appends; readers keep whichever map they fetched
+        mapped, n = self._map, self._n
+        if mapped is None or mapped.shape[0] != n:
+            mapped = self._map = np.memmap(
+                self._fh, dtype=np.float32, mode="r", shape=(n, self.dim)
+            )
+        return mapped
+
+    def rows(self, idx: np.ndarray) -> np.ndarray:
+        idx = np.asarray(idx, dtype=np.intp)
+        out = np.empty((idx.size, self.dim), dtype=np.float32)
+        in_base = idx < self._n_base
+        if in_base.any():
+            out[in_base] = self.base[idx[in_base]]
+        if not in_base.all():
+            out[~in_base] = self._mapped()[idx[~in_base] - self._n_base]
+        return out
+
+    def close(self) -> None:
+        self._map = None
+        self._fh.close()
@@ -1,6 +1,10 @@
+from typing import List, Literal, Optional
+
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from .cache import CACHE
+from .embeddings import DISPATCHER
 from .store import STORE
 
 router = APIRouter(prefix="/rag", tags=["rag"])
@@ -10,24 +14,109 @@ class AddRequest(BaseModel):
     text: str
 
 
+class AddBatchRequest(BaseModel):
+    texts: List[str]
+
+
 class QueryRequest(BaseModel):
     query: str
     limit: int = 3
+    nprobe: Optional[int] = Field(None, ge=1, description="IVF lists to probe (ivf index only)")
+
+
+class HybridQueryRequest(BaseModel):
+    query: str
+    limit: int = 3
+    fusion: Literal["rrf", "weighted"] = "rrf"
+    keyword_weight: float = Field(1.0, ge=0.0)
+    vector_weight: float = Field(1.0, ge=0.0)
+    nprobe: Optional[int] = Field(None, ge=1, description="IVF lists to probe (ivf index only)")
+
+
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    limit: int = 3
+    nprobe: Optional[int] = Field(None, ge=1, description="IVF lists to probe (ivf index only)")
 
 
 @router.post("/add")
-def add_doc(req: AddRequest):
+async def add_doc(req: AddRequest):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
-    doc_id = STORE.add(req.text)
+    doc_id = await STORE.aadd(req.text)
     return {"id": doc_id}
 
 
+@router.post("/add_batch")
+async def add_docs(req: AddBatchRequest):
+    if not req.texts:
+        raise HTTPException(status_code=400, detail="Texts cannot be empty")
+    for i, text in enumerate(req.texts):
+        if not text.strip():
+            raise HTTPException(status_code=400, detail=f"Text at index {i} cannot be empty")
+    return {"ids": await STORE.aadd_many(req.texts)}
+
+
 @router.post("/query")
 def query_docs(req: QueryRequest):
     return {"results": STORE.query(req.query, limit=req.limit)}
 
 
 @router.post("/query_vector")
-def query_vector(req: QueryRequest):
-    return {"results": STORE.query_vector(req.query, limit=req.limit)}
+async def query_vector(req: QueryRequest):
+    return {"results": await STORE.aquery_vector(req.query, limit=req.limit, nprobe=req.nprobe)}
+
+
+@router.post("/query_hybrid")
+async def query_hybrid(req: HybridQueryRequest):
+    results = await STORE.aquery_hybrid(
+        req.query,
+        limit=req.limit,
+        fusion=req.fusion,
+        keyword_weight=req.keyword_weight,
+        vector_weight=req.vector_weight,
+        nprobe=req.nprobe,
+    )
+    return {"results": results}
+
+
+@router.post("/query_vector_batch")
+async def query_vector_batch(req: QueryBatchRequest):
+    results = await STORE.aquery_vector_batch(req.queries, limit=req.limit, nprobe=req.nprobe)
+    return {"results": results}
+
+
+@router.get("/embed_cache")
+async def embed_cache_stats():
+    return CACHE.stats()
+
+
+@router.get("/embed_dispatch")
+async def embed_dispatch_stats():
+    return DISPATCHER.stats()
+
+
+@router.post("/snapshot")
+def snapshot_store():
+    try:
+        STORE.snapshot()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    return {"status": "ok", "count": len(STORE.docs)}
+
+
+@router.delete("/{doc_id}")
+def delete_doc(doc_id: str):
+    if not STORE.delete(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"id": doc_id, "deleted": True}
+
+
+@router.put("/{doc_id}")
+async def update_doc(doc_id: str, req: AddRequest):
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    updated = await STORE.aupdate(doc_id, req.text)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"id": doc_id, "updated": updated}
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import fcntl
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.summarize.config import settings
+
+from .chunking import Span
+from .ngram import NgramIndex
+from .persist import WriteAheadLog, write_snapshot
+from .store import DocumentStore, _Version
+
+# Arena layout (inside <root>/, every file mapped MAP_SHARED by every process):
+#   lock                      flock()ed by the one process writing at a time
+#   header.i64                int64[8]: seq, epoch, docs, rows, dim, live docs, dead rows;
+#                             then int64[8]: the header being published, written before seq
+#                             goes odd, so a writer dying mid-publish can be rolled forward
+#   epoch-<n>/docs.i64        (docs, 6): blob start, id end / text start, text end,
+#                             alive, first row, end row
+#   epoch-<n>/blob.bin        UTF-8 id + text of every document, back to back
+#   epoch-<n>/rows.i64        (rows, 3): doc slot, chunk start, chunk end
+#   epoch-<n>/vectors.f32     (rows, dim) float32
+#   epoch-<n>/dead.u8         tombstone per row
+# Files only grow (sparse, doubling) and slots/rows are only appended, so a reader
+# bounded by the header counts never sees a partial write. clear() and compact()
+# write a new epoch directory and switch to it in one header update.
+
+_HEADER_FIELDS = 8
+_MIN_ROWS = 1024
+_READ_TIMEOUT = 5.0  # seconds a reader waits for a publish to finish
+_REPAIR_INTERVAL = 0.01  # seconds between a waiting reader's attempts to take over a dead writer
+
+
+class ArenaHeader(NamedTuple):
+    seq: int  # odd while a writer is publishing
+    epoch: int
+    docs: int  # document slots used (deleted and replaced ones included)
+    rows: int  # vector rows used (tombstoned ones included)
+    dim: int
+    live: int  # documents not deleted
+    dead: int  # tombstoned rows
+
+
+class SharedArena:
+    """
+    Corpus storage in memory-mapped files shared by every worker process.
+    - One writer at a time: writing() holds an exclusive flock() on <root>/lock.
+    - Readers never lock: header() is a seqlock read of the published counts,
+      and data below those counts is immutable (tombstones aside).
+    - A writer that dies mid-publish leaves seq odd; the next writer, or a waiting
+      reader once no process holds the lock, rolls the pending header forward.
+    Put root on tmpfs (/dev/shm, the default) to keep it in shared memory.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(root, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        path = os.path.join(root, "header.i64")
+        with self._flock():
+            with open(path, "ab") as fh:
+                if fh.tell() < 16 * _HEADER_FIELDS:  # all zeros: epoch 0, empty
+                    fh.truncate(16 * _HEADER_FIELDS)
+        self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(2 * _HEADER_FIELDS,))
+        self._maps: Dict[Tuple[int, str], np.ndarray] = {}
+
+    @contextmanager
+    def _flock(self) -> Iterator[None]:
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @property
+    def generation(self) -> int:
+        """Changes with every published write; cheap to poll."""
+        return int(self._header[0])
+
+    def header(self, timeout: float = _READ_TIMEOUT) -> ArenaHeader:
+        """
+        Seqlock read of the published header. While seq stays odd the reader
+        periodically tries to take over from a dead writer; TimeoutError if the
+        publish has not finished after timeout seconds.
+        """
+        deadline = retry_at = None
+        while True:
+            seq = int(self._header[0])
+            if seq % 2 == 0:
+                fields = self._header[:7].tolist()
+                if fields[0] == seq == int(self._header[0]):
+                    return ArenaHeader(*fields)
+            else:
+                now = time.monotonic()
+                if deadline is None:
+                    deadline, retry_at = now + timeout, now + _REPAIR_INTERVAL
+                elif now >= deadline:
+                    raise TimeoutError(f"shared arena {self.root}: publish did not finish")
+                elif now >= retry_at:
+                    retry_at = now + _REPAIR_INTERVAL
+                    self._try_repair()
+            time.sleep(0)
+
+    def _try_repair(self) -> None:
+        # a lock on a separate open file conflicts with every holder, this process included
+        fd = os.open(os.path.join(self.root, "lock"), os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # a live writer is still publishing
+            self._repair()
+        finally:
+            os.close(fd)  # releases the lock
+
+    def _repair(self) -> None:
+        # call with the lock held: an odd seq now means its writer died mid-publish
+        seq = int(self._header[0])
+        if seq % 2:
+            self._header[1:7] = self._header[_HEADER_FIELDS + 1 : _HEADER_FIELDS + 7]
+            self._header[0] = seq + 1
+
+    @contextmanager
+    def writing(self) -> Iterator[ArenaHeader]:
+        """Exclusive write access across processes; yields the current header."""
+        with self._flock():
+            self._repair()
+            yield self.header()
+
+    def forget(self, epoch: int) -> None:
+        """Drop this process's cached maps of epochs before epoch (holders keep theirs)."""
+        self._maps = {key: arr for key, arr in self._maps.items() if key[0] >= epoch}
+
+    def _publish(self, h: ArenaHeader) -> ArenaHeader:
+        seq = int(self._header[0])
+        self._header[_HEADER_FIELDS + 1 : _HEADER_FIELDS + 7] = h[1:]  # complete before seq is odd
+        self._header[0] = seq + 1
+        self._header[1:7] = h[1:]
+        self._header[0] = seq + 2
+        return h._replace(seq=seq + 2)
+
+    def _dir(self, epoch: int) -> str:
+        return os.path.join(self.root, f"epoch-{epoch}")
+
+    def _map(self, epoch: int, name: str, dtype, tail: tuple, need: int) -> np.ndarray:
+        """Map epoch-<epoch>/name with room for need rows (only writers ask for more)."""
+        arr = self._maps.get((epoch, name))
+        if arr is not None and arr.shape[0] >= need:
+            return arr
+        path = os.path.join(self._dir(epoch), name)
+        row_bytes = np.dtype(dtype).itemsize * int(np.prod(tail, dtype=np.int64))
+        rows = os.path.getsize(path) // row_bytes if os.path.exists(path) else 0
+        if rows < need:
+            rows = max(_MIN_ROWS, rows)
+            while rows < need:
+                rows *= 2
+            os.makedirs(self._dir(epoch), exist_ok=True)
+            with open(path, "ab") as fh:
+                fh.truncate(rows * row_bytes)
+        if rows == 0:
+            return np.zeros((0, *tail), dtype=dtype)
+        arr = self._maps[epoch, name] = np.memmap(path, dtype=dtype, mode="r+", shape=(rows, *tail))
+        return arr
+
+    def _blob_used(self, h: ArenaHeader) -> int:
+        return int(self.docs(h)[h.docs - 1, 2]) if h.docs else 0
+
+    def docs(self, h: ArenaHeader, need: Optional[int] = None) -> np.ndarray:
+        return self._map(h.epoch, "docs.i64", np.int64, (6,), h.docs if need is None else need)
+
+    def blob(self, h: ArenaHeader, need: Optional[int] = None) -> np.ndarray:
+        need = self._blob_used(h) if need is None else need
+        return self._map(h.epoch, "blob.bin", np.uint8, (), need)
+
+    def rows(self, h: ArenaHeader, need: Optional[int] = None) -> np.ndarray:
+        return self._map(h.epoch, "rows.i64", np.int64, (3,), h.rows if need is None else need)
+
+    def vectors(self, h: ArenaHeader, need: Optional[int] = None) -> np.ndarray:
+        need = h.rows if need is None else need
+        return self._map(h.epoch, "vectors.f32", np.float32, (h.dim,), need)
+
+    def dead(self, h: ArenaHeader, need: Optional[int] = None) -> np.ndarray:
+        return self._map(h.epoch, "dead.u8", np.bool_, (), h.rows if need is None else need)
+
+    # writer side; call inside writing() with the header it yielded (or the last one returned)
+    def append(
+        self,
+        h: ArenaHeader,
+        doc_ids: Sequence[str],
+        texts: Sequence[str],
+        spans: Sequence[Sequence[Span]],
+        vecs: Sequence,
+        publish: bool = True,
+    ) -> ArenaHeader:
+        """
+        Append documents with their chunk rows (vecs: one per span, flattened) and
+        publish the new counts. Rows are skipped (docs kept) on a dimension mismatch.
+        """
+        arr = np.asarray(vecs, dtype=np.float32)
+        n_rows = sum(len(sp) for sp in spans)
+        dim = h.dim or (arr.shape[1] if arr.ndim == 2 and n_rows else 0)
+        keep_rows = arr.ndim == 2 and arr.shape == (n_rows, dim) and dim > 0
+        encoded = [(d.encode("utf-8"), t.encode("utf-8")) for d, t in zip(doc_ids, texts)]
+        blob_start = self._blob_used(h)
+        blob_end = blob_start + sum(len(i) + len(t) for i, t in encoded)
+        docs = self.docs(h, h.docs + len(doc_ids))
+        blob = self.blob(h, blob_end)
+        table = np.empty((len(doc_ids), 6), dtype=np.int64)
+        pos, row = blob_start, h.rows
+        for k, ((id_bytes, text_bytes), sp) in enumerate(zip(encoded, spans)):
+            end = pos + len(id_bytes) + len(text_bytes)
+            blob[pos:end] = np.frombuffer(id_bytes + text_bytes, dtype=np.uint8)
+            rows_end = row + len(sp) if keep_rows else row
+            table[k] = (pos, pos + len(id_bytes), end, 1, row, rows_end)
+            pos, row = end, rows_end
+        docs[h.docs : h.docs + len(doc_ids)] = table
+        if keep_rows:
+            slots = np.repeat(np.arange(h.docs, h.docs + len(doc_ids)), [len(sp) for sp in spans])
+            rows = self.rows(h, h.rows + n_rows)
+            rows[h.rows : h.rows + n_rows, 0] = slots
+            rows[h.rows : h.rows + n_rows, 1:] = [span for sp in spans for span in sp]
+            self.vectors(h._replace(dim=dim), h.rows + n_rows)[h.rows : h.rows + n_rows] = arr
+            self.dead(h, h.rows + n_rows)
+        new = h._replace(
+            docs=h.docs + len(doc_ids),
+            rows=h.rows + (n_rows if keep_rows else 0),
+            dim=dim,
+            live=h.live + len(doc_ids),
+        )
+        return self._publish(new) if publish else new
+
+    def delete(self, h: ArenaHeader, slot: int) -> ArenaHeader:
+        docs = self.docs(h)
+        if not docs[slot, 3]:
+            return h
+        start, end = (int(x) for x in docs[slot, 4:6])
+        self.dead(h)[start:end] = True
+        docs[slot, 3] = 0
+        return self._publish(h._replace(live=h.live - 1, dead=h.dead + end - start))
+
+    def _new_epoch(self, h: ArenaHeader) -> ArenaHeader:
+        new = ArenaHeader(h.seq, h.epoch + 1, 0, 0, h.dim, 0, 0)
+        shutil.rmtree(self._dir(new.epoch), ignore_errors=True)  # left by a crashed writer
+        os.makedirs(self._dir(new.epoch))
+        return new
+
+    def _switch(self, old: ArenaHeader, new: ArenaHeader) -> ArenaHeader:
+        new = self._publish(new)
+        # unlinked files stay readable for processes that still map them
+        shutil.rmtree(self._dir(old.epoch), ignore_errors=True)
+        self.forget(new.epoch)
+        return new
+
+    def reset(self, h: ArenaHeader) -> ArenaHeader:
+        """Switch to an empty new epoch (clear)."""
+        return self._switch(h, self._new_epoch(h)._replace(dim=0))
+
+    def compact(self, h: ArenaHeader, batch: int = 4096) -> ArenaHeader:
+        """Copy the live documents into a new epoch and switch to it."""
+        docs, blob = self.docs(h), self.blob(h)
+        rows, vectors = self.rows(h), self.vectors(h)
+        live = np.flatnonzero(docs[: h.docs, 3]).tolist()
+        new = self._new_epoch(h)
+        # fill the new epoch unpublished, then switch to it in one header update
+        for lo in range(0, len(live), batch):
+            ids, texts, spans, vecs = [], [], [], []
+            for slot in live[lo : lo + batch]:
+                b, i, e, _, rs, re_ = docs[slot].tolist()
+                ids.append(bytes(blob[b:i]).decode("utf-8"))
+                texts.append(bytes(blob[i:e]).decode("utf-8"))
+                spans.append([(s, t) for s, t in rows[rs:re_, 1:].tolist()])
+                vecs.append(vectors[rs:re_])
+            new = self.append(new, ids, texts, spans, np.concatenate(vecs), publish=False)
+        return self._switch(h, new)
+
+
+class _SharedTexts(Mapping):
+    """Read-only id -> text view over the arena; deleted documents are absent."""
+
+    def __init__(self) -> None:
+        self.slots: Dict[str, int] = {}  # latest slot of every id ever added this epoch
+        self.table = np.zeros((0, 6), dtype=np.int64)
+        self.blob = np.zeros(0, dtype=np.uint8)
+        self.live = 0
+
+    def __getitem__(self, doc_id: str) -> str:
+        _, i, e, alive = self.table[self.slots[doc_id], :4].tolist()
+        if not alive:
+            raise KeyError(doc_id)
+        return bytes(self.blob[i:e]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        table = self.table
+        return (d for d, slot in list(self.slots.items()) if table[slot, 3])
+
+    def __len__(self) -> int:
+        return self.live
+
+
+class SharedDocumentStore(DocumentStore):
+    """
+    DocumentStore whose vectors, texts and chunk spans live in a SharedArena,
+    so every uvicorn worker queries the same corpus with one copy in RAM.
+    - Writes take the in-process writer lock plus the arena flock, write through
+      to the arena and publish; any worker may write.
+    - Reads first sync: if the arena generation moved, the new slots and rows are
+      picked up (the vector index attaches to the shared matrix, no copy).
+    Per-process state is limited to derived lookups: ids, the keyword index and
+    the IVF lists. Vectors are kept as float32.
+    """
+
+    def __init__(self, root: str, index: Optional[str] = None):
+        if settings.rag_vector_precision != "float32":
+            raise ValueError("the shared store keeps float32 vectors (RAG_VECTOR_PRECISION)")
+        self.arena = SharedArena(root)
+        self._epoch: Optional[int] = None
+        self._generation = -1
+        super().__init__(index=index, precision="float32")
+        self._sync()
+
+    @property
+    def docs(self) -> _SharedTexts:
+        return self._current().docs
+
+    @docs.setter
+    def docs(self, value) -> None:
+        self._docs = value
+
+    def _publish(self) -> None:
+        self._version = _Version(
+            self._docs, self.keywords, len(self.keywords), self._spans, self.index.state
+        )
+
+    def _current(self) -> _Version:
+        self._sync()
+        return self._version
+
+    def _sync(self) -> None:
+        if self.arena.generation == self._generation:
+            return
+        # a query never waits for a local writer: it reads the last synced version
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._pull()
+        finally:
+            self._lock.release()
+
+    def _pull(self) -> None:
+        h = self.arena.header()
+        if h.seq == self._generation:
+            return
+        if h.epoch != self._epoch:
+            self._epoch, self._n_docs, self._n_rows = h.epoch, 0, 0
+            self._slot_ids: List[str] = []
+            self._row_ids: List[str] = []
+            self._doc_rows = {}
+            self._docs = _SharedTexts()
+            self.keywords = NgramIndex()
+            self._keywords_stale = True  # rebuilt from the arena on the next keyword query
+            self.index.clear()
+            self.arena.forget(h.epoch)
+        docs, blob = self.arena.docs(h), self.arena.blob(h)
+        for slot, (b, i, e, alive, rs, re_) in enumerate(
+            docs[self._n_docs : h.docs].tolist(), start=self._n_docs
+        ):
+            doc_id = bytes(blob[b:i]).decode("utf-8")
+            self._slot_ids.append(doc_id)
+            if not self._keywords_stale:
+                self.keywords.remove(doc_id)  # replaced by this slot
+                if alive:
+                    self.keywords.add(doc_id, bytes(blob[i:e]).decode("utf-8"))
+            self._docs.slots[doc_id] = slot
+            self._doc_rows[doc_id] = (rs, re_)
+        self._docs.table, self._docs.blob, self._docs.live = docs, blob, h.live
+        rows = self.arena.rows(h)
+        self._row_ids.extend(self._slot_ids[s] for s in rows[self._n_rows : h.rows, 0].tolist())
+        self._spans = rows[:, 1:]
+        if h.rows:
+            self.index.attach(self._row_ids, self.arena.vectors(h), self.arena.dead(h), h.dead)
+        self._n_docs, self._n_rows, self._generation = h.docs, h.rows, h.seq
+        self._publish()
+
+    def _append(
+        self, doc_ids: List[str], texts: Sequence[str], spans: List[List[Span]], vecs: Sequence
+    ) -> None:
+        with self._lock, self.arena.writing() as h:
+            self.arena.append(h, doc_ids, texts, spans, vecs)
+            self._sync()
+
+    def _replace(self, doc_id: str, text: str, spans: List[Span], vecs: Sequence) -> bool:
+        with self._lock, self.arena.writing() as h:
+            self._sync()
+            slot = self.docs.slots.get(doc_id)
+            if slot is not None:
+                h = self.arena.delete(h, slot)
+            self.arena.append(h, [doc_id], [text], [spans], vecs)
+            self._sync()
+        self._maybe_compact()
+        return True
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock, self.arena.writing() as h:
+            self._sync()
+            slot = self.docs.slots.get(doc_id)
+            if slot is None or not self.docs.table[slot, 3]:
+                return False
+            self.arena.delete(h, slot)
+            self._sync()
+        self._maybe_compact()
+        return True
+
+    def clear(self):
+        with self._lock, self.arena.writing() as h:
+            self.arena.reset(h)
+            self._sync()
+
+    def compact(self) -> None:
+        """Rewrite the arena without deleted documents (a new epoch every worker switches to)."""
+        with self._lock, self.arena.writing() as h:
+            if h.dead or h.live < h.docs:
+                self.arena.compact(h)
+            self._sync()
+
+    # persistence: the arena is the live copy; snapshots are taken explicitly
+    def open(self, path: str) -> None:
+        """
+        Seed an empty arena from the snapshot and write-ahead log under path
+        (the first worker to start does it; the others find the arena filled).
+        Later writes are not logged: call snapshot() to persist them.
+        """
+        with self._lock, self.arena.writing() as h:
+            if h.docs == 0:
+                staging = DocumentStore(index="exact")
+                staging.open(path)
+                staging.close()
+                ids = list(staging.docs)
+                spans = [
+                    [tuple(staging._spans[r]) for r in range(*staging._doc_rows.get(d, (0, 0)))]
+                    for d in ids
+                ]
+                rows = [r for d in ids for r in range(*staging._doc_rows.get(d, (0, 0)))]
+                vecs = staging.index.originals(np.array(rows, dtype=np.intp))
+                self.arena.append(h, ids, [staging.docs[d] for d in ids], spans, vecs)
+            self._sync()
+            self._path = path
+
+    def snapshot(self) -> None:
+        """Write the live documents to a snapshot under the open() path and truncate its log."""
+        # under the arena lock too: every worker snapshots on shutdown
+        with self._lock, self.arena.writing():
+            if self._path is None:
+                raise RuntimeError("store is not persistent; call open(path) first")
+            self._sync()
+            ids = list(self.docs)
+            rows = [r for d in ids for r in range(*self._doc_rows[d])]
+            write_snapshot(
+                self._path,
+                ids,
+                [self.docs[d] for d in ids],
+                [i for i, d in enumerate(ids) for _ in range(*self._doc_rows[d])],
+                self.index.originals(np.array(rows, dtype=np.intp)),
+                [tuple(self._spans[r]) for r in rows],
+            )
+            wal = WriteAheadLog(self._path, fsync=settings.rag_wal_fsync)
+            wal.reset()
+            wal.close()
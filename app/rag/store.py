@@ -1,77 +1,644 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 import uuid
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 import numpy as np
 
-from .embeddings import embed
+from app.metrics.registry import SEARCH_SECONDS, timed
+from app.summarize.config import settings
+
+from .chunking import Span, chunk_spans, iter_chunks
+from .embeddings import aembed, aembed_batch, embed, embed_batch
+from .fusion import fuse
+from .index import IndexState, VectorIndex
+from .ivf import IVFIndex
+from .ngram import NgramIndex
+from .persist import WriteAheadLog, read_snapshot, write_snapshot
+
+
+def make_index(kind: str, precision: str = "float32") -> VectorIndex:
+    """
+    Vector index by name: "exact" (brute force) or "ivf" (approximate),
+    storing vectors as float32, float16 or int8.
+    """
+    if kind == "ivf":
+        return IVFIndex(
+            nlist=settings.rag_ivf_nlist, nprobe=settings.rag_ivf_nprobe, precision=precision
+        )
+    if kind == "exact":
+        return VectorIndex(precision=precision)
+    raise ValueError(f"unknown vector index: {kind}")
+
+
+class _Version(NamedTuple):
+    """
+    Consistent read view of the store. The containers are shared with the writer
+    but only appended to (clear() swaps in new ones), so a query bounded by the
+    captured counts never sees a half-applied add.
+    """
+
+    docs: Dict[str, str]
+    keywords: NgramIndex
+    n_keywords: int
+    spans: List[Span]
+    index: IndexState
 
 
 class DocumentStore:
-    def __init__(self):
+    """
+    Documents plus their chunk vectors.
+    - Ingest runs each text through the chunker (settings.rag_chunk_*); every chunk
+      is one index row whose id is the parent document id, with its span kept in _spans.
+    - Semantic queries rank chunks and return each document once, with its best chunk.
+    - Writers serialize on _lock and publish a new _Version when done; queries read
+      the version current when they start and never wait for ingestion.
+    - delete()/update() tombstone the old rows (queries skip them); once the dead
+      fraction passes settings.rag_compact_threshold a background thread compacts.
+    - The a* variants await the embedding, then score or ingest on a worker thread
+      so the event loop is not blocked by scoring, lock waits or WAL fsyncs.
+    """
+
+    def __init__(self, index: Optional[str] = None, precision: Optional[str] = None):
+        self._lock = threading.RLock()
         self.docs: Dict[str, str] = {}
-        self.vecs: Dict[str, List[float]] = {}
+        self.index = make_index(
+            index or settings.rag_index, precision or settings.rag_vector_precision
+        )
+        self.keywords = NgramIndex()
+        self._spans: List[Span] = []  # chunk span of every index row
+        self._doc_rows: Dict[str, Tuple[int, int]] = {}  # live index rows [start, end) per doc
+        self._compactor: Optional[threading.Thread] = None
+        self._compacting = threading.RLock()  # one compaction at a time; taken before _lock
+        self._keywords_stale = False
+        self._path: Optional[str] = None
+        self._wal: Optional[WriteAheadLog] = None
+        self._publish()
+
+    def _publish(self) -> None:
+        self._version = _Version(
+            self.docs, self.keywords, len(self.keywords), self._spans, self.index.state
+        )
+
+    def _current(self) -> _Version:
+        """The version a query should read (backends shared between processes sync first)."""
+        return self._version
 
     def clear(self):
-        self.docs.clear()
-        self.vecs.clear()
+        with self._lock:
+            self.docs = {}
+            self.index.clear()
+            self.keywords = NgramIndex()
+            self._spans = []
+            self._doc_rows = {}
+            self._keywords_stale = False
+            if self._wal is not None:
+                self._wal.log_clear()
+            self._publish()
+
+    def _chunk(self, texts: Sequence[str]) -> Tuple[List[List[Span]], List[str]]:
+        """Stream texts through the chunker: per-document spans and the flat chunk texts."""
+        spans: List[List[Span]] = [[] for _ in texts]
+        chunks: List[str] = []
+        for i, (start, end) in iter_chunks(
+            texts, settings.rag_chunk_size, settings.rag_chunk_overlap, settings.rag_chunk_unit
+        ):
+            spans[i].append((start, end))
+            chunks.append(texts[i][start:end])
+        return spans, chunks
+
+    def _insert(self, doc_id: str, text: str, spans: List[Span], vecs: Sequence) -> None:
+        with self._lock:
+            self._store_docs([doc_id], [text])
+            self._store_rows([doc_id], [spans], vecs)
+            self._publish()
+
+    def _append(
+        self, doc_ids: List[str], texts: Sequence[str], spans: List[List[Span]], vecs: Sequence
+    ) -> None:
+        with self._lock:
+            if self._wal is not None:
+                self._wal.log_add(doc_ids, texts, spans, vecs)
+            self._store_docs(doc_ids, texts)
+            self._store_rows(doc_ids, spans, vecs)
+            self._publish()
+
+    def _store_docs(self, doc_ids: Sequence[str], texts: Sequence[str]) -> None:
+        for doc_id, text in zip(doc_ids, texts):
+            self.docs[doc_id] = text
+            if not self._keywords_stale:
+                self.keywords.add(doc_id, text)
+
+    def _store_rows(self, doc_ids: Sequence[str], spans: List[List[Span]], vecs: Sequence) -> None:
+        # spans go in before the rows are published, so a reader never meets a row without one
+        n = len(self._spans)
+        self._spans.extend(span for sp in spans for span in sp)
+        row_ids = [doc_id for doc_id, sp in zip(doc_ids, spans) for _ in sp]
+        # rows are skipped (doc kept) on a dimension mismatch, as before chunking
+        if not self.index.add_many(row_ids, vecs):
+            del self._spans[n:]
+            return
+        for doc_id, sp in zip(doc_ids, spans):
+            self._doc_rows[doc_id] = (n, n + len(sp))
+            n += len(sp)
+
+    def _remove(self, doc_id: str) -> None:
+        # tombstone the rows first: a query that already picked one skips the missing doc
+        start, end = self._doc_rows.pop(doc_id, (0, 0))
+        self.index.delete_rows(np.arange(start, end))
+        if not self._keywords_stale:
+            self.keywords.remove(doc_id)
+        del self.docs[doc_id]
+
+    def _add_many_embedded(
+        self, texts: Sequence[str], spans: List[List[Span]], vecs: Sequence
+    ) -> List[str]:
+        doc_ids = [str(uuid.uuid4()) for _ in texts]
+        self._append(doc_ids, texts, spans, vecs)
+        return doc_ids
 
     def add(self, text: str) -> str:
-        doc_id = str(uuid.uuid4())
-        self.docs[doc_id] = text
-        self.vecs[doc_id] = embed(text)
-        return doc_id
+        spans, chunks = self._chunk([text])
+        vecs = [embed(chunks[0])] if len(chunks) == 1 else embed_batch(chunks)
+        return self._add_many_embedded([text], spans, vecs)[0]
+
+    async def aadd(self, text: str) -> str:
+        """add() awaiting the embedding instead of blocking on it."""
+        spans, chunks = self._chunk([text])
+        vecs = [await aembed(chunks[0])] if len(chunks) == 1 else await aembed_batch(chunks)
+        return (await asyncio.to_thread(self._add_many_embedded, [text], spans, vecs))[0]
+
+    def add_many(self, texts: Sequence[str]) -> List[str]:
+        """Embed all chunks in provider-sized batches and append them in one step; ids in input order."""
+        spans, chunks = self._chunk(texts)
+        return self._add_many_embedded(texts, spans, embed_batch(chunks))
+
+    async def aadd_many(self, texts: Sequence[str]) -> List[str]:
+        spans, chunks = await asyncio.to_thread(self._chunk, texts)
+        vecs = await aembed_batch(chunks)
+        return await asyncio.to_thread(self._add_many_embedded, texts, spans, vecs)
+
+    # deletes and updates
+    def delete(self, doc_id: str) -> bool:
+        """Remove a document; False if the id is unknown. Its vectors are tombstoned."""
+        with self._lock:
+            if doc_id not in self.docs:
+                return False
+            if self._wal is not None:
+                self._wal.log_delete([doc_id])
+            self._remove(doc_id)
+            self._publish()
+        self._maybe_compact()
+        return True
+
+    def update(self, doc_id: str, text: str) -> Optional[bool]:
+        """
+        Replace a document's text, keeping its id.
+        Returns None for an unknown id and False if the text is unchanged (nothing
+        is re-embedded). Chunks whose text survives the edit reuse their stored
+        vectors; only new chunks are embedded.
+        """
+        old = self._current().docs.get(doc_id)
+        if old is None or old == text:
+            return None if old is None else False
+        spans, chunks = self._chunk([text])
+        vecs, missing = self._reused_vectors(doc_id, chunks)
+        if missing:
+            embedded = embed_batch([chunks[i] for i in missing])
+            for i, vec in zip(missing, embedded):
+                vecs[i] = vec
+        return self._replace(doc_id, text, spans[0], vecs)
+
+    async def aupdate(self, doc_id: str, text: str) -> Optional[bool]:
+        """update() awaiting the embeddings of the changed chunks."""
+        old = self._current().docs.get(doc_id)
+        if old is None or old == text:
+            return None if old is None else False
+        spans, chunks = self._chunk([text])
+        vecs, missing = self._reused_vectors(doc_id, chunks)
+        if missing:
+            embedded = await aembed_batch([chunks[i] for i in missing])
+            for i, vec in zip(missing, embedded):
+                vecs[i] = vec
+        return await asyncio.to_thread(self._replace, doc_id, text, spans[0], vecs)
+
+    def _reused_vectors(self, doc_id: str, chunks: List[str]) -> Tuple[List[Any], List[int]]:
+        """Stored vectors for chunks identical to one of the document's current chunks."""
+        vecs: List[Any] = [None] * len(chunks)
+        with self._lock:
+            text = self.docs.get(doc_id)
+            start, end = self._doc_rows.get(doc_id, (0, 0))
+            if text is not None and end > start:
+                rows = {text[s:e]: row for row, (s, e) in enumerate(self._spans[start:end], start)}
+                hits = [(i, rows[c]) for i, c in enumerate(chunks) if c in rows]
+                if hits:
+                    stored = self.index.originals(np.array([row for _, row in hits]))
+                    for (i, _), vec in zip(hits, stored):
+                        vecs[i] = vec
+        return vecs, [i for i, vec in enumerate(vecs) if vec is None]
+
+    def _replace(self, doc_id: str, text: str, spans: List[Span], vecs: Sequence) -> bool:
+        with self._lock:
+            if self._wal is not None:
+                self._wal.log_add([doc_id], [text], [spans], vecs, op="put")
+            if doc_id in self.docs:
+                self._remove(doc_id)
+            self._store_docs([doc_id], [text])
+            self._store_rows([doc_id], [spans], vecs)
+            self._publish()
+        self._maybe_compact()
+        return True
+
+    @property
+    def dead_fraction(self) -> float:
+        """Share of index rows (or keyword entries) that are tombstones."""
+        rows = self.index.n_dead / len(self.index) if len(self.index) else 0.0
+        keywords = self.keywords.n_dead / len(self.keywords) if len(self.keywords) else 0.0
+        return max(rows, keywords)
+
+    def _maybe_compact(self) -> None:
+        if self.dead_fraction < settings.rag_compact_threshold:
+            return
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="rag-compact", daemon=True)
+            self._compactor.start()
+
+    def compact(self) -> None:
+        """
+        Drop tombstones: rewrite the vector storage and rebuild the keyword index.
+        Both are rebuilt from a captured view without the writer lock, so adds,
+        deletes and queries go on; the lock is only held to carry over what changed
+        meanwhile and swap the result in.
+        """
+        with self._compacting:
+            with self._lock:
+                state, spans = self.index.state, self._spans
+                rebuild = self.keywords.n_dead and not self._keywords_stale
+                docs = dict(self.docs) if rebuild else None
+            plan = self.index.prepare_compact(state)
+            # rows below the captured count keep their span (the list is append-only)
+            kept_spans = [spans[row] for row in plan.kept.tolist()] if plan is not None else []
+            keywords = None
+            if docs is not None:
+                keywords = NgramIndex()
+                for doc_id, text in docs.items():
+                    keywords.add(doc_id, text)
+            with self._lock:
+                kept = self.index.finish_compact(plan) if plan is not None else None
+                if kept is not None:
+                    kept_spans.extend(self._spans[row] for row in kept[plan.kept.size :].tolist())
+                    self._spans = kept_spans
+                    # a live document's rows are contiguous and all kept, so they stay contiguous
+                    rows = self._doc_rows
+                    starts = np.searchsorted(kept, [start for start, _ in rows.values()]).tolist()
+                    self._doc_rows = {
+                        doc_id: (new, new + end - start)
+                        for (doc_id, (start, end)), new in zip(rows.items(), starts)
+                    }
+                if keywords is not None and not self._keywords_stale:
+                    # replay the adds, updates and deletes made since the capture
+                    for doc_id, text in docs.items():
+                        if self.docs.get(doc_id) is not text:
+                            keywords.remove(doc_id)
+                    for doc_id, text in self.docs.items():
+                        if docs.get(doc_id) is not text:
+                            keywords.add(doc_id, text)
+                    self.keywords = keywords
+                self._publish()
+
+    # persistence
+    def open(self, path: str) -> None:
+        """
+        Load the corpus persisted under path and log further writes there.
+          - Memory-maps the last snapshot (no re-embedding)
+          - Replays the write-ahead log of adds since that snapshot
+          - The keyword index is rebuilt lazily on the first keyword query
+        """
+        with self._lock:
+            self.close()
+            self.clear()
+            snap = read_snapshot(path)
+            if snap is not None:
+                rows = snap.vector_rows.tolist()
+                if snap.vector_spans is None:
+                    self._spans = [(0, len(snap.texts[r])) for r in rows]
+                else:
+                    self._spans = [(s, e) for s, e in snap.vector_spans.tolist()]
+                self.docs = dict(zip(snap.ids, snap.texts))
+                self.index.load([snap.ids[r] for r in rows], snap.vectors)
+                for row, r in enumerate(rows):
+                    start, _ = self._doc_rows.get(snap.ids[r], (row, row))
+                    self._doc_rows[snap.ids[r]] = (start, row + 1)
+                self._keywords_stale = True
+                self._publish()
+            wal = WriteAheadLog(path, fsync=settings.rag_wal_fsync)
+            for rec in wal.replay():
+                op = rec.get("op")
+                if op == "clear":
+                    self.clear()
+                elif op == "delete":
+                    if rec["id"] in self.docs:
+                        self._remove(rec["id"])
+                        self._publish()
+                elif op == "put" or (op == "add" and rec["id"] not in self.docs):
+                    # added ids already present were folded into the snapshot before the WAL reset
+                    if "vec" in rec:  # written before chunking: one whole-document vector
+                        spans, vecs = [(0, len(rec["text"]))], [rec["vec"]]
+                    else:
+                        spans, vecs = [(s, e) for s, e in rec["spans"]], rec["vecs"]
+                    if rec["id"] in self.docs:
+                        self._remove(rec["id"])
+                    self._insert(rec["id"], rec["text"], spans, vecs)
+            self._path, self._wal = path, wal
+
+    def snapshot(self) -> None:
+        """
+        Write a new snapshot of the whole store and truncate the write-ahead log.
+        Compacts first, so deleted documents are not written.
+        Holds the writer lock (adds wait); queries keep running.
+        """
+        with self._compacting, self._lock:
+            if self._path is None or self._wal is None:
+                raise RuntimeError("store is not persistent; call open(path) first")
+            self.compact()
+            ordinal = {doc_id: i for i, doc_id in enumerate(self.docs)}
+            write_snapshot(
+                self._path,
+                list(self.docs),
+                list(self.docs.values()),
+                [ordinal[doc_id] for doc_id in self.index.ids],
+                self.index.vectors(),
+                self._spans,
+            )
+            self._wal.reset()
+
+    def close(self) -> None:
+        """Detach from the persistence directory (the in-memory corpus is kept)."""
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+            self._path, self._wal = None, None
 
+    def _ensure_keywords(self) -> _Version:
+        """
+        The current version, with the keyword index rebuilt first if open() left
+        it stale (once, under the writer lock).
+        """
+        v = self._current()
+        if not self._keywords_stale:
+            return v
+        with self._lock:
+            if self._keywords_stale:
+                keywords = NgramIndex()
+                for doc_id, text in self.docs.items():
+                    keywords.add(doc_id, text)
+                self.keywords, self._keywords_stale = keywords, False
+                self._publish()
+            return self._version
+
+    @timed(SEARCH_SECONDS.labels("keyword"))
     def query(self, keyword: str, limit: int = 3) -> List[Dict[str, str]]:
         """Return top-N documents ranked by a simple keyword score.
         Ranking priority:
           1) Higher frequency of the keyword (descending)
           2) Earlier first occurrence position (ascending)
           3) Shorter document length (ascending)
+        Candidates come from the trigram index and are verified by exact substring match.
         """
+        scored = self._keyword_scored(keyword)
+        return [{"id": doc_id, "text": text} for _, _, _, doc_id, text in scored[:limit]]
+
+    def _keyword_scored(
+        self, keyword: str, v: Optional[_Version] = None
+    ) -> List[Tuple[int, int, int, str, str]]:
+        """Every match as (freq, first_pos, length, id, text), in query() order."""
         k = (keyword or "").lower().strip()
         if not k:
             return []
 
+        if v is None:
+            v = self._ensure_keywords()
         scored = []
-        for doc_id, text in self.docs.items():
-            tl = text.lower()
+        for ordinal in v.keywords.candidates(k, v.n_keywords):
+            tl = v.keywords.lowered[ordinal]
             if k in tl:
+                doc_id = v.keywords.ids[ordinal]
+                text = v.docs.get(doc_id)
+                if text is None:  # deleted since the query started
+                    continue
                 freq = tl.count(k)
                 first_pos = tl.find(k)
                 scored.append((freq, first_pos, len(text), doc_id, text))
 
         # Sort by: frequency (desc), first occurrence (asc), length (asc)
         scored.sort(key=lambda s: (-s[0], s[1], s[2]))
+        return scored
 
-        return [{"id": doc_id, "text": text} for _, _, _, doc_id, text in scored[:limit]]
+    def query_hybrid(
+        self,
+        query: str,
+        limit: int = 3,
+        fusion: str = "rrf",
+        keyword_weight: float = 1.0,
+        vector_weight: float = 1.0,
+        nprobe: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Keyword and semantic search in one call, fused into a single ranking.
+          - One embedding, one trigram lookup and one index search per query
+          - Each side contributes its top max(4 * limit, 20) documents
+          - fusion="rrf": reciprocal rank fusion; "weighted": min-max scaled scores
+          - keyword_weight / vector_weight scale each side's contribution
+        Results carry the fused score plus each side's 1-based rank (None if absent).
+        """
+        return self._hybrid(
+            query, embed(query), limit, fusion, keyword_weight, vector_weight, nprobe
+        )
+
+    async def aquery_hybrid(
+        self,
+        query: str,
+        limit: int = 3,
+        fusion: str = "rrf",
+        keyword_weight: float = 1.0,
+        vector_weight: float = 1.0,
+        nprobe: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        vec = await aembed(query)
+        return await asyncio.to_thread(
+            self._hybrid, query, vec, limit, fusion, keyword_weight, vector_weight, nprobe
+        )
+
+    def _hybrid(
+        self,
+        query: str,
+        vec: Sequence[float],
+        limit: int,
+        fusion: str,
+        keyword_weight: float,
+        vector_weight: float,
+        nprobe: Optional[int],
+    ) -> List[Dict[str, Any]]:
+        limit = max(0, limit)
+        depth = max(4 * limit, 20)
+        v = self._ensure_keywords()  # both sides read the same version
+        keyword = self._keyword_scored(query, v)[:depth]
+        vector = self._search_embedded(vec, depth, nprobe, v)
+        passages = {r["id"]: r["chunk"] for r in vector}
+        fused = fuse(
+            [
+                [(doc_id, float(freq)) for freq, _, _, doc_id, _ in keyword],
+                [(r["id"], r["score"]) for r in vector],
+            ],
+            [keyword_weight, vector_weight],
+            fusion,
+        )
+        keyword_rank = {hit[3]: rank for rank, hit in enumerate(keyword, start=1)}
+        vector_rank = {r["id"]: rank for rank, r in enumerate(vector, start=1)}
+        first_pos = {hit[3]: hit[1] for hit in keyword}
+        results = []
+        for doc_id, score in fused[:limit]:
+            text = v.docs.get(doc_id)
+            if text is None:  # deleted since the query started
+                continue
+            results.append(
+                {
+                    "id": doc_id,
+                    "text": text,
+                    "chunk": passages.get(doc_id) or self._passage(text, first_pos[doc_id]),
+                    "score": round(score, 6),
+                    "keyword_rank": keyword_rank.get(doc_id),
+                    "vector_rank": vector_rank.get(doc_id),
+                }
+            )
+        return results
+
+    def _passage(self, text: str, pos: int) -> str:
+        """The chunk of a document covering character pos (keyword-only hybrid hits)."""
+        for start, end in chunk_spans(
+            text, settings.rag_chunk_size, settings.rag_chunk_overlap, settings.rag_chunk_unit
+        ):
+            if start <= pos < end:
+                return text[start:end]
+        return text
 
-    def query_vector(self, query_text: str, limit: int = 3) -> List[Dict[str, str]]:
+    def query_vector(
+        self, query_text: str, limit: int = 3, nprobe: Optional[int] = None
+    ) -> List[Dict[str, str]]:
         """
         Semantic search:
           - Embed the query
-          - Compute cosine similarity with stored vectors (dot product; vectors are normalized)
-          - Return top-N docs with their scores
+          - Score all stored chunk vectors with one matmul (cosine; vectors are normalized)
+          - Select top chunks with argpartition; ties keep insertion order
+          - Return the top-N docs, each once, with its best chunk and score
+        With the "ivf" index only the nprobe closest lists are scored (approximate).
         """
-        qv = np.array(embed(query_text), dtype=np.float32)
+        return self._search_embedded(embed(query_text), limit, nprobe)
+
+    async def aquery_vector(
+        self, query_text: str, limit: int = 3, nprobe: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """query_vector() awaiting the query embedding."""
+        vec = await aembed(query_text)
+        return await asyncio.to_thread(self._search_embedded, vec, limit, nprobe)
+
+    @timed(SEARCH_SECONDS.labels("vector"))
+    def _search_embedded(
+        self, vec: Sequence[float], limit: int, nprobe: Optional[int], v: Optional[_Version] = None
+    ) -> List[Dict[str, str]]:
+        qv = np.array(vec, dtype=np.float32)
         if qv.size == 0 or not np.isfinite(qv).all():
             return []
 
-        scored: List[Tuple[float, str, str]] = []  # (score, id, text)
-        for doc_id, dv in self.vecs.items():
-            dv_arr = np.array(dv, dtype=np.float32)
-            if dv_arr.size != qv.size:
-                # dimension mismatch shouldn't happen if all via same backend
-                continue
-            score = float(qv @ dv_arr)  # cosine similarity because vectors are normalized
-            scored.append((score, doc_id, self.docs[doc_id]))
+        return self._top_docs(qv[None, :], max(0, limit), nprobe, v or self._current())[0]
+
+    def query_vector_batch(
+        self, queries: Sequence[str], limit: int = 3, nprobe: Optional[int] = None
+    ) -> List[List[Dict[str, str]]]:
+        """
+        Batched semantic search, one result list per query in input order.
+          - Embeds all queries together (embed_batch)
+          - Scores them with one Q @ D^T product and selects top-N per row
+        Uses the same index scoring as query_vector, so rankings are identical.
+        """
+        if not queries:
+            return []
+        return self._search_many_embedded(embed_batch(queries), limit, nprobe)
+
+    async def aquery_vector_batch(
+        self, queries: Sequence[str], limit: int = 3, nprobe: Optional[int] = None
+    ) -> List[List[Dict[str, str]]]:
+        if not queries:
+            return []
+        vecs = await aembed_batch(queries)
+        return await asyncio.to_thread(self._search_many_embedded, vecs, limit, nprobe)
+
+    def _search_many_embedded(
+        self, vecs: Sequence, limit: int, nprobe: Optional[int]
+    ) -> List[List[Dict[str, str]]]:
+        qm = np.array(vecs, dtype=np.float32).reshape(len(vecs), -1)
+        ok = np.isfinite(qm).all(axis=1) if qm.shape[1] else np.zeros(len(vecs), dtype=bool)
+        hits = iter(self._top_docs(qm[ok], max(0, limit), nprobe, self._current()))
+        return [next(hits) if good else [] for good in ok.tolist()]
+
+    def _top_docs(
+        self, queries: np.ndarray, limit: int, nprobe: Optional[int], v: _Version
+    ) -> List[List[Dict[str, str]]]:
+        """
+        Top-N documents per query, each represented by its best-scoring chunk.
+        Fetches limit chunks (4x when documents have several) and doubles that
+        for queries whose chunks collapse into fewer than limit documents.
+        """
+        n_rows = v.index.n
+        k = limit if n_rows <= len(v.docs) else 4 * limit
+        out: List[List[Dict[str, str]]] = [[] for _ in range(len(queries))]
+        todo = list(range(len(queries)))
+        while todo:
+            retry = []
+            hits_per_query = self.index.search_rows(queries[todo], k, nprobe=nprobe, state=v.index)
+            for q, hits in zip(todo, hits_per_query):
+                best: Dict[str, Tuple[float, int]] = {}
+                for row, score in hits:
+                    best.setdefault(v.index.ids[row], (score, row))
+                if len(best) < limit and len(hits) == k < n_rows:
+                    retry.append(q)
+                else:
+                    out[q] = self._results(list(best.items())[:limit], v)
+            todo, k = retry, 2 * k
+        return out
+
+    def _results(
+        self, hits: List[Tuple[str, Tuple[float, int]]], v: _Version
+    ) -> List[Dict[str, str]]:
+        results = []
+        dead = v.index.dead
+        for doc_id, (score, row) in hits:
+            text = v.docs.get(doc_id)
+            if text is None or (dead is not None and dead[row]):
+                continue  # deleted or replaced since the query started
+            start, end = v.spans[row]
+            results.append(
+                {"id": doc_id, "text": text, "chunk": text[start:end], "score": round(score, 6)}
+            )
+        return results
+
+
+def make_store() -> DocumentStore:
+    """
+    The process-wide store for settings.rag_store_backend: "memory" (per process)
+    or "shared" (one corpus in shared memory for every worker, see shared.py).
+    """
+    if settings.rag_store_backend == "shared":
+        from .shared import SharedDocumentStore
 
-        scored.sort(key=lambda s: -s[0])  # highest score first
-        return [
-            {"id": doc_id, "text": text, "score": round(score, 6)}
-            for score, doc_id, text in scored[: max(0, limit)]
-        ]
+        return SharedDocumentStore(settings.rag_shared_path)
+    if settings.rag_store_backend == "memory":
+        return DocumentStore()
+    raise ValueError(f"unknown store backend: {settings.rag_store_backend}")
 
 
-STORE = DocumentStore()
+STORE = make_store()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+
+Summary = Tuple[str, float]  # (summary, confidence)
+Result = Tuple[str, float, bool]  # (summary, confidence, retried)
+
+
+def summary_key(provider: str, model: str, text: str, max_words: int) -> bytes:
+    """Key on (provider, model, text hash, max_words)."""
+    h = hashlib.sha256(f"{provider}\0{model}\0{max_words}\0".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.digest()
+
+
+class SummaryCache:
+    """
+    TTL + LRU cache of final summarize_with_retry results, with single-flight.
+    - Only the chosen (summary, confidence) is stored, and only when confidence
+      reaches min_confidence (low-confidence answers are recomputed next time).
+    - Concurrent identical requests share one provider call: the first caller
+      computes, the others wait for its result (sync and async paths separately).
+      If an async leader is cancelled, its waiters retry and one of them leads.
+    - A hit reports retried=False since no provider call was made.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0) -> None:
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[bytes, Tuple[float, Summary]] = OrderedDict()
+        self._inflight: Dict[bytes, Future] = {}
+        self._ainflight: Dict[bytes, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: bytes) -> Optional[Summary]:
+        with self._lock:
+            hit = self._get_locked(key)
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return hit
+
+    def put(self, key: bytes, result: Result, min_confidence: float) -> None:
+        with self._lock:
+            self._store_locked(key, result, min_confidence)
+
+    def _get_locked(self, key: bytes) -> Optional[Summary]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store_locked(self, key: bytes, result: Result, min_confidence: float) -> None:
+        summary, conf, _ = result
+        if self.max_entries == 0 or conf < min_confidence:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, (summary, conf))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get_or_compute(
+        self, key: bytes, compute: Callable[[], Result], min_confidence: float
+    ) -> Result:
+        with self._lock:
+            hit = self._get_locked(key)
+            if hit is not None:
+                self.hits += 1
+                return (hit[0], hit[1], False)
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                self.misses += 1
+                fut = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._store_locked(key, result, min_confidence)
+            self._inflight.pop(key, None)
+        fut.set_result(result)
+        return result
+
+    async def aget_or_compute(
+        self, key: bytes, compute: Callable[[], Awaitable[Result]], min_confidence: float
+    ) -> Result:
+        while True:
+            with self._lock:
+                hit = self._get_locked(key)
+                if hit is not None:
+                    self.hits += 1
+                    return (hit[0], hit[1], False)
+            fut = self._ainflight.get(key)
+            if fut is None or fut.get_loop() is not asyncio.get_running_loop():
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled() or asyncio.current_task().cancelling():
+                    raise  # this caller was cancelled, not the leader
+                # the leader was cancelled: try again, possibly as the new leader
+        self.misses += 1
+        fut = self._ainflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._ainflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        with self._lock:
+            self._store_locked(key, result, min_confidence)
+        self._ainflight.pop(key, None)
+        fut.set_result(result)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.coalesced = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+            }
+
+
+SUMMARY_CACHE = SummaryCache(settings.summary_cache_size, settings.summary_cache_ttl)
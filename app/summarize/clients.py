@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from .config import settings
+
+# Process-wide OpenAI clients. Each wraps one httpx pool with keep-alive
+# connections; build them once (in the app lifespan or on first use) and share.
+_sync_client: Optional[Any] = None
+_async_client: Optional[Any] = None
+
+
+def _openai():
+    try:
+        import openai
+    except Exception as e:
+        raise RuntimeError(
+            "OpenAI package not installed. Please install with `pip install openai`"
+        ) from e
+    return openai
+
+
+def _limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_keepalive,
+    )
+
+
+def get_openai_client():
+    """Shared sync OpenAI client (created on first use)."""
+    global _sync_client
+    if _sync_client is None:
+        openai = _openai()
+        _sync_client = openai.OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            http_client=openai.DefaultHttpxClient(limits=_limits()),
+        )
+    return _sync_client
+
+
+def get_async_openai_client():
+    """Shared AsyncOpenAI client with a pooled keep-alive transport (created on first use)."""
+    global _async_client
+    if _async_client is None:
+        openai = _openai()
+        _async_client = openai.AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            http_client=openai.DefaultAsyncHttpxClient(limits=_limits()),
+        )
+    return _async_client
+
+
+def open_clients() -> None:
+    """Eagerly build the shared clients when the OpenAI provider is configured."""
+    if settings.llm_provider == "openai" and settings.openai_api_key:
+        get_openai_client()
+        get_async_openai_client()
+
+
+async def close_clients() -> None:
+    """Close the shared clients and their connection pools."""
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+    if _sync_client is not None:
+        _sync_client.close()
+    _sync_client = _async_client = None
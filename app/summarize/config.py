@@ -13,6 +13,45 @@ class Settings:
     llm_provider: str = os.getenv("LLM_PROVIDER", "dummy").lower()
     retry_threshold: float = float(os.getenv("RETRY_CONFIDENCE_THRESHOLD", "0.6"))
     model: str = os.getenv("MODEL", "gpt-4o-mini")
+    retry_strategy: str = os.getenv("RETRY_STRATEGY", "sequential").lower()
+    retry_deadline: float = float(os.getenv("RETRY_DEADLINE_SECONDS", "30"))
+    hedge_percentile: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    hedge_min_samples: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    hedge_initial_delay: float = float(os.getenv("HEDGE_INITIAL_DELAY_SECONDS", "1.0"))
+    retry_pool_size: int = int(os.getenv("RETRY_POOL_SIZE", "8"))
+    summary_cache_size: int = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+    summary_cache_ttl: float = float(os.getenv("SUMMARY_CACHE_TTL", "300"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+    openai_max_keepalive: int = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+    embed_cache_size: int = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+    embed_cache_path: str | None = os.getenv("EMBED_CACHE_PATH")
+    embed_dispatch_max_batch: int = int(os.getenv("EMBED_DISPATCH_MAX_BATCH", "64"))
+    embed_dispatch_wait_ms: float = float(os.getenv("EMBED_DISPATCH_WAIT_MS", "2"))
+    agent_batch_concurrency: int = int(os.getenv("AGENT_BATCH_CONCURRENCY", "8"))
+    agent_batch_max_items: int = int(os.getenv("AGENT_BATCH_MAX_ITEMS", "256"))
+    agent_history_size: int = int(os.getenv("AGENT_HISTORY_SIZE", "10"))
+    agent_max_sessions: int = int(os.getenv("AGENT_MAX_SESSIONS", "1024"))
+    agent_session_ttl: float = float(os.getenv("AGENT_SESSION_TTL", "1800"))
+    agent_sessions_max_bytes: int = int(
+        os.getenv("AGENT_SESSIONS_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    profile_enabled: bool = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+    profile_dir: str = os.getenv("PROFILE_DIR", "/tmp/app-profiles")
+    profile_max_files: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    profile_token: str | None = os.getenv("PROFILE_TOKEN")
+    rag_store_path: str | None = os.getenv("RAG_STORE_PATH")
+    rag_wal_fsync: bool = os.getenv("RAG_WAL_FSYNC", "true").lower() in ("1", "true", "yes")
+    rag_store_backend: str = os.getenv("RAG_STORE_BACKEND", "memory").lower()
+    rag_shared_path: str = os.getenv("RAG_SHARED_PATH", "/dev/shm/rag-store")
+    rag_index: str = os.getenv("RAG_INDEX", "exact").lower()
+    rag_ivf_nlist: int = int(os.getenv("RAG_IVF_NLIST", "256"))
+    rag_ivf_nprobe: int = int(os.getenv("RAG_IVF_NPROBE", "8"))
+    rag_vector_precision: str = os.getenv("RAG_VECTOR_PRECISION", "float32").lower()
+    rag_chunk_size: int = int(os.getenv("RAG_CHUNK_SIZE", "1000"))
+    rag_chunk_overlap: int = int(os.getenv("RAG_CHUNK_OVERLAP", "150"))
+    rag_chunk_unit: str = os.getenv("RAG_CHUNK_UNIT", "chars").lower()
+    rag_compact_threshold: float = float(os.getenv("RAG_COMPACT_THRESHOLD", "0.2"))
 
 
 settings = Settings()
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
-from typing import Protocol, Tuple
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Tuple
 
+from app.metrics.registry import SUMMARIZE_SECONDS
+
+from .cache import SUMMARY_CACHE, summary_key
+from .clients import get_async_openai_client, get_openai_client
 from .config import settings
+from .retry import arun_with_retry, run_with_retry
 from .utils import truncate_words
 
 
@@ -14,6 +23,14 @@ class LLM(Protocol):
         Implementations should NOT raise on minor format issues.
         """
 
+    async def asummarize(
+        self, text: str, max_words: int = 80, strict: bool = False
+    ) -> Tuple[str, float]:
+        """Async variant of summarize(); must not block the event loop on I/O."""
+
+    def astream(self, text: str, max_words: int = 80, strict: bool = False) -> AsyncIterator[str]:
+        """Raw model output (the JSON answer) as text deltas, in arrival order."""
+
 
 # Dummy provider (safe for tests / offline)
 class DummyLLM:
@@ -26,85 +43,299 @@ class DummyLLM:
         conf = 0.85 if len(text) < 500 else 0.55
         return base, conf
 
+    async def asummarize(
+        self, text: str, max_words: int = 80, strict: bool = False
+    ) -> Tuple[str, float]:
+        return self.summarize(text, max_words=max_words, strict=strict)
+
+    async def astream(
+        self, text: str, max_words: int = 80, strict: bool = False
+    ) -> AsyncIterator[str]:
+        # emit the same JSON a real model returns, a word at a time
+        summary, conf = self.summarize(text, max_words=max_words, strict=strict)
+        for piece in re.findall(r"\s*\S+", json.dumps({"summary": summary, "confidence": conf})):
+            yield piece
+            await asyncio.sleep(0)
+
+
+def _messages(text: str, max_words: int, strict: bool) -> List[Dict[str, str]]:
+    system = (
+        "You are a concise assistant. Summarize the user's text in at most "
+        f"{max_words} words. Always return JSON with keys: summary, confidence"
+    )
+    if strict:
+        system += " If you cannot comply exactly, lower confidence. JSON only."
+
+    prompt = f'Text:\n{text}\n\nReturn JSON like: {{"summary": "...", "confidence": 0.0}}'
+    return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+
+
+def _parse_summary(content: str, max_words: int) -> Tuple[str, float]:
+    # Naive JSON extraction (for robustness)
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if not match:
+        return truncate_words(content.strip(), max_words), 0.4
+
+    try:
+        data = json.loads(match.group(0))
+        summary = str(data.get("summary", "")).strip()
+        conf = float(data.get("confidence", 0.4))
+        return (summary[:1000], max(0.0, min(1.0, conf)))
+    except Exception:
+        return content.strip()[:max_words], 0.4
+
+
+_SUMMARY_KEY_RE = re.compile(r'"summary"\s*:\s*"')
+
+
+class _SummaryExtractor:
+    """
+    Pulls the "summary" string out of streamed JSON output as it arrives.
+    - feed() returns the newly decoded summary text (escapes resolved)
+    - output that does not start with "{" or a code fence is forwarded as plain text
+    - text holds the full raw output for _parse_summary at the end
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._buf = ""
+        self._state = "seek"  # seek -> value -> done, or plain
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> str:
+        self._parts.append(delta)
+        if self._state == "plain":
+            return delta
+        if self._state == "done":
+            return ""
+        self._buf += delta
+        if self._state == "seek":
+            head = self._buf.lstrip()
+            if head and head[0] not in "{`":
+                self._state, out, self._buf = "plain", self._buf, ""
+                return out
+            match = _SUMMARY_KEY_RE.search(self._buf)
+            if not match:
+                return ""
+            self._state, self._buf = "value", self._buf[match.end() :]
+        return self._decode()
+
+    def _decode(self) -> str:
+        buf, out, i = self._buf, [], 0
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._state, self._buf = "done", ""
+                return "".join(out)
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            n = 2
+            if buf[i + 1 : i + 2] == "u":
+                n = 6
+                if buf[i + 2 : i + 4].lower() in ("d8", "d9", "da", "db"):
+                    n = 12  # surrogate pair
+            if i + n > len(buf):
+                break  # escape split across deltas; wait for the rest
+            try:
+                out.append(json.loads(f'"{buf[i : i + n]}"'))
+            except ValueError:
+                out.append(buf[i : i + n])
+            i += n
+        self._buf = buf[i:]
+        return "".join(out)
+
 
 # OpenAI as provider
 class OpenAILLM:
+    """Uses the process-wide pooled clients from clients.py (no per-request client)."""
+
     def __init__(self) -> None:
-        try:
-            from openai import OpenAI
-        except Exception as e:
-            raise RuntimeError(
-                "OpenAI package not installed. Please install with `pip install openai`"
-            ) from e
-        self._OpenAI = OpenAI
-        self._client = OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url)
+        self._client = get_openai_client()
 
     def summarize(self, text: str, max_words: int = 80, strict: bool = False) -> Tuple[str, float]:
-        system = (
-            "You are a concise assistant. Summarize the user's text in at most "
-            f"{max_words} words. Always return JSON with keys: summary, confidence"
-        )
-        if strict:
-            system += " If you cannot comply exactly, lower confidence. JSON only."
-
-        prompt = f'Text:\n{text}\n\nReturn JSON like: {{"summary": "...", "confidence": 0.0}}'
-
+        messages = _messages(text, max_words, strict)
         # Default to newest SDKs; otherwise, fallback to chat.completions for older SDKs.
         try:
             # Try Response API
             resp = self._client.responses.create(
-                model=settings.model,
-                input=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.2,
+                model=settings.model, input=messages, temperature=0.2
             )
             content = resp.output_text
         except Exception:
             # Fallback to older SDKs
             chat = self._client.chat.completions.create(
-                model=settings.model,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.2,
+                model=settings.model, messages=messages, temperature=0.2
             )
             content = chat.choices[0].message.content
+        return _parse_summary(content, max_words)
 
-        # Naive JSON extraction (for robustness)
-        import json
-        import re
-
-        match = re.search(r"\{.*\}", content, re.DOTALL)
-        if not match:
-            return truncate_words(content.strip(), max_words), 0.4
-
+    async def asummarize(
+        self, text: str, max_words: int = 80, strict: bool = False
+    ) -> Tuple[str, float]:
+        client = get_async_openai_client()
+        messages = _messages(text, max_words, strict)
         try:
-            data = json.loads(match.group(0))
-            summary = str(data.get("summary", "")).strip()
-            conf = float(data.get("confidence", 0.4))
-            return (summary[:1000], max(0.0, min(1.0, conf)))
+            resp = await client.responses.create(
+                model=settings.model, input=messages, temperature=0.2
+            )
+            content = resp.output_text
         except Exception:
-            return content.strip()[:max_words], 0.4
+            chat = await client.chat.completions.create(
+                model=settings.model, messages=messages, temperature=0.2
+            )
+            content = chat.choices[0].message.content
+        return _parse_summary(content, max_words)
+
+    async def astream(
+        self, text: str, max_words: int = 80, strict: bool = False
+    ) -> AsyncIterator[str]:
+        stream = await get_async_openai_client().chat.completions.create(
+            model=settings.model,
+            messages=_messages(text, max_words, strict),
+            temperature=0.2,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 # Factory + high-level helper with retry
+_LLMS: Dict[str, LLM] = {}
+
+
 def get_llm() -> LLM:
-    if settings.llm_provider == "openai" and settings.openai_api_key:
-        return OpenAILLM()
-    return DummyLLM()
+    """Provider instance for the current settings, built once and reused."""
+    name = "openai" if settings.llm_provider == "openai" and settings.openai_api_key else "dummy"
+    llm = _LLMS.get(name)
+    if llm is None:
+        llm = _LLMS[name] = OpenAILLM() if name == "openai" else DummyLLM()
+    return llm
 
 
-def summarize_with_retry(text: str, max_words: int = 80) -> Tuple[str, float, bool]:
+def _cache_key(text: str, max_words: int) -> bytes:
+    llm = get_llm()
+    if isinstance(llm, OpenAILLM):
+        return summary_key("openai", settings.model, text, max_words)
+    return summary_key(type(llm).__name__, "", text, max_words)
+
+
+def summarize_with_retry(
+    text: str, max_words: int = 80, deadline: Optional[float] = None
+) -> Tuple[str, float, bool]:
     """
     Returns (summary, confidence, retried)
+    Served from SUMMARY_CACHE when possible; identical concurrent calls share one computation.
+    A low-confidence answer is retried in strict mode following settings.retry_strategy
+    (sequential / parallel / hedged) within deadline seconds (default settings.retry_deadline,
+    0 disables); TimeoutError if no answer arrived in time.
     """
+    start = time.perf_counter()
+    result = SUMMARY_CACHE.get_or_compute(
+        _cache_key(text, max_words),
+        lambda: _summarize_with_retry(text, max_words, deadline),
+        settings.retry_threshold,
+    )
+    _observe(start, result)
+    return result
+
+
+def _observe(start: float, result: Tuple[str, float, bool]) -> None:
+    # summarize_duration_seconds{retried}; the flag is only known once the call returns
+    SUMMARIZE_SECONDS.labels("true" if result[2] else "false").observe(time.perf_counter() - start)
+
+
+def _summarize_with_retry(
+    text: str, max_words: int, deadline: Optional[float]
+) -> Tuple[str, float, bool]:
     llm = get_llm()
-    summary, conf = llm.summarize(text, max_words=max_words, strict=False)
-    if conf < settings.retry_threshold:
-        summary2, conf2 = llm.summarize(text, max_words=max_words, strict=True)
-        # pick the better of the two
-        return (summary2, conf2, True) if conf2 > conf else (summary, conf, True)
-    return (summary, conf, False)
+    return run_with_retry(
+        lambda strict: llm.summarize(text, max_words=max_words, strict=strict),
+        settings.retry_strategy,
+        settings.retry_threshold,
+        settings.retry_deadline if deadline is None else deadline,
+    )
+
+
+async def asummarize_with_retry(
+    text: str, max_words: int = 80, deadline: Optional[float] = None
+) -> Tuple[str, float, bool]:
+    """Async summarize_with_retry: same retry policy and cache; losing calls are cancelled."""
+    start = time.perf_counter()
+    result = await SUMMARY_CACHE.aget_or_compute(
+        _cache_key(text, max_words),
+        lambda: _asummarize_with_retry(text, max_words, deadline),
+        settings.retry_threshold,
+    )
+    _observe(start, result)
+    return result
+
+
+async def _asummarize_with_retry(
+    text: str, max_words: int, deadline: Optional[float]
+) -> Tuple[str, float, bool]:
+    llm = get_llm()
+    return await arun_with_retry(
+        lambda strict: llm.asummarize(text, max_words=max_words, strict=strict),
+        settings.retry_strategy,
+        settings.retry_threshold,
+        settings.retry_deadline if deadline is None else deadline,
+    )
+
+
+async def astream_summary(
+    text: str, max_words: int = 80, deadline: Optional[float] = None
+) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Streaming asummarize_with_retry. Yields (event, data):
+      - ("token", {"text"}) for summary text as the provider produces it
+      - ("summary", {"summary", "confidence", "retried"}) once, at the end
+    The first attempt is streamed; retries follow settings.retry_strategy within
+    deadline as in asummarize_with_retry, through the same cache and metrics.
+    Tokens already sent cannot be taken back, so the final event carries the
+    chosen summary. A cached or coalesced result is replayed as one token.
+    """
+    llm = get_llm()
+    tokens: asyncio.Queue = asyncio.Queue()
+
+    async def attempt(strict: bool) -> Tuple[str, float]:
+        if strict:
+            return await llm.asummarize(text, max_words=max_words, strict=True)
+        extractor = _SummaryExtractor()
+        async for delta in llm.astream(text, max_words=max_words, strict=False):
+            piece = extractor.feed(delta)
+            if piece:
+                tokens.put_nowait(piece)
+        return _parse_summary(extractor.text, max_words)
+
+    start = time.perf_counter()
+    run = asyncio.ensure_future(
+        SUMMARY_CACHE.aget_or_compute(
+            _cache_key(text, max_words),
+            lambda: arun_with_retry(
+                attempt,
+                settings.retry_strategy,
+                settings.retry_threshold,
+                settings.retry_deadline if deadline is None else deadline,
+            ),
+            settings.retry_threshold,
+        )
+    )
+    run.add_done_callback(lambda _: tokens.put_nowait(None))
+    streamed = False
+    try:
+        while (piece := await tokens.get()) is not None:
+            streamed = True
+            yield "token", {"text": piece}
+        summary, conf, retried = run.result()
+    finally:
+        run.cancel()  # the consumer went away: stop the provider calls (no-op once done)
+    _observe(start, (summary, conf, retried))
+    if not streamed:
+        yield "token", {"text": summary}
+    yield "summary", {"summary": summary, "confidence": conf, "retried": retried}
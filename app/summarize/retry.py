@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import settings
+
+Summary = Tuple[str, float]  # (summary, confidence)
+Result = Tuple[str, float, bool]  # (summary, confidence, retried)
+
+STRATEGIES = ("sequential", "parallel", "hedged")
+
+
+class LatencyTracker:
+    """Sliding window of first-attempt latencies; the hedged strategy waits a percentile of it."""
+
+    def __init__(self, window: int = 256) -> None:
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(pct / 100.0 * (len(samples) - 1)))))
+        return samples[rank]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+LATENCY = LatencyTracker()
+# extra (parallel / hedged) strict calls of the sync runner; first attempts run inline
+_POOL = ThreadPoolExecutor(
+    max_workers=max(1, settings.retry_pool_size), thread_name_prefix="summarize-retry"
+)
+
+
+def hedge_delay() -> float:
+    """Seconds to wait for the first attempt before hedging with the strict one."""
+    if len(LATENCY) < settings.hedge_min_samples:
+        return settings.hedge_initial_delay
+    return LATENCY.percentile(settings.hedge_percentile)
+
+
+class _Plan:
+    """
+    Shared bookkeeping for the sync and async runners.
+    - strategy decides when the strict attempt starts: after a low-confidence
+      first answer (sequential), together with it (parallel), or after
+      hedge_delay() without a first answer (hedged, also after a low answer)
+    - any answer reaching the threshold wins at once; otherwise the better of
+      the two is kept (the first attempt on ties, as before)
+    """
+
+    def __init__(self, strategy: str, threshold: float, deadline: Optional[float]) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown retry strategy: {strategy}")
+        self.strategy = strategy
+        self.threshold = threshold
+        self.start = time.monotonic()
+        self.end = self.start + deadline if deadline else None
+        self.hedge_at = self.start + hedge_delay() if strategy == "hedged" else None
+        self.strict_started = strategy == "parallel"
+        self.results: List[Tuple[str, float, bool]] = []
+        self.errors: List[BaseException] = []
+
+    def timeout(self) -> Optional[float]:
+        wake = [t for t in (self.hedge_at, self.end) if t is not None]
+        return max(0.0, min(wake) - time.monotonic()) if wake else None
+
+    def should_hedge(self) -> bool:
+        return self.hedge_at is not None and time.monotonic() >= self.hedge_at
+
+    def remaining(self) -> Optional[float]:
+        return None if self.end is None else max(0.0, self.end - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.end is not None and time.monotonic() >= self.end
+
+    def take(self, strict: bool, outcome: Callable[[], Summary]) -> Optional[Result]:
+        """Record one finished attempt; returns the final result if it settles the request."""
+        try:
+            summary, conf = outcome()
+        except Exception as e:
+            self.errors.append(e)
+            return None
+        if not strict:
+            LATENCY.record(time.monotonic() - self.start)
+        if conf >= self.threshold:
+            return (summary, conf, self.strict_started)
+        self.results.append((summary, conf, strict))
+        return None
+
+    def want_strict(self) -> bool:
+        """Start the strict attempt now? (marks it started)"""
+        if self.strict_started:
+            return False
+        if self.should_hedge() or any(not strict for _, _, strict in self.results):
+            self.strict_started = True
+            self.hedge_at = None
+            return True
+        return False
+
+    def best(self) -> Result:
+        if not self.results:
+            if self.errors:
+                raise self.errors[0]
+            raise TimeoutError("summarization deadline exceeded")
+        summary, conf, _ = max(self.results, key=lambda r: (r[1], not r[2]))
+        return (summary, conf, self.strict_started)
+
+
+def run_with_retry(
+    call: Callable[[bool], Summary],
+    strategy: str,
+    threshold: float,
+    deadline: Optional[float] = None,
+) -> Result:
+    """
+    Sync runner; call(strict) performs one blocking provider call. The first
+    attempt, and a sequential strict retry, run inline in the caller's thread;
+    only the extra parallel / hedged strict call goes to the retry pool, and is
+    retried inline instead when it is still queued behind busy workers. A
+    blocking call cannot be interrupted: the deadline is checked between inline
+    attempts, and a pooled loser is abandoned (its result is ignored).
+    """
+    plan = _Plan(strategy, threshold, deadline)
+    lock = threading.Lock()
+    first_done = threading.Event()
+    extra: Optional[Future] = None
+    if plan.strict_started:
+        extra = _POOL.submit(call, True)
+    elif plan.hedge_at is not None:
+        extra = _POOL.submit(_hedge, call, plan, lock, first_done)
+    try:
+        final = plan.take(False, lambda: call(False))
+    finally:
+        first_done.set()
+    if final is not None:
+        if extra is not None:
+            extra.cancel()
+        return final
+    if extra is not None and extra.cancel():
+        extra = None
+        plan.strict_started = False
+    if extra is not None:
+        done, _ = wait([extra], timeout=plan.remaining())
+        if not done:
+            return plan.best()
+        if extra.exception() is not None or extra.result() is not None:
+            final = plan.take(True, extra.result)
+            return final if final is not None else plan.best()
+    with lock:
+        retry = plan.want_strict()
+    if retry and not plan.expired():
+        final = plan.take(True, lambda: call(True))
+        if final is not None:
+            return final
+    return plan.best()
+
+
+def _hedge(
+    call: Callable[[bool], Summary], plan: _Plan, lock: threading.Lock, first_done: threading.Event
+) -> Optional[Summary]:
+    """Pool job of the hedged strategy: the strict call, unless the first answer comes in time."""
+    if first_done.wait(plan.timeout()):
+        return None
+    with lock:
+        if plan.expired() or not plan.want_strict():
+            return None
+    return call(True)
+
+
+async def arun_with_retry(
+    acall: Callable[[bool], Awaitable[Summary]],
+    strategy: str,
+    threshold: float,
+    deadline: Optional[float] = None,
+) -> Result:
+    """Async runner; losing or overdue attempts are cancelled."""
+    plan = _Plan(strategy, threshold, deadline)
+    tasks: Dict[asyncio.Future, bool] = {asyncio.ensure_future(acall(False)): False}
+    if plan.strict_started:
+        tasks[asyncio.ensure_future(acall(True))] = True
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=plan.timeout(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                final = plan.take(tasks[task], task.result)
+                if final is not None:
+                    return final
+            if plan.want_strict():
+                task = asyncio.ensure_future(acall(True))
+                tasks[task] = True
+                pending.add(task)
+            if plan.expired():
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    return plan.best()
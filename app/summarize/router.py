@@ -1,18 +1,60 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
-from .llm import summarize_with_retry
+from .cache import SUMMARY_CACHE
+from .llm import astream_summary, asummarize_with_retry
 from .schemas import SummarizeRequest, SummarizeResponse
-from .utils import truncate_words
+from .utils import sse_event, truncate_words, word_prefix
 
 router = APIRouter(prefix="/summarize", tags=["summarize"])
 
 
 @router.post("", response_model=SummarizeResponse)
-def summarize(req: SummarizeRequest):
+async def summarize(req: SummarizeRequest):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty or whitespace")
     # defensive cap
     text = req.text.strip()
-    summary, conf, _ = summarize_with_retry(text, req.max_words)
+    try:
+        summary, conf, _ = await asummarize_with_retry(text, req.max_words)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail="Summarization timed out") from e
     summary = truncate_words(summary or "", req.max_words)
     return SummarizeResponse(summary=summary, confidence=float(conf))
+
+
+@router.post("/stream")
+async def summarize_stream(req: SummarizeRequest):
+    """
+    Server-Sent Events: "token" events with summary text as it is generated (up
+    to max_words), then one "summary" event with the final summary, confidence
+    and retried flag. The headers are already sent when the summary fails, so a
+    timeout or provider error ends the stream with one "error" event instead.
+    """
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty or whitespace")
+    text = req.text.strip()
+
+    async def events():
+        sent = ""
+        try:
+            async for event, data in astream_summary(text, req.max_words):
+                if event == "token":
+                    kept = word_prefix(sent + data["text"], req.max_words)
+                    if len(kept) > len(sent):
+                        yield sse_event(event, {"text": kept[len(sent) :]})
+                        sent = kept
+                    continue
+                data = {**data, "summary": truncate_words(data["summary"] or "", req.max_words)}
+                yield sse_event(event, data)
+        except TimeoutError:
+            yield sse_event("error", {"detail": "Summarization timed out"})
+        except Exception:
+            yield sse_event("error", {"detail": "Summarization failed"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.get("/cache")
+async def summary_cache_stats():
+    return SUMMARY_CACHE.stats()
@@ -1,3 +1,23 @@
+import json
+import re
+from typing import Any
+
+_WORD_RE = re.compile(r"\S+")
+
+
 def truncate_words(text: str, max_words: int) -> str:
     words = text.split()
     return text if len(words) <= max_words else " ".join(words[:max_words])
+
+
+def word_prefix(text: str, max_words: int) -> str:
+    """text cut after its max_words-th word, whitespace kept (for streamed pieces)."""
+    for i, match in enumerate(_WORD_RE.finditer(text), 1):
+        if i == max_words:
+            return text[: match.end()]
+    return text
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,6 +1,8 @@
 import pytest
 
+from app.rag.cache import CACHE
 from app.rag.store import STORE
+from app.summarize.cache import SUMMARY_CACHE
 from app.summarize.config import settings
 
 
@@ -28,3 +30,13 @@ def _clear_store():
     STORE.clear()
     yield
     STORE.clear()
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    """Start every test with cold embedding and summary caches"""
+    CACHE.clear()
+    SUMMARY_CACHE.clear()
+    yield
+    CACHE.clear()
+    SUMMARY_CACHE.clear()
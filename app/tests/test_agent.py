@@ -1,11 +1,12 @@
-import ast
+import asyncio
 import json
 
 import pytest
 from fastapi.testclient import TestClient
 
 from app.agents.agent import Agent
-from app.agents.tools import REGISTRY, _eval_node
+from app.agents.calc import PROGRAMS, CalcError, compile_expr, evaluate
+from app.agents.tools import REGISTRY, calculator_many
 from app.main import app
 from app.rag.store import STORE
 
@@ -46,10 +47,58 @@ def test_agent_tool_error():
     assert resp.output.startswith("tool_error:") and "ZeroDivisionError" in resp.output
 
 
-def test_eval_node_unsupported_raises():
-    node = ast.parse("foo", mode="eval")
-    with pytest.raises(ValueError, match="unsupported expression"):
-        _eval_node(node)
+def test_calc_rejects_malformed_and_oversized_input():
+    for expr in ["foo", "1 2", "2**3", "(1+2", "1+2)", "*3", "1..2", "", "9" * 16 + "+1"]:
+        with pytest.raises(CalcError):
+            compile_expr(expr)
+    with pytest.raises(CalcError, match="nested too deeply"):
+        compile_expr("(" * 200 + "1" + ")" * 200)
+    with pytest.raises(CalcError, match="too long"):
+        compile_expr("+".join(["1"] * 300))
+    with pytest.raises(CalcError, match="division by zero"):
+        evaluate("1/(2-2)")
+    with pytest.raises(CalcError, match="out of range"):
+        evaluate("*".join(["100000"] * 4))
+    # deep nesting is rejected quickly instead of hitting RecursionError
+    assert REGISTRY["calculator"]("(" * 10000 + "1" + ")" * 10000) == "calc_error"
+    # oversized agent text is refused before the character filter scans it
+    assert REGISTRY["calculator"]("what is 1+1 " + "x" * 100_000) == "calc_error"
+    assert calculator_many(["1+1", "1+1 " + "x" * 100_000]) == ["2", "calc_error"]
+
+
+def test_calc_precedence_signs_and_cache():
+    cases = {"-2*3": "-6", "2*-3": "-6", "--4": "4", "+5-2": "3", "7/2": "3.5", "1-2-3": "-4"}
+    cases.update({"8/4/2": "1", "2*(3+4)*-(1-2)": "14", ".5+1.": "1.5", " 1 +  2 ": "3"})
+    for expr, want in cases.items():
+        assert REGISTRY["calculator"](expr) == want, expr
+    PROGRAMS.clear()
+    evaluate("1 + 2")
+    evaluate("1+2")
+    assert PROGRAMS.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    # oversized input is rejected before normalizing and never fills the cache
+    for n in range(3):
+        with pytest.raises(CalcError, match="too long"):
+            evaluate(" " * 100_000 + str(n))
+    assert PROGRAMS.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_calculator_many_matches_scalar_path():
+    queries = ["1+2", "30+4", "calc: 2*(3+4)", "5*(1+1)", "1/0", "3/(1-1)", "x", "-7/2"]
+    queries += ["*".join(["100000"] * 4), "999999*999999"]
+    assert calculator_many(queries) == [REGISTRY["calculator"](q) for q in queries]
+
+
+def test_agent_batch_uses_batch_tools():
+    calls = []
+
+    def many(payloads):
+        calls.append(payloads)
+        return [p[::-1] for p in payloads]
+
+    agent = Agent(REGISTRY, batch_tools={"echo": many})
+    items = asyncio.run(agent.arun_batch(["echo: ab", "ping", "echo: cd"]))
+    assert [i.output for i in items] == ["ba", "pong", "dc"]
+    assert calls == [["ab", "cd"]]
 
 
 def test_run_ping():
@@ -147,3 +196,177 @@ def test_agent_rag_answer_with_dummyllm(monkeypatch):
     assert len(result["answer"].split()) <= 80
     assert "Using only the context below, answer the question" in result["answer"]
     assert doc_id in result["sources"]
+
+
+def test_agent_arun_awaits_async_tool():
+    import asyncio
+
+    calls = []
+
+    async def slow_echo(payload: str) -> str:
+        calls.append(payload)
+        return payload.upper()
+
+    agent = Agent({"echo": REGISTRY["echo"]}, {"echo": slow_echo})
+    resp = asyncio.run(agent.arun("echo: hi"))
+    assert (resp.tool, resp.output) == ("echo", "HI")
+    assert calls == ["hi"]
+    # tools without an async variant run inline
+    resp = asyncio.run(Agent(REGISTRY).arun("ping"))
+    assert resp.output == "pong"
+
+
+def test_agent_arun_rag_search_runs_off_the_loop(monkeypatch):
+    import threading
+
+    import app.agents.tools as tools
+    from app.agents.tools import ASYNC_REGISTRY
+
+    threads = []
+    real_query = tools.STORE.query
+
+    def query(q, limit=3):
+        threads.append(threading.current_thread())
+        return real_query(q, limit=limit)
+
+    monkeypatch.setattr(tools.STORE, "query", query)
+    STORE.add("Sync searches are handed to a worker thread")
+    agent = Agent(REGISTRY, ASYNC_REGISTRY)
+    resp = asyncio.run(agent.arun("rag: worker"))
+    assert resp.tool == "rag_search" and json.loads(resp.output)
+    items = asyncio.run(agent.arun_batch(["rag: worker", "rag: thread"]))
+    assert [i.tool for i in items] == ["rag_search", "rag_search"]
+    assert len(threads) == 3
+    assert all(t is not threading.main_thread() for t in threads)
+
+
+def test_api_agent_rag_answer_async_path():
+    doc_id = STORE.add("Async retrieval keeps the event loop free.")
+    r = client.post("/agent", json={"text": "rag_answer: event loop"})
+    assert r.status_code == 200
+    result = json.loads(r.json()["output"])
+    assert result["sources"] == [doc_id]
+
+
+def test_api_agent_stream_rag_answer_and_plain_tool():
+    doc_id = STORE.add("Streaming answers forward tokens early.")
+    r = client.post("/agent/stream", json={"text": "rag_answer: streaming"})
+    assert r.status_code == 200
+    frames = [f.split("\n") for f in r.text.split("\n\n") if f]
+    events = [(f[0][len("event: ") :], json.loads(f[1][len("data: ") :])) for f in frames]
+    assert {e for e, _ in events[:-1]} == {"token"}
+    final = events[-1][1]
+    assert events[-1][0] == "result" and final["tool"] == "rag_answer"
+    assert final["sources"] == [doc_id] and 0.0 <= final["confidence"] <= 1.0
+    assert "".join(d["text"] for _, d in events[:-1]) == final["answer"]
+    assert json.loads(final["output"]) == {"answer": final["answer"], "sources": [doc_id]}
+
+    r = client.post("/agent/stream", json={"text": "ping"})
+    assert r.text == 'event: result\ndata: {"tool": "ping", "output": "pong"}\n\n'
+
+
+def test_agent_history_is_bounded():
+    agent = Agent(REGISTRY, history_size=3)
+    for i in range(5):
+        resp = agent.run(f"echo: {i}")
+    assert [r.output for r in agent.history] == ["2", "3", "4"]
+    assert [r.output for r in resp.history] == ["2", "3", "4"]
+
+
+def test_agent_plan_returns_payload_without_shared_state():
+    agent = Agent(REGISTRY)
+    assert agent.plan("calc: 1 + 2") == ("calculator", "1 + 2")
+    assert agent.plan(" ping ") == ("ping", "")
+    assert agent.plan("hello") == ("echo", "hello")
+    assert not hasattr(agent, "_last_payload")
+
+
+def test_agent_sessions_keep_separate_histories():
+    def run(text, session_id=None):
+        body = {"text": text} if session_id is None else {"text": text, "session_id": session_id}
+        r = client.post("/agent", json=body)
+        assert r.status_code == 200
+        return r.json()
+
+    run("echo: a1", "sess-a")
+    run("echo: b1", "sess-b")
+    resp = run("echo: a2", "sess-a")
+    assert resp["session_id"] == "sess-a"
+    assert [h["output"] for h in resp["history"]] == ["a1", "a2"]
+    anonymous = run("echo: nobody")
+    assert anonymous["session_id"] is None and len(anonymous["history"]) == 1
+    assert client.get("/agent/sessions").json()["sessions"] >= 2
+
+
+def test_session_table_lru_ttl_and_memory_cap():
+    from app.agents.sessions import SessionTable
+
+    table = SessionTable(lambda: Agent(REGISTRY), max_sessions=2, ttl=3600, max_bytes=100)
+    a = table.get("a")
+    table.get("b")
+    assert table.get("a") is a  # "b" is now least recently used
+    table.get("c")
+    assert len(table) == 2 and table.get("a") is a and table.stats()["evictions"] == 1
+
+    # history bytes count against the cap; older sessions go first
+    a.run("echo: " + "x" * 60)
+    table.update("a", a)
+    c = table.get("c")
+    c.run("echo: " + "y" * 60)
+    table.update("c", c)
+    assert table.stats()["sessions"] == 1 and table.get("c") is c
+    assert table.stats()["history_bytes"] == c.history_bytes
+
+    # a session bigger than the whole cap is not kept
+    c.run("echo: " + "z" * 200)
+    table.update("c", c)
+    assert table.stats() == {"sessions": 0, "history_bytes": 0, "evictions": 3}
+
+    expiring = SessionTable(lambda: Agent(REGISTRY), ttl=0)
+    first = expiring.get("a")
+    assert expiring.get("a") is not first
+
+
+def test_agent_batch_bounds_concurrency_and_keeps_order():
+    import asyncio
+
+    running, peak = 0, 0
+
+    async def slow_echo(payload: str) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if payload == "boom":
+            raise RuntimeError("bad payload")
+        return payload.upper()
+
+    agent = Agent(REGISTRY, {"echo": slow_echo})
+    texts = [f"echo: {i}" for i in range(6)] + ["2+3", "echo: boom", " "]
+    items = asyncio.run(agent.arun_batch(texts, concurrency=2))
+    assert [i.output for i in items[:7]] == ["0", "1", "2", "3", "4", "5", "5"]
+    assert items[7].tool == "echo" and items[7].error == "RuntimeError: bad payload"
+    assert items[8].error == "empty_text"
+    assert peak == 2
+    assert all(i.elapsed_ms >= 0 for i in items) and not agent.history
+
+
+def test_api_agent_batch():
+    r = client.post("/agent/batch", json={"texts": ["12*2", "ping", "calc: 1/0"]})
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [(i["tool"], i["output"]) for i in results[:2]] == [
+        ("calculator", "24"),
+        ("ping", "pong"),
+    ]
+    assert results[2]["output"] == "calc_error" and results[2]["error"] is None
+    assert client.post("/agent/batch", json={"texts": []}).status_code == 422
+
+
+def test_api_agent_batch_rejects_oversize(monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "agent_batch_max_items", 2)
+    r = client.post("/agent/batch", json={"texts": ["1", "2", "3"]})
+    assert r.status_code == 400
@@ -1,3 +1,5 @@
+import json
+
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -31,3 +33,141 @@ def test_summarize_dummyllm():
     data = r.json()
     assert data["summary"] == "Hello world, last word of this sentence should be truncated in"
     assert data["confidence"] == 0.85
+
+
+def test_async_summarize_matches_sync():
+    import asyncio
+
+    from app.summarize.llm import asummarize_with_retry, summarize_with_retry
+
+    settings.llm_provider = "dummy"
+    settings.openai_api_key = None
+    text = "word " * 200  # long text -> low confidence -> retried
+    assert asyncio.run(asummarize_with_retry(text, 20)) == summarize_with_retry(text, 20)
+
+
+def test_get_llm_reuses_provider_instance():
+    from app.summarize.llm import DummyLLM, get_llm
+
+    settings.llm_provider = "dummy"
+    assert isinstance(get_llm(), DummyLLM)
+    assert get_llm() is get_llm()
+
+
+def test_openai_clients_are_shared_and_pooled(monkeypatch):
+    import asyncio
+    import types
+
+    from app.summarize import clients
+
+    built = []
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            built.append(kwargs)
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    class FakeAsyncClient(FakeClient):
+        async def close(self):
+            self.closed = True
+
+    fake = types.SimpleNamespace(
+        OpenAI=FakeClient,
+        AsyncOpenAI=FakeAsyncClient,
+        DefaultHttpxClient=lambda limits: ("sync-pool", limits),
+        DefaultAsyncHttpxClient=lambda limits: ("async-pool", limits),
+    )
+    monkeypatch.setattr(clients, "_openai", lambda: fake)
+    monkeypatch.setattr(clients, "_sync_client", None)
+    monkeypatch.setattr(clients, "_async_client", None)
+
+    assert clients.get_async_openai_client() is clients.get_async_openai_client()
+    assert clients.get_openai_client() is clients.get_openai_client()
+    assert len(built) == 2
+    pool = built[0]["http_client"]
+    assert pool[0] == "async-pool"
+    assert pool[1].max_keepalive_connections == settings.openai_max_keepalive
+    aclient = clients.get_async_openai_client()
+    asyncio.run(clients.close_clients())
+    assert aclient.closed
+    assert clients._async_client is None
+
+
+def test_summary_cache_stats_endpoint():
+    payload = {"text": "Cache me if you can.", "max_words": 10}
+    client.post("/summarize", json=payload)
+    client.post("/summarize", json=payload)
+    stats = client.get("/summarize/cache").json()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_summarize_stream_sse():
+    r = client.post(
+        "/summarize/stream", json={"text": "Tokens arrive one by one.", "max_words": 10}
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    frames = [f for f in r.text.split("\n\n") if f]
+    events = [
+        (f.split("\n")[0][len("event: ") :], json.loads(f.split("\n")[1][6:])) for f in frames
+    ]
+    assert len(events) > 2 and all(e == "token" for e, _ in events[:-1])
+    assert "".join(d["text"] for _, d in events[:-1]) == "Tokens arrive one by one."
+    assert events[-1] == (
+        "summary",
+        {"summary": "Tokens arrive one by one.", "confidence": 0.85, "retried": False},
+    )
+    assert client.post("/summarize/stream", json={"text": "  "}).status_code == 400
+
+
+def _sse(text):
+    frames = [f.split("\n") for f in text.split("\n\n") if f]
+    return [(f[0][len("event: ") :], json.loads(f[1][len("data: ") :])) for f in frames]
+
+
+def test_summarize_stream_tokens_stop_at_max_words(monkeypatch):
+    from app.summarize import llm
+
+    class WordyLLM:
+        async def astream(self, text, max_words=80, strict=False):
+            yield '{"summary": "one two three four five six seven eight nine te'
+            yield "n eleven twelve"
+            yield '", "confidence": 0.9}'
+
+    monkeypatch.setattr(llm, "get_llm", lambda: WordyLLM())
+    r = client.post("/summarize/stream", json={"text": "count", "max_words": 10})
+    events = _sse(r.text)
+    ten = "one two three four five six seven eight nine ten"
+    assert "".join(d["text"] for e, d in events if e == "token") == ten
+    assert events[-1] == ("summary", {"summary": ten, "confidence": 0.9, "retried": False})
+
+
+def test_summarize_stream_reports_errors_as_an_event(monkeypatch):
+    import asyncio
+
+    from app.summarize import llm
+
+    class FailingLLM:
+        def __init__(self, exc):
+            self.exc = exc
+
+        async def astream(self, text, max_words=80, strict=False):
+            yield '{"summary": "partial'
+            await asyncio.sleep(0.2)
+            raise self.exc
+
+    monkeypatch.setattr(settings, "retry_deadline", 0.05)
+    monkeypatch.setattr(llm, "get_llm", lambda: FailingLLM(RuntimeError("boom")))
+    r = client.post("/summarize/stream", json={"text": "slow"})
+    assert r.status_code == 200
+    assert _sse(r.text) == [
+        ("token", {"text": "partial"}),
+        ("error", {"detail": "Summarization timed out"}),
+    ]
+
+    monkeypatch.setattr(settings, "retry_deadline", 5.0)
+    r = client.post("/summarize/stream", json={"text": "broken"})
+    assert _sse(r.text)[-1] == ("error", {"detail": "Summarization failed"})
@@ -0,0 +1,19 @@
+from benchmarks.hot_paths import regressions
+
+
+def test_benchmark_regression_gate():
+    baseline = [
+        {"name": "store.query", "docs": 1000, "ops_per_s": 100.0, "p50_ms": 1.0, "p99_ms": 2.0},
+        {"name": "store.add_many", "docs": 1000, "ops_per_s": 500.0},
+    ]
+    ok = [
+        {"name": "store.query", "docs": 1000, "ops_per_s": 80.0, "p50_ms": 1.4, "p99_ms": 9.0},
+        {"name": "store.query", "docs": 10000, "ops_per_s": 1.0, "p50_ms": 99.0, "p99_ms": 99.0},
+    ]
+    assert regressions(ok, baseline, tolerance=0.5) == []  # p99 and unknown sizes are not gated
+    slow = [
+        {"name": "store.query", "docs": 1000, "ops_per_s": 60.0, "p50_ms": 1.6, "p99_ms": 2.0},
+        {"name": "store.add_many", "docs": 1000, "ops_per_s": 300.0},
+    ]
+    failed = regressions(slow, baseline, tolerance=0.5)
+    assert len(failed) == 3 and all("docs=1000" in line for line in failed)
@@ -14,27 +14,19 @@ def test_embed_openai_import_failure(monkeypatch):
             raise ImportError("No module named 'openai'")
         return real_import(name, *args, **kwargs)
 
-    monkeypatch.setattr(builtins, "__import__", fake_import)
-    import importlib
-    import sys
+    import app.rag.embeddings as emb
 
-    sys.modules.pop("app.rag.embeddings", None)
-    emb = importlib.import_module("app.rag.embeddings")
-    assert emb.OpenAI is None
+    # openai is imported on first use, so a missing package only fails the openai backend
+    monkeypatch.setattr(builtins, "__import__", fake_import)
     with pytest.raises(
         RuntimeError, match="openai package not available; install `openai` to use embed_openai"
     ):
         emb.embed_openai("test")
-    sys.modules.pop("app.rag.embeddings", None)
 
 
 def test_embed_openai_no_api_key(monkeypatch):
     """Simulate openai package installed but no API key set"""
     import app.rag.embeddings as emb
-
-    # ensure OpenAI exists
-    if emb.OpenAI is None:  # pragma: no cover
-        monkeypatch.setattr(emb, "OpenAI", type("DummyOpenAI", (), {}))
     from app.summarize.config import settings
 
     settings.openai_api_key = None
@@ -58,3 +50,201 @@ def test_embed_choose_mock(monkeypatch):
     monkeypatch.setattr(emb, "embed_mock", lambda text, dim=128: "mocked")
     results = emb.embed("test", backend="mock")
     assert results == "mocked"
+
+
+def test_embed_mock_batch_matches_single():
+    import app.rag.embeddings as emb
+
+    texts = ["a", "hello world", "", "ünïcode"]
+    batch = emb.embed_batch(texts, backend="mock")
+    assert batch == [emb.embed_mock(t) for t in texts]
+    assert emb.embed_batch([], backend="mock") == []
+
+
+def test_embed_openai_batch_chunks_requests(monkeypatch):
+    import app.rag.embeddings as emb
+    from app.summarize.config import settings
+
+    calls = []
+
+    class FakeEmbeddings:
+        def create(self, input, model):
+            calls.append(list(input))
+            # return out of order to check reordering by index
+            data = [
+                type("D", (), {"index": i, "embedding": [float(len(t)), 1.0]})
+                for i, t in enumerate(input)
+            ]
+            return type("R", (), {"data": list(reversed(data))})
+
+    class FakeOpenAI:
+        def __init__(self):
+            self.embeddings = FakeEmbeddings()
+
+    monkeypatch.setattr(emb, "get_openai_client", FakeOpenAI)
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "embed_batch_size", 2)
+    vecs = emb.embed_batch(["a", "bb", "ccc"], backend="openai")
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert [round(v[0] / v[1], 4) for v in vecs] == [1.0, 2.0, 3.0]
+
+
+def test_embed_cache_hits_and_lru_eviction(monkeypatch):
+    import app.rag.embeddings as emb
+    from app.rag.cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_entries=2)
+    monkeypatch.setattr(emb, "CACHE", cache)
+    calls = []
+    real = emb.embed_mock
+    monkeypatch.setattr(emb, "embed_mock", lambda t: calls.append(t) or real(t))
+
+    v1 = emb.embed("one", backend="mock")
+    assert emb.embed("one", backend="mock") == v1
+    emb.embed("two", backend="mock")
+    emb.embed("three", backend="mock")  # evicts "one"
+    emb.embed("one", backend="mock")
+    assert calls == ["one", "two", "three", "one"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 4, 2)
+
+
+def test_embed_cache_keys_include_backend():
+    from app.rag.cache import cache_key
+
+    assert cache_key("mock", "sha256", 128, "x") != cache_key("openai", "m", 0, "x")
+    assert cache_key("mock", "sha256", 128, "x") == cache_key("mock", "sha256", 128, "x")
+
+
+def test_embed_cache_disk_tier_survives_restart(tmp_path):
+    from app.rag.cache import EmbeddingCache, cache_key
+
+    path = str(tmp_path / "emb.cache")
+    key = cache_key("mock", "sha256", 2, "hello")
+    cache = EmbeddingCache(max_entries=8, path=path)
+    cache.put(key, [0.6, 0.8])
+    cache.close()
+    # simulate a torn write after the last good record
+    with open(path, "ab") as fh:
+        fh.write(b"\x00" * 10)
+
+    reopened = EmbeddingCache(max_entries=8, path=path)
+    assert np.allclose(reopened.get(key), [0.6, 0.8])
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened.get(cache_key("mock", "sha256", 2, "other")) is None
+    reopened.close()
+
+
+def test_embed_cache_offsets_with_shared_file(tmp_path):
+    from app.rag.cache import EmbeddingCache, cache_key
+
+    # two handles on one file stand in for two worker processes
+    path = str(tmp_path / "emb.cache")
+    a = EmbeddingCache(max_entries=8, path=path)
+    b = EmbeddingCache(max_entries=8, path=path)
+    keys = [cache_key("mock", "sha256", 2, str(i)) for i in range(4)]
+    for i, key in enumerate(keys):
+        (a if i % 2 == 0 else b).put(key, [float(i), float(i) + 0.5])
+    a.clear()
+    b.clear()
+    assert np.allclose(a.get(keys[2]), [2.0, 2.5])
+    assert np.allclose(b.get(keys[3]), [3.0, 3.5])
+    a.close()
+    b.close()
+
+    reopened = EmbeddingCache(max_entries=8, path=path)
+    for i, key in enumerate(keys):
+        assert np.allclose(reopened.get(key), [float(i), float(i) + 0.5])
+    reopened.close()
+
+
+def test_embed_batch_uses_cache_for_hits(monkeypatch):
+    import app.rag.embeddings as emb
+
+    emb.embed("seen", backend="mock")
+    sent = []
+    real = emb.embed_mock_batch
+    monkeypatch.setattr(emb, "embed_mock_batch", lambda ts: sent.append(list(ts)) or real(ts))
+    vecs = emb.embed_batch(["seen", "new", "new"], backend="mock")
+    assert sent == [["new"]]
+    assert vecs == [emb.embed_mock("seen"), emb.embed_mock("new"), emb.embed_mock("new")]
+
+
+def test_aembed_coalesces_concurrent_openai_calls(monkeypatch):
+    import asyncio
+
+    import app.rag.embeddings as emb
+    from app.rag.cache import EmbeddingCache
+    from app.rag.dispatch import EmbedDispatcher
+
+    calls = []
+
+    async def fake_batch(texts):
+        calls.append(list(texts))
+        return emb.embed_mock_batch(texts)
+
+    monkeypatch.setattr(emb, "CACHE", EmbeddingCache(max_entries=0))
+    monkeypatch.setattr(emb, "aembed_openai_batch", fake_batch)
+    dispatcher = EmbedDispatcher(None, lambda ts: emb.aembed_openai_batch(ts), 3, 0.05)
+    monkeypatch.setattr(emb, "DISPATCHER", dispatcher)
+
+    async def main():
+        texts = ["a", "b", "c", "d"]
+        return texts, await asyncio.gather(*(emb.aembed(t, backend="openai") for t in texts))
+
+    texts, vecs = asyncio.run(main())
+    assert calls == [["a", "b", "c"], ["d"]]
+    assert vecs == [emb.embed_mock(t) for t in texts]
+    stats = dispatcher.stats()
+    assert (stats["batches"], stats["items"], stats["max_batch_size"]) == (2, 4, 3)
+    assert stats["batch_size_histogram"]["le_1"] == 1
+    assert stats["batch_size_histogram"]["le_4"] == 1
+
+
+def test_dispatcher_batches_threads_and_propagates_errors():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.rag.dispatch import EmbedDispatcher
+    from app.rag.embeddings import embed_mock, embed_mock_batch
+
+    calls = []
+    dispatcher = EmbedDispatcher(
+        lambda ts: calls.append(list(ts)) or embed_mock_batch(ts), None, 8, 0.2
+    )
+    texts = [f"t{i}" for i in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        vecs = list(pool.map(dispatcher.submit, texts))
+    assert vecs == [embed_mock(t) for t in texts]
+    assert len(calls) == 1 and sorted(calls[0]) == texts
+    assert dispatcher.stats()["mean_wait_ms"] >= 0.0
+
+    def boom(ts):
+        raise RuntimeError("provider down")
+
+    failing = EmbedDispatcher(boom, None, 4, 0.001)
+    with pytest.raises(RuntimeError, match="provider down"):
+        failing.submit("x")
+
+
+def test_dispatcher_cancelled_batch_releases_waiters():
+    import asyncio
+
+    from app.rag.dispatch import EmbedDispatcher
+
+    async def stuck(ts):
+        await asyncio.sleep(10)
+
+    dispatcher = EmbedDispatcher(None, stuck, 4, 0.001)
+
+    async def main():
+        waiter = asyncio.ensure_future(dispatcher.asubmit("x"))
+        while not dispatcher._tasks:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)  # the batch call is in flight
+        for task in list(dispatcher._tasks):
+            task.cancel()
+        # the caller is released instead of waiting on a batch that will never finish
+        await asyncio.wait([waiter], timeout=1)
+        assert waiter.cancelled()
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics.registry import METRICS, Histogram, timed
+
+client = TestClient(app)
+
+
+def _sample(text, line_start):
+    return [float(s.rsplit(" ", 1)[1]) for s in text.splitlines() if s.startswith(line_start)]
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    series = h.labels("a")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        series.observe(value)
+    lines = h.render()
+    assert 't_seconds_bucket{op="a",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{op="a",le="1"} 3' in lines
+    assert 't_seconds_bucket{op="a",le="+Inf"} 4' in lines
+    assert 't_seconds_count{op="a"} 4' in lines
+    assert h.labels("a") is series
+    h.clear()
+    assert 't_seconds_count{op="a"} 0' in h.render()
+
+
+def test_timed_records_sync_async_and_errors():
+    h = Histogram("calls_seconds", "test", ("fn",))
+
+    @timed(h.labels("sync"))
+    def boom():
+        raise RuntimeError("x")
+
+    @timed(h.labels("async"))
+    async def fine():
+        return 1
+
+    try:
+        boom()
+    except RuntimeError:
+        pass
+    assert asyncio.run(fine()) == 1
+    assert sum(h.labels("sync").snapshot()[0]) == 1  # timed even though it raised
+    assert sum(h.labels("async").snapshot()[0]) == 1
+
+    @timed(h.labels("stream"))
+    async def tokens():
+        yield "a"
+        yield "b"
+
+    async def drain():
+        return [t async for t in tokens()]
+
+    assert asyncio.run(drain()) == ["a", "b"]
+    assert sum(h.labels("stream").snapshot()[0]) == 1  # one observation per stream
+
+
+def test_metrics_endpoint_covers_stages():
+    METRICS.clear()
+    client.post("/rag/add", json={"text": "metrics make latency visible"})
+    client.post("/rag/query_vector", json={"query": "latency", "limit": 1})
+    client.post("/agent", json={"text": "2+2"})
+    client.post("/summarize", json={"text": "Metrics are cheap to record. " * 5})
+    client.get("/does-not-exist")
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert _sample(text, 'http_request_duration_seconds_count{router="agent",method="POST"')
+    assert _sample(text, 'http_request_duration_seconds_count{router="unmatched",method="GET"')
+    assert sum(_sample(text, "embed_duration_seconds_count")) >= 2
+    assert _sample(text, 'rag_search_duration_seconds_count{kind="vector"}') == [1.0]
+    assert _sample(text, 'agent_tool_duration_seconds_count{tool="calculator"}') == [1.0]
+    assert sum(_sample(text, "summarize_duration_seconds_count")) == 1
+    assert _sample(text, "rag_documents ")[0] >= 1
+    assert _sample(text, "rag_vector_bytes ")[0] > 0
+
+
+def test_aembed_and_streamed_tool_record_once():
+    from app.metrics.registry import EMBED_SECONDS, TOOL_SECONDS
+    from app.rag.embeddings import aembed
+
+    METRICS.clear()
+    asyncio.run(aembed("one observation", backend="mock"))
+    assert sum(EMBED_SECONDS.labels("aembed").snapshot()[0]) == 1
+    assert sum(EMBED_SECONDS.labels("aembed_batch").snapshot()[0]) == 0
+
+    client.post("/rag/add", json={"text": "streamed answers are timed too"})
+    client.post("/agent/stream", json={"text": "rag_answer: streamed"})
+    assert sum(TOOL_SECONDS.labels("rag_answer").snapshot()[0]) == 1
@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.rag.persist import WriteAheadLog
+from app.rag.store import STORE, DocumentStore
+
+client = TestClient(app)
+
+
+def test_snapshot_round_trip_is_memory_mapped(tmp_path):
+    store = DocumentStore()
+    store.open(str(tmp_path))
+    ids = store.add_many(["alpha doc", "beta doc", "gamma ünïcode"])
+    store.snapshot()
+    expected = store.query_vector("alpha doc", limit=3)
+    store.close()
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path))
+    assert isinstance(reloaded.index.matrix, np.memmap)
+    assert list(reloaded.docs) == ids
+    assert reloaded.query_vector("alpha doc", limit=3) == expected
+    assert [r["id"] for r in reloaded.query("ünïcode")] == [ids[2]]
+    # appending after a load copies into a growable buffer
+    reloaded.add("delta doc")
+    assert len(reloaded.index) == 4
+    reloaded.close()
+
+
+def test_wal_replays_adds_since_snapshot(tmp_path):
+    store = DocumentStore()
+    store.open(str(tmp_path))
+    first = store.add("in the snapshot")
+    store.snapshot()
+    second = store.add("only in the wal")
+    store.close()
+    # simulate a torn record at the tail of the log
+    with open(tmp_path / "wal.log", "a") as fh:
+        fh.write('{"op": "add", "id": "torn"')
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path))
+    assert list(reloaded.docs) == [first, second]
+    assert reloaded.index.ids == [first, second]
+    reloaded.clear()
+    reloaded.close()
+
+    cleared = DocumentStore()
+    cleared.open(str(tmp_path))
+    assert cleared.docs == {}
+    cleared.close()
+
+
+def test_snapshot_endpoint_requires_persistent_store():
+    r = client.post("/rag/snapshot")
+    assert r.status_code == 409
+
+
+def test_snapshot_requires_open_store():
+    with pytest.raises(RuntimeError, match="not persistent"):
+        STORE.snapshot()
+
+
+def test_int8_store_snapshot_keeps_full_precision(tmp_path):
+    store = DocumentStore(precision="int8")
+    store.open(str(tmp_path))
+    store.add_many(["alpha doc", "beta doc", "gamma doc"])
+    store.snapshot()
+    expected = DocumentStore()
+    expected.add_many(list(store.docs.values()))
+    store.close()
+
+    reloaded = DocumentStore(precision="int8")
+    reloaded.open(str(tmp_path))
+    assert reloaded.index.matrix.dtype == np.int8
+    # the snapshot memmap serves as the float32 originals used for rescoring
+    assert np.array_equal(reloaded.index.vectors(), expected.index.matrix)
+    scores = [r["score"] for r in reloaded.query_vector("beta doc")]
+    assert scores == [r["score"] for r in expected.query_vector("beta doc")]
+    reloaded.close()
+
+
+def test_chunk_spans_survive_snapshot_and_wal(tmp_path, monkeypatch):
+    import json
+
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_chunk_size", 40)
+    text = "First sentence is here. Second one follows. Third closes it."
+    store = DocumentStore()
+    store.open(str(tmp_path))
+    snap_id = store.add(text)
+    store.snapshot()
+    wal_id = store.add(text + " Again.")
+    expected = store.query_vector("Second one follows.", limit=2)
+    spans = list(store._spans)
+    store.close()
+    # a record written before chunking (single whole-document vector) still replays
+    with open(tmp_path / "wal.log", "a") as fh:
+        fh.write(json.dumps({"op": "add", "id": "legacy", "text": "old", "vec": [0.0] * 128}))
+        fh.write("\n")
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path))
+    assert list(reloaded.docs) == [snap_id, wal_id, "legacy"]
+    assert reloaded._spans == spans + [(0, 3)]
+    assert reloaded.query_vector("Second one follows.", limit=2) == expected
+    reloaded.close()
+
+
+def test_deletes_and_updates_survive_wal_and_snapshot(tmp_path):
+    store = DocumentStore()
+    store.open(str(tmp_path))
+    a, b, c = store.add_many(["alpha doc", "beta doc", "gamma doc"])
+    store.snapshot()
+    store.delete(a)
+    store.update(b, "beta doc, revised")
+    expected = store.query_vector("beta doc", limit=3)
+    store.close()
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path))
+    assert reloaded.docs == {b: "beta doc, revised", c: "gamma doc"}
+    assert reloaded.query_vector("beta doc", limit=3) == expected
+    assert reloaded.query("alpha") == []
+    # the snapshot is compacted: only live rows are written
+    reloaded.snapshot()
+    assert reloaded.index.n_dead == 0 and reloaded.index.ids == [c, b]
+    reloaded.close()
+
+    again = DocumentStore()
+    again.open(str(tmp_path))
+    assert again.docs == {c: "gamma doc", b: "beta doc, revised"}
+    assert again.query_vector("beta doc", limit=3) == expected
+    again.close()
+
+
+def test_snapshot_survives_crash_between_renames(tmp_path):
+    store = DocumentStore()
+    store.open(str(tmp_path))
+    ids = store.add_many(["alpha doc", "beta doc"])
+    store.snapshot()
+    store.close()
+    # a crash after snapshot -> snapshot.old, before snapshot.tmp -> snapshot
+    os.rename(tmp_path / "snapshot", tmp_path / "snapshot.old")
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path))
+    assert list(reloaded.docs) == ids
+    reloaded.add("gamma doc")
+    reloaded.snapshot()
+    reloaded.close()
+    assert not (tmp_path / "snapshot.old").exists()
+
+    again = DocumentStore()
+    again.open(str(tmp_path))
+    assert len(again.docs) == 3
+    again.close()
+
+
+def test_wal_fsync_policy(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    wal = WriteAheadLog(str(tmp_path), fsync=False)
+    wal.log_delete(["a"])
+    assert synced == []
+    wal.close()
+    wal = WriteAheadLog(str(tmp_path))
+    wal.log_delete(["b"])
+    assert len(synced) == 1
+    assert [r["id"] for r in wal.replay()] == ["a", "b"]
+    wal.close()
@@ -0,0 +1,66 @@
+import os
+import pstats
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics.profiling import ProfileMiddleware, prune
+
+client = TestClient(ProfileMiddleware(app))
+
+
+def test_profile_only_when_asked(tmp_path, monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    r = client.post("/agent", json={"text": "2+2"})
+    assert r.status_code == 200 and "x-profile-id" not in r.headers
+    assert not os.listdir(tmp_path)
+
+    r = client.post("/agent", json={"text": "2+2"}, headers={"X-Profile": "cpu,mem"})
+    assert r.status_code == 200 and r.json()["output"] == "4"
+    profile_id = r.headers["x-profile-id"]
+    assert sorted(os.listdir(tmp_path)) == [f"{profile_id}.mem.txt", f"{profile_id}.prof"]
+    assert pstats.Stats(str(tmp_path / f"{profile_id}.prof")).total_calls > 0
+    assert (tmp_path / f"{profile_id}.mem.txt").read_text().startswith("POST /agent")
+
+
+def test_profile_includes_worker_threads(tmp_path, monkeypatch):
+    from app.rag.store import STORE
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    STORE.add("profiles follow the work into worker threads")
+
+    def store_functions(profile_id):
+        stats = pstats.Stats(str(tmp_path / f"{profile_id}.prof")).stats
+        return {name for path, _, name in stats if path.endswith(os.path.join("rag", "store.py"))}
+
+    # sync route: the handler runs in the threadpool
+    r = client.post("/rag/query", json={"query": "worker"}, headers={"X-Profile": "cpu"})
+    assert r.status_code == 200 and r.json()["results"]
+    assert "query" in store_functions(r.headers["x-profile-id"])
+    # async route: scoring goes through asyncio.to_thread
+    r = client.post("/rag/query_vector", json={"query": "worker"}, headers={"X-Profile": "cpu"})
+    assert r.status_code == 200
+    assert "_search_embedded" in store_functions(r.headers["x-profile-id"])
+
+
+def test_profile_token_and_retention(tmp_path, monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profile_max_files", 2)
+    monkeypatch.setattr(settings, "profile_token", "s3cret")
+    r = client.get("/ping", headers={"X-Profile": "cpu", "X-Profile-Token": "wrong"})
+    assert "x-profile-id" not in r.headers
+    ids = []
+    for _ in range(4):
+        r = client.get("/ping", headers={"X-Profile": "cpu", "X-Profile-Token": "s3cret"})
+        ids.append(r.headers["x-profile-id"])
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{i}.prof" for i in ids[-2:])
+    # files the middleware did not write are never pruned
+    (tmp_path / "notes.txt").write_text("keep me")
+    (tmp_path / "1-zz.prof").write_text("keep me too")
+    prune(str(tmp_path), 0)
+    assert sorted(os.listdir(tmp_path)) == ["1-zz.prof", "notes.txt"]
@@ -73,11 +73,13 @@ def test_rag_query_vector():
 
 def test_rag_query_vector_dimension_mismatch(monkeypatch):
     STORE.clear()
+    good_id = STORE.add("This doc has a good embedding vector")
     bad_id = "bad-12345"
-    STORE.docs[bad_id] = "This doc has a bad embedding vector"
-    STORE.vecs[bad_id] = [0.1, 0.2]
+    bad_text = "This doc has a bad embedding vector"
+    STORE._insert(bad_id, bad_text, [(0, len(bad_text))], [[0.1, 0.2]])
     q = client.post("/rag/query_vector", json={"query": "test", "limit": 3})
-    assert all(r["id"] != bad_id for r in q.json().get("results", []))
+    ids = [r["id"] for r in q.json().get("results", [])]
+    assert ids == [good_id]
 
 
 def test_rag_query_vector_query_dimension_empty(monkeypatch):
@@ -86,6 +88,592 @@ def test_rag_query_vector_query_dimension_empty(monkeypatch):
     STORE.clear()
     # Patch embed to return empty vector
     monkeypatch.setattr(store, "embed", lambda text: [])
+
+    async def empty(text):
+        return []
+
+    monkeypatch.setattr(store, "aembed", empty)
     results = client.post("/rag/query_vector", json={"query": "test", "limit": 3})
     assert results.status_code == 200
     assert results.json()["results"] == []
+
+
+def test_rag_query_vector_matches_bruteforce():
+    import numpy as np
+
+    from app.rag.embeddings import embed
+
+    texts = [f"document number {i}" for i in range(50)]
+    ids = [STORE.add(t) for t in texts]
+    qv = np.array(embed("document"), dtype=np.float32)
+    expected = sorted(
+        ((float(qv @ np.array(embed(t), dtype=np.float32)), i) for i, t in zip(ids, texts)),
+        key=lambda s: -s[0],
+    )[:5]
+    results = STORE.query_vector("document", limit=5)
+    assert [r["id"] for r in results] == [i for _, i in expected]
+    assert [r["score"] for r in results] == [round(s, 6) for s, _ in expected]
+
+
+def test_top_k_indices_ties_keep_insertion_order():
+    import numpy as np
+
+    from app.rag.index import top_k_indices
+
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.5, 0.1], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 0]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 0, 2, 4, 5]
+    assert top_k_indices(scores, 0).tolist() == []
+
+
+def test_vector_index_grows_past_capacity():
+    from app.rag.index import VectorIndex
+
+    index = VectorIndex(capacity=2)
+    for i in range(5):
+        assert index.add(f"id-{i}", [float(i + 1), 0.0])
+    assert len(index) == 5
+    assert index.matrix.shape == (5, 2)
+    assert not index.add("bad", [1.0, 0.0, 0.0])
+
+
+def test_rag_query_matches_linear_scan():
+    import random
+
+    rng = random.Random(7)
+    words = ["rag", "Graph", "ragged", "drag", "vector", "LLM", "a", "ab"]
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))) for _ in range(200)]
+    for t in texts:
+        STORE.add(t)
+
+    def linear(keyword, limit):
+        k = keyword.lower().strip()
+        scored = []
+        for doc_id, text in STORE.docs.items():
+            tl = text.lower()
+            if k in tl:
+                scored.append((tl.count(k), tl.find(k), len(text), doc_id, text))
+        scored.sort(key=lambda s: (-s[0], s[1], s[2]))
+        return [{"id": d, "text": t} for _, _, _, d, t in scored[:limit]]
+
+    for keyword in ["rag", "RAG", "g r", "gged dr", "a", "ab", "vector llm", "zzz"]:
+        assert STORE.query(keyword, limit=20) == linear(keyword, 20)
+
+
+def test_ngram_index_candidates():
+    from app.rag.ngram import NgramIndex
+
+    index = NgramIndex()
+    index.add("a", "Retrieval Augmented")
+    index.add("b", "generation")
+    index.add("c", "augment")
+    assert list(index.candidates("augment")) == [0, 2]
+    assert list(index.candidates("missing")) == []
+    # shorter than the n-gram size: every document is a candidate
+    assert list(index.candidates("ge")) == [0, 1, 2]
+
+
+def test_rag_add_batch():
+    texts = ["alpha document", "beta document", "gamma document"]
+    r = client.post("/rag/add_batch", json={"texts": texts})
+    assert r.status_code == 200
+    ids = r.json()["ids"]
+    assert len(ids) == 3
+    assert [STORE.docs[i] for i in ids] == texts
+    assert STORE.index.ids == ids
+
+    single_id = STORE.add("alpha document")
+    hits = STORE.query_vector("alpha document", limit=2)
+    # batched and single-text ingestion embed identically
+    assert {h["id"] for h in hits} == {ids[0], single_id}
+    assert hits[0]["score"] == hits[1]["score"]
+
+
+def test_rag_add_batch_rejects_empty():
+    r = client.post("/rag/add_batch", json={"texts": []})
+    assert r.status_code == 400
+    r = client.post("/rag/add_batch", json={"texts": ["ok", "  "]})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Text at index 1 cannot be empty"
+    assert STORE.docs == {}
+
+
+def test_rag_embed_cache_stats():
+    STORE.add("cached text")
+    client.post("/rag/query_vector", json={"query": "cached text"})
+    stats = client.get("/rag/embed_cache").json()
+    assert stats["hits"] >= 1 and stats["misses"] >= 1
+
+
+def _clustered_vectors(n, dim=32, centers=16, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    c = rng.normal(size=(centers, dim))
+    x = c[rng.integers(0, centers, n)] + 0.1 * rng.normal(size=(n, dim))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_full_probe_matches_exact():
+    from app.rag.index import VectorIndex
+    from app.rag.ivf import IVFIndex
+
+    vecs = _clustered_vectors(500)
+    exact, ivf = VectorIndex(), IVFIndex(nlist=8, nprobe=2, min_train=100)
+    ids = [f"d{i}" for i in range(len(vecs))]
+    exact.add_many(ids[:300], vecs[:300])
+    ivf.add_many(ids[:300], vecs[:300])
+    q = vecs[7]
+    assert ivf.wait_trained(timeout=10)  # trained in the background once min_train rows exist
+    # rows added after training are assigned incrementally
+    exact.add_many(ids[300:], vecs[300:])
+    ivf.add_many(ids[300:], vecs[300:])
+    assert sum(len(rows) for rows in ivf._lists) == 500
+    assert ivf.search(q, 10, nprobe=8) == exact.search(q, 10)
+
+
+def test_ivf_recall_on_clustered_data():
+    import numpy as np
+
+    from app.rag.index import VectorIndex
+    from app.rag.ivf import IVFIndex
+
+    vecs = _clustered_vectors(2000)
+    ids = [f"d{i}" for i in range(len(vecs))]
+    exact, ivf = VectorIndex(), IVFIndex(nlist=16, nprobe=4, min_train=0)
+    exact.add_many(ids, vecs)
+    ivf.add_many(ids, vecs)
+    assert ivf.wait_trained(timeout=10)
+    queries = _clustered_vectors(20, seed=1)
+    recall = np.mean(
+        [
+            len({i for i, _ in ivf.search(q, 10)} & {i for i, _ in exact.search(q, 10)}) / 10
+            for q in queries
+        ]
+    )
+    assert recall >= 0.9
+
+
+def test_store_ivf_untrained_falls_back_to_exact():
+    from app.rag.store import DocumentStore
+
+    exact, ivf = DocumentStore(index="exact"), DocumentStore(index="ivf")
+    for t in ["doc one", "doc two", "doc three"]:
+        exact.add(t)
+        ivf.add(t)
+
+    def strip(rs):
+        return [(r["text"], r["score"]) for r in rs]
+
+    assert strip(ivf.query_vector("doc", nprobe=1)) == strip(exact.query_vector("doc"))
+
+
+def test_rag_query_vector_nprobe_validation():
+    q = client.post("/rag/query_vector", json={"query": "doc", "nprobe": 0})
+    assert q.status_code == 422
+
+
+def test_quantized_index_bytes_per_doc():
+    from app.rag.index import VectorIndex
+
+    vecs = _clustered_vectors(100, dim=64)
+    sizes = {}
+    for precision in ("float32", "float16", "int8"):
+        index = VectorIndex(precision=precision)
+        index.add_many([f"d{i}" for i in range(100)], vecs)
+        sizes[precision] = index.nbytes // 100
+    assert sizes == {"float32": 256, "float16": 128, "int8": 68}
+
+
+def test_int8_rescoring_returns_full_precision_scores():
+    from app.rag.index import VectorIndex
+
+    vecs = _clustered_vectors(1000)
+    ids = [f"d{i}" for i in range(len(vecs))]
+    exact, int8 = VectorIndex(), VectorIndex(precision="int8")
+    exact.add_many(ids[:500], vecs[:500])
+    int8.add_many(ids[:500], vecs[:500])
+    for doc_id, vec in zip(ids[500:], vecs[500:]):
+        exact.add(doc_id, vec)
+        int8.add(doc_id, vec)
+    for q in _clustered_vectors(10, seed=3):
+        expected = dict(exact.search(q, 10))
+        got = int8.search(q, 10)
+        assert len(set(dict(got)) & set(expected)) >= 9
+        for doc_id, score in got:
+            if doc_id in expected:
+                assert abs(score - expected[doc_id]) < 1e-6
+
+
+def test_float16_index_close_to_exact():
+    from app.rag.index import VectorIndex
+
+    vecs = _clustered_vectors(300)
+    ids = [f"d{i}" for i in range(len(vecs))]
+    exact, half = VectorIndex(), VectorIndex(precision="float16")
+    exact.add_many(ids, vecs)
+    half.add_many(ids, vecs)
+    q = vecs[0]
+    assert half.search(q, 1)[0][0] == exact.search(q, 1)[0][0]
+    assert abs(half.search(q, 1)[0][1] - 1.0) < 1e-2
+
+
+def test_unknown_precision_rejected():
+    import pytest
+
+    from app.rag.index import VectorIndex
+
+    with pytest.raises(ValueError, match="unknown vector precision"):
+        VectorIndex(precision="int4")
+
+
+def test_rag_query_vector_batch_matches_single():
+    client.post("/rag/add_batch", json={"texts": [f"doc number {i}" for i in range(40)]})
+    queries = ["doc", "number 3", "doc", "unrelated"]
+    r = client.post("/rag/query_vector_batch", json={"queries": queries, "limit": 5})
+    assert r.status_code == 200
+    batched = r.json()["results"]
+    assert len(batched) == len(queries)
+    for query, results in zip(queries, batched):
+        assert results == STORE.query_vector(query, limit=5)
+
+
+def test_rag_query_vector_batch_empty():
+    r = client.post("/rag/query_vector_batch", json={"queries": []})
+    assert r.status_code == 200
+    assert r.json()["results"] == []
+    # nothing stored yet: one empty list per query
+    assert STORE.query_vector_batch(["a", "b"]) == [[], []]
+
+
+def test_search_many_blocks_match_single_queries():
+    from app.rag.index import VectorIndex
+
+    vecs = _clustered_vectors(200)
+    for precision in ("float32", "int8"):
+        index = VectorIndex(precision=precision)
+        index.add_many([f"d{i}" for i in range(200)], vecs)
+        queries = _clustered_vectors(7, seed=5)
+        assert index.search_many(queries, 4) == [index.search(q, 4) for q in queries]
+
+
+def test_async_store_paths_match_sync():
+    import asyncio
+
+    async def scenario():
+        ids = await STORE.aadd_many(["async one", "async two"])
+        ids.append(await STORE.aadd("async three"))
+        single = await STORE.aquery_vector("async", limit=3)
+        batch = await STORE.aquery_vector_batch(["async"], limit=3)
+        return ids, single, batch
+
+    ids, single, batch = asyncio.run(scenario())
+    assert list(STORE.docs) == ids
+    assert single == STORE.query_vector("async", limit=3) == batch[0]
+
+
+def test_chunk_spans_windows_overlap_and_sentences():
+    from app.rag.chunking import chunk_spans
+
+    text = " ".join(f"Sentence number {i} ends here." for i in range(40))
+    assert list(chunk_spans("short text", 100, 10)) == [(0, 10)]
+    for unit, size in (("chars", 200), ("tokens", 40)):
+        spans = list(chunk_spans(text, size, 30, unit))
+        assert len(spans) > 3
+        chunks = [text[s:e] for s, e in spans]
+        assert all(c.endswith("here.") for c in chunks)  # cut at sentence ends
+        assert all(text[s - 1] == " " for s, _ in spans[1:])  # start on word boundaries
+        assert all(e2 > e1 and s2 < e1 for (_, e1), (s2, e2) in zip(spans, spans[1:]))
+        assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    assert all(e - s <= 200 for s, e in chunk_spans(text, 200, 30))
+    # an overlap holding a whole sentence starts on it
+    assert all(text[s:].startswith("Sentence") for s, _ in chunk_spans(text, 40, 10, "tokens"))
+
+
+def test_chunked_documents_query_once_with_best_chunk(monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_chunk_size", 60)
+    monkeypatch.setattr(settings, "rag_chunk_overlap", 10)
+    long_text = " ".join(f"Paragraph {i} talks about topic {i}." for i in range(12))
+    long_id = STORE.add(long_text)
+    short_id = STORE.add("A short note.")
+    assert len(STORE.index) > 3 and STORE.index.ids.count(long_id) == len(STORE.index) - 1
+
+    results = STORE.query_vector("Paragraph 7 talks about topic 7.", limit=3)
+    assert [r["id"] for r in results] == [long_id, short_id]
+    assert results[0]["text"] == long_text
+    assert results[0]["chunk"] in long_text and len(results[0]["chunk"]) <= 60
+    assert results[1]["chunk"] == "A short note."
+    batch = STORE.query_vector_batch(["Paragraph 7 talks about topic 7."], limit=3)
+    assert batch == [results]
+
+
+def test_fusion_rrf_and_weighted():
+    import pytest
+
+    from app.rag.fusion import fuse
+
+    keyword = [("a", 3.0), ("b", 1.0)]
+    vector = [("b", 0.9), ("c", 0.5)]
+    rrf = dict(fuse([keyword, vector], [1.0, 1.0], "rrf"))
+    assert rrf["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert max(rrf, key=rrf.get) == "b"
+    weighted = fuse([keyword, vector], [1.0, 2.0], "weighted")
+    assert weighted == [("b", 2.0), ("a", 1.0), ("c", 0.0)]
+    with pytest.raises(ValueError):
+        fuse([keyword], [1.0], "max")
+
+
+def test_rag_query_hybrid_endpoint_weights():
+    exact_id = STORE.add("zeta")
+    freq_id = STORE.add("zeta appears, zeta again and zeta once more")
+    other_id = STORE.add("unrelated text")
+
+    def ranked(**body):
+        r = client.post("/rag/query_hybrid", json={"query": "zeta", "limit": 3, **body})
+        assert r.status_code == 200
+        return r.json()["results"]
+
+    results = ranked()
+    assert results[0]["id"] == exact_id  # first by cosine and second by keyword
+    assert {"keyword_rank", "vector_rank", "chunk", "score"} <= set(results[0])
+    assert [r["id"] for r in ranked(vector_weight=0)][:2] == [freq_id, exact_id]
+    vector_only = ranked(fusion="weighted", keyword_weight=0)
+    assert vector_only[0]["id"] == exact_id
+    assert next(r for r in vector_only if r["id"] == other_id)["keyword_rank"] is None
+    assert client.post("/rag/query_hybrid", json={"query": "x", "fusion": "max"}).status_code == 422
+
+
+def test_agent_rag_hybrid_tool():
+    import json
+
+    doc_id = STORE.add("hybrid retrieval fuses rankings")
+    r = client.post("/agent", json={"text": "hybrid: rankings"})
+    assert r.json()["tool"] == "rag_hybrid"
+    assert json.loads(r.json()["output"])[0]["id"] == doc_id
+
+
+def test_store_concurrent_adds_and_queries():
+    import threading
+
+    from app.rag.store import DocumentStore
+
+    for kind, precision in (("exact", "float32"), ("ivf", "int8")):
+        store = DocumentStore(index=kind, precision=precision)
+        store.index.min_train = 50  # let the IVF store train mid-run
+        errors = []
+        done = threading.Event()
+
+        def write(w):
+            try:
+                for i in range(40):
+                    store.add(f"writer {w} doc {i} shared term")
+                    store.add_many([f"writer {w} batch {i} {j} shared" for j in range(3)])
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        def read():
+            try:
+                while not done.is_set():
+                    for r in store.query_vector("shared term", limit=5):
+                        assert r["chunk"] and r["chunk"] in r["text"]
+                    for r in store.query_hybrid("shared", limit=5):
+                        assert "shared" in r["text"]
+                    assert all("shared" in r["text"] for r in store.query("shared", limit=5))
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+
+        writers = [threading.Thread(target=write, args=(w,)) for w in range(3)]
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        for t in readers + writers:
+            t.start()
+        for t in writers:
+            t.join()
+        done.set()
+        for t in readers:
+            t.join()
+        assert not errors
+        assert len(store.docs) == len(store.index) == 3 * 40 * 4
+        assert len(store.query("shared", limit=1000)) == 3 * 40 * 4
+
+
+def test_rag_delete_and_update_endpoints():
+    keep = client.post("/rag/add", json={"text": "kept document about apples"}).json()["id"]
+    gone = client.post("/rag/add", json={"text": "deleted document about apples"}).json()["id"]
+    assert client.delete(f"/rag/{gone}").json() == {"id": gone, "deleted": True}
+    assert client.delete(f"/rag/{gone}").status_code == 404
+    assert [r["id"] for r in STORE.query("apples")] == [keep]
+    assert [r["id"] for r in STORE.query_vector("deleted document about apples")] == [keep]
+
+    r = client.put(f"/rag/{keep}", json={"text": "kept document about pears"})
+    assert r.json() == {"id": keep, "updated": True}
+    assert (
+        client.put(f"/rag/{keep}", json={"text": "kept document about pears"}).json()["updated"]
+        is False
+    )
+    assert STORE.query("apples") == []
+    assert STORE.query_vector("pears")[0]["text"] == "kept document about pears"
+    assert client.put(f"/rag/{gone}", json={"text": "x"}).status_code == 404
+    assert client.put(f"/rag/{keep}", json={"text": " "}).status_code == 400
+
+
+def test_update_reuses_unchanged_chunk_vectors(monkeypatch):
+    import app.rag.store as store_mod
+    from app.rag.store import DocumentStore
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_chunk_size", 40)
+    store = DocumentStore()
+    doc_id = store.add("First sentence is here. Second one follows. Third closes it.")
+    embedded, embed_batch = [], store_mod.embed_batch
+
+    def counting(texts):
+        embedded.extend(texts)
+        return embed_batch(texts)
+
+    monkeypatch.setattr(store_mod, "embed_batch", counting)
+    assert store.update(doc_id, store.docs[doc_id]) is False
+    assert embedded == []
+    assert store.update(doc_id, "First sentence is here. Second one follows. A new ending.")
+    # only the changed tail was embedded; the first chunk's vector was reused
+    assert len(embedded) == 1 and "new ending" in embedded[0]
+    fresh = DocumentStore()
+    fresh.add(store.docs[doc_id])
+    assert store.query_vector("A new ending.") == [
+        {**r, "id": doc_id} for r in fresh.query_vector("A new ending.")
+    ]
+    assert store.update("missing", "text") is None
+
+
+def test_compaction_drops_tombstones_and_keeps_rankings(monkeypatch):
+    from app.rag.store import DocumentStore
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_compact_threshold", 1.0)  # compact by hand
+    texts = [f"document number {i} about topic {i % 7}" for i in range(200)]
+    for kind, precision in (("exact", "float32"), ("ivf", "int8")):
+        store, fresh = DocumentStore(index=kind, precision=precision), DocumentStore()
+        store.index.min_train = 50
+        ids = store.add_many(texts)
+        if kind == "ivf":
+            assert store.index.wait_trained(timeout=10)
+        for doc_id in ids[::2]:
+            store.delete(doc_id)
+        fresh.add_many(texts[1::2])
+        strip = lambda rs: [(r["text"], r["score"]) for r in rs]  # noqa: E731
+        before = strip(store.query_vector("topic 3", limit=5, nprobe=64))
+        assert store.index.n_dead == 100 and len(store.index) == 200
+        store.compact()
+        assert store.index.n_dead == 0 and len(store.index) == 100
+        assert store.keywords.n_dead == 0 and len(store.keywords) == 100
+        assert strip(store.query_vector("topic 3", limit=5, nprobe=64)) == before
+        assert before == strip(fresh.query_vector("topic 3", limit=5))
+        assert [r["text"] for r in store.query("number 1", limit=200)] == [
+            r["text"] for r in fresh.query("number 1", limit=200)
+        ]
+        assert store.update(ids[1], "changed text") and store.query("changed")[0]["id"] == ids[1]
+
+
+def test_compaction_runs_outside_the_writer_lock(monkeypatch):
+    import threading
+
+    from app.rag.store import DocumentStore
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_compact_threshold", 1.0)  # compact by hand
+    texts = [f"document number {i} about topic {i % 7}" for i in range(100)]
+    for kind, precision in (("exact", "float32"), ("ivf", "int8")):
+        store = DocumentStore(index=kind, precision=precision)
+        store.index.min_train = 50
+        ids = store.add_many(texts)
+        if kind == "ivf":
+            assert store.index.wait_trained(timeout=10)
+        for doc_id in ids[:40]:
+            store.delete(doc_id)
+        prepare = store.index.prepare_compact
+        late = {}
+
+        def prepare_then_write(state=None):
+            plan = prepare(state)
+            # other threads can write while the rows are copied
+            writer = threading.Thread(
+                target=lambda: late.update(
+                    added=store.add("late arrival about topic 3"),
+                    updated=store.update(ids[50], "rewritten document about topic 3"),
+                    deleted=store.delete(ids[60]),
+                )
+            )
+            writer.start()
+            writer.join(timeout=10)
+            assert not writer.is_alive()
+            return plan
+
+        monkeypatch.setattr(store.index, "prepare_compact", prepare_then_write)
+        store.compact()
+        assert late == {"added": late["added"], "updated": True, "deleted": True}
+
+        expected = dict(zip(ids[40:], texts[40:]))
+        expected[ids[50]] = "rewritten document about topic 3"
+        del expected[ids[60]]
+        expected[late["added"]] = "late arrival about topic 3"
+        assert store.docs == expected
+        assert store.index.n_dead == 2  # rows tombstoned mid-compaction stay tombstoned
+        # every document maps to rows holding its own chunks
+        for doc_id, (start, end) in store._doc_rows.items():
+            assert store.index.ids[start:end] == [doc_id] * (end - start)
+            assert [store.docs[doc_id][s:e] for s, e in store._spans[start:end]]
+        fresh = DocumentStore()
+        fresh.add_many(list(expected.values()))
+        strip = lambda rs: [(r["text"], r["score"]) for r in rs]  # noqa: E731
+        assert strip(store.query_vector("topic 3", limit=5, nprobe=64)) == strip(
+            fresh.query_vector("topic 3", limit=5)
+        )
+        assert {r["id"] for r in store.query("topic 3", limit=100)} == {
+            doc_id for doc_id, text in expected.items() if "topic 3" in text
+        }
+
+
+def test_background_compaction_past_threshold(monkeypatch):
+    from app.rag.store import DocumentStore
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_compact_threshold", 0.5)
+    store = DocumentStore()
+    ids = store.add_many([f"doc {i}" for i in range(10)])
+    for doc_id in ids[:4]:
+        store.delete(doc_id)
+    assert store._compactor is None and store.index.n_dead == 4
+    store.delete(ids[4])
+    store._compactor.join()
+    assert store.index.n_dead == 0 and store.index.ids == ids[5:]
+    assert store._doc_rows == {doc_id: (i, i + 1) for i, doc_id in enumerate(ids[5:])}
+
+
+def test_async_store_calls_score_and_ingest_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+
+    from app.rag.store import DocumentStore
+
+    store = DocumentStore()
+    threads = []
+    for name in ("_add_many_embedded", "_search_embedded", "_search_many_embedded", "_hybrid"):
+        original = getattr(store, name)
+
+        def spy(*args, _original=original, **kwargs):
+            threads.append(threading.get_ident())
+            return _original(*args, **kwargs)
+
+        monkeypatch.setattr(store, name, spy)
+
+    async def main():
+        await store.aadd("first doc")
+        await store.aadd_many(["second doc", "third doc"])
+        await store.aquery_vector("doc")
+        await store.aquery_vector_batch(["doc", "third"])
+        await store.aquery_hybrid("doc")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert len(threads) >= 5 and loop_thread not in threads
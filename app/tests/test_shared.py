@@ -0,0 +1,141 @@
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+
+from app.rag.shared import SharedDocumentStore
+from app.rag.store import DocumentStore
+
+
+def test_shared_stores_see_one_corpus(tmp_path):
+    a, b = SharedDocumentStore(str(tmp_path)), SharedDocumentStore(str(tmp_path))
+    first = a.add("shared memory keeps one copy")
+    ids = b.add_many(["written by the second worker", "another shared doc"])
+    expected = DocumentStore()
+    expected.add("shared memory keeps one copy")
+    expected.add_many(["written by the second worker", "another shared doc"])
+
+    for store in (a, b):
+        assert list(store.docs) == [first, *ids]
+        assert [r["id"] for r in store.query("shared", limit=5)] == [first, ids[1]]
+        got = [(r["text"], r["score"]) for r in store.query_vector("shared doc", limit=3)]
+        assert got == [
+            (r["text"], r["score"]) for r in expected.query_vector("shared doc", limit=3)
+        ]
+        # the index reads the mapped arena file; nothing is copied per store
+        assert isinstance(store.index.state.mat, np.memmap)
+    assert np.shares_memory(a.index.state.mat, a.arena.vectors(a.arena.header()))
+
+
+def test_shared_deletes_updates_and_compaction(tmp_path, monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_compact_threshold", 1.0)  # compact by hand
+    a, b = SharedDocumentStore(str(tmp_path)), SharedDocumentStore(str(tmp_path))
+    keep, gone = a.add_many(["kept apples", "deleted apples"])
+    assert b.delete(gone) and not b.delete(gone)
+    assert [r["id"] for r in a.query("apples")] == [keep]
+    assert [r["id"] for r in a.query_vector("deleted apples")] == [keep]
+    assert a.update(keep, "kept pears") is True
+    assert b.update(keep, "kept pears") is False
+    assert b.docs[keep] == "kept pears" and b.query("apples") == []
+
+    a.compact()
+    assert b.query_vector("kept pears")[0]["text"] == "kept pears"  # b switches epochs
+    assert len(b.index) == 1 and b.index.n_dead == 0
+    b.clear()
+    assert len(a.docs) == 0 and a.query_vector("kept pears") == []
+
+
+def test_shared_store_open_and_snapshot(tmp_path):
+    disk = DocumentStore()
+    disk.open(str(tmp_path / "disk"))
+    ids = disk.add_many(["persisted one", "persisted two"])
+    disk.close()
+
+    shared = SharedDocumentStore(str(tmp_path / "shm"))
+    shared.open(str(tmp_path / "disk"))
+    other = SharedDocumentStore(str(tmp_path / "shm"))
+    other.open(str(tmp_path / "disk"))  # arena already seeded: not imported twice
+    assert list(other.docs) == ids
+    other.delete(ids[0])
+    shared.snapshot()
+
+    reloaded = DocumentStore()
+    reloaded.open(str(tmp_path / "disk"))
+    assert list(reloaded.docs) == [ids[1]]
+    reloaded.close()
+
+
+def test_shared_store_rejects_quantized_precision(tmp_path, monkeypatch):
+    from app.summarize.config import settings
+
+    monkeypatch.setattr(settings, "rag_vector_precision", "int8")
+    with pytest.raises(ValueError, match="float32"):
+        SharedDocumentStore(str(tmp_path))
+
+
+def test_shared_store_across_processes(tmp_path):
+    store = SharedDocumentStore(str(tmp_path))
+    mine = store.add("written by the parent process")
+    script = textwrap.dedent(f"""
+        from app.rag.shared import SharedDocumentStore
+        store = SharedDocumentStore({str(tmp_path)!r})
+        assert list(store.docs) == [{mine!r}]
+        print(store.add_many(["written by a child worker"])[0])
+        """)
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    child = out.stdout.strip()
+    assert list(store.docs) == [mine, child]
+    assert store.query("child")[0]["id"] == child
+
+
+def test_writer_dying_mid_publish_is_rolled_forward(tmp_path):
+    store = SharedDocumentStore(str(tmp_path))
+    mine = store.add("written before the crash")
+    script = textwrap.dedent(f"""
+        import os
+        from app.rag.shared import SharedDocumentStore
+        store = SharedDocumentStore({str(tmp_path)!r})
+        arena = store.arena
+
+        def die_mid_publish(h):
+            seq = int(arena._header[0])
+            arena._header[9:15] = h[1:]
+            arena._header[0] = seq + 1
+            arena._header[1:3] = h[1:3]  # killed halfway through the header
+            os._exit(0)
+
+        arena._publish = die_mid_publish
+        store.add("published by a writer that died")
+        """)
+    subprocess.run([sys.executable, "-c", script], check=True)
+    assert store.arena.generation % 2 == 1
+    # the lock is free, so a waiting reader takes over and finishes the publish
+    other = SharedDocumentStore(str(tmp_path))
+    assert store.arena.generation % 2 == 0
+    for s in (store, other):
+        assert len(s.docs) == 2 and s.docs[mine] == "written before the crash"
+        assert s.query("died")[0]["text"] == "published by a writer that died"
+
+
+def test_reader_times_out_on_a_stuck_writer(tmp_path):
+    import fcntl
+    import os
+
+    store = SharedDocumentStore(str(tmp_path))
+    store.add("some doc")
+    arena = store.arena
+    seq = arena.generation
+    fd = os.open(os.path.join(str(tmp_path), "lock"), os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)  # a live writer holds the lock
+    try:
+        arena._header[0] = seq + 1
+        with pytest.raises(TimeoutError):
+            arena.header(timeout=0.05)
+    finally:
+        os.close(fd)
+    # once the writer is gone the next reader repairs the header
+    assert arena.header().seq == seq + 2
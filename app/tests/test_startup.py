@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+# generous: CI machines are slow and noisy; the module count is the stable signal
+IMPORT_SECONDS_BUDGET = 5.0
+MODULES_BUDGET = 800
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules),
+                  "openai": "openai" in sys.modules, "httpx": "httpx" in sys.modules}))
+"""
+
+
+def test_import_app_main_within_budget():
+    env = {**os.environ, "LLM_PROVIDER": "dummy", "RAG_STORE_BACKEND": "memory"}
+    env.pop("RAG_STORE_PATH", None)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    out = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    stats = json.loads(out.stdout.strip().splitlines()[-1])
+    # provider SDKs load on first use, not at import
+    assert not stats["openai"] and not stats["httpx"]
+    assert stats["modules"] < MODULES_BUDGET, stats
+    assert stats["seconds"] < IMPORT_SECONDS_BUDGET, stats
@@ -0,0 +1,322 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.summarize import llm
+from app.summarize.cache import SUMMARY_CACHE, SummaryCache
+from app.summarize.config import settings
+
+
+class CountingLLM:
+    """Fake provider: counts calls, optional delay, fixed confidence."""
+
+    def __init__(self, conf=0.9, delay=0.0):
+        self.conf = conf
+        self.delay = delay
+        self.calls = 0
+
+    def summarize(self, text, max_words=80, strict=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        return f"summary of {text}", self.conf
+
+    async def asummarize(self, text, max_words=80, strict=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"summary of {text}", self.conf
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    fake = CountingLLM()
+    monkeypatch.setattr(llm, "get_llm", lambda: fake)
+    return fake
+
+
+def test_summary_cache_hit_skips_provider(fake_llm):
+    first = llm.summarize_with_retry("same text", 30)
+    second = llm.summarize_with_retry("same text", 30)
+    assert first == ("summary of same text", 0.9, False)
+    assert second == first
+    assert fake_llm.calls == 1
+    # max_words is part of the key
+    llm.summarize_with_retry("same text", 31)
+    assert fake_llm.calls == 2
+    assert SUMMARY_CACHE.stats()["hits"] == 1
+
+
+def test_low_confidence_results_are_not_cached(fake_llm):
+    fake_llm.conf = settings.retry_threshold / 2
+    summary, conf, retried = llm.summarize_with_retry("hard text", 30)
+    assert retried and conf < settings.retry_threshold
+    llm.summarize_with_retry("hard text", 30)
+    assert fake_llm.calls == 4  # normal + strict, twice
+    assert SUMMARY_CACHE.stats()["entries"] == 0
+
+
+def test_summary_cache_ttl_and_lru():
+    cache = SummaryCache(max_entries=2, ttl=60)
+    for i in range(3):
+        cache.get_or_compute(bytes([i]), lambda i=i: (f"s{i}", 0.9, False), 0.5)
+    assert cache.get(bytes([0])) is None  # evicted (LRU)
+    assert cache.get(bytes([2])) == ("s2", 0.9)
+
+    expired = SummaryCache(max_entries=2, ttl=-1)
+    expired.get_or_compute(b"k", lambda: ("s", 0.9, False), 0.5)
+    assert expired.get(b"k") is None
+
+
+def test_async_single_flight_coalesces_identical_requests(monkeypatch):
+    fake = CountingLLM(delay=0.05)
+    monkeypatch.setattr(llm, "get_llm", lambda: fake)
+
+    async def burst():
+        return await asyncio.gather(*(llm.asummarize_with_retry("burst", 30) for _ in range(5)))
+
+    results = asyncio.run(burst())
+    assert fake.calls == 1
+    assert len(set(results)) == 1
+    assert SUMMARY_CACHE.stats()["coalesced"] == 4
+
+
+def test_sync_single_flight_across_threads(monkeypatch):
+    fake = CountingLLM(delay=0.1)
+    monkeypatch.setattr(llm, "get_llm", lambda: fake)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(llm.summarize_with_retry("t", 30)))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake.calls == 1
+    assert len(results) == 4 and len(set(results)) == 1
+
+
+def test_single_flight_propagates_errors():
+    cache = SummaryCache()
+
+    def boom():
+        raise ValueError("provider down")
+
+    with pytest.raises(ValueError, match="provider down"):
+        cache.get_or_compute(b"k", boom, 0.5)
+    # the failed flight is not left behind
+    assert cache.get_or_compute(b"k", lambda: ("ok", 0.9, False), 0.5) == ("ok", 0.9, False)
+
+
+def test_async_single_flight_survives_leader_cancellation():
+    cache = SummaryCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0 if len(calls) > 1 else 10)
+        return ("ok", 0.9, False)
+
+    async def main():
+        leader = asyncio.ensure_future(cache.aget_or_compute(b"k", compute, 0.5))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.aget_or_compute(b"k", compute, 0.5))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    # the follower takes over the flight instead of inheriting the cancellation
+    assert asyncio.run(main()) == ("ok", 0.9, False)
+    assert len(calls) == 2
+
+
+def test_summary_extractor_decodes_split_json_deltas():
+    ex = llm._SummaryExtractor()
+    deltas = ['{"sum', 'mary": "caf', "\\u00", 'e9 says \\"hi', '\\"", "confidence": 0.7}']
+    assert "".join(ex.feed(d) for d in deltas) == 'café says "hi"'
+    assert llm._parse_summary(ex.text, 80) == ('café says "hi"', 0.7)
+
+    plain = llm._SummaryExtractor()
+    assert plain.feed("Just ") + plain.feed("text") == "Just text"
+
+
+def test_astream_summary_tokens_then_final_and_cache():
+    async def collect(text):
+        return [e async for e in llm.astream_summary(text, 20)]
+
+    events = asyncio.run(collect("Streaming keeps time to first byte low."))
+    tokens = "".join(d["text"] for e, d in events if e == "token")
+    assert [e for e, _ in events].count("summary") == 1 and events[-1][0] == "summary"
+    assert tokens == events[-1][1]["summary"] == "Streaming keeps time to first byte low."
+    assert events[-1][1]["confidence"] == 0.85
+    # replayed from the summary cache as a single token
+    again = asyncio.run(collect("Streaming keeps time to first byte low."))
+    assert again == [("token", {"text": tokens}), events[-1]]
+
+
+class ModeLLM:
+    """Fake provider with per-mode (delay, confidence); records started/cancelled calls."""
+
+    def __init__(self, normal, strict):
+        self.modes = {False: normal, True: strict}
+        self.started, self.cancelled = [], []
+
+    def summarize(self, text, max_words=80, strict=False):
+        self.started.append(strict)
+        delay, conf = self.modes[strict]
+        time.sleep(delay)
+        return ("strict" if strict else "normal"), conf
+
+    async def asummarize(self, text, max_words=80, strict=False):
+        self.started.append(strict)
+        delay, conf = self.modes[strict]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(strict)
+            raise
+        return ("strict" if strict else "normal"), conf
+
+    async def astream(self, text, max_words=80, strict=False):
+        summary, conf = await self.asummarize(text, max_words, strict)
+        yield f'{{"summary": "{summary}", "confidence": {conf}}}'
+
+
+@pytest.fixture
+def strategy(monkeypatch):
+    from app.summarize.retry import LATENCY
+
+    LATENCY.clear()
+    monkeypatch.setattr(settings, "retry_threshold", 0.6)
+
+    def use(name, normal, strict, **overrides):
+        fake = ModeLLM(normal, strict)
+        monkeypatch.setattr(llm, "get_llm", lambda: fake)
+        monkeypatch.setattr(settings, "retry_strategy", name)
+        for key, value in overrides.items():
+            monkeypatch.setattr(settings, key, value)
+        return fake
+
+    return use
+
+
+def test_parallel_strategy_takes_first_good_answer_and_cancels_loser(strategy):
+    fake = strategy("parallel", normal=(0.5, 0.3), strict=(0.01, 0.9))
+    t0 = time.monotonic()
+    assert asyncio.run(llm.asummarize_with_retry("p", 30)) == ("strict", 0.9, True)
+    assert time.monotonic() - t0 < 0.4
+    assert sorted(fake.started) == [False, True] and fake.cancelled == [False]
+
+
+def test_parallel_strategy_keeps_better_of_two_low_answers_sync(strategy):
+    strategy("parallel", normal=(0.01, 0.3), strict=(0.05, 0.5))
+    assert llm.summarize_with_retry("p", 30) == ("strict", 0.5, True)
+
+
+def test_hedged_strategy_starts_strict_after_delay(strategy):
+    fake = strategy("hedged", normal=(0.5, 0.9), strict=(0.01, 0.8), hedge_initial_delay=0.02)
+    assert asyncio.run(llm.asummarize_with_retry("h", 30)) == ("strict", 0.8, True)
+    assert fake.cancelled == [False]
+    # a fast first answer never hedges
+    fast = strategy("hedged", normal=(0.0, 0.9), strict=(0.0, 0.8), hedge_initial_delay=0.2)
+    assert llm.summarize_with_retry("h2", 30) == ("normal", 0.9, False)
+    assert fast.started == [False]
+    # sync: the strict call is hedged on the pool while the first one blocks the caller
+    slow = strategy("hedged", normal=(0.2, 0.3), strict=(0.01, 0.8), hedge_initial_delay=0.02)
+    assert llm.summarize_with_retry("h3", 30) == ("strict", 0.8, True)
+    assert slow.started == [False, True]
+
+
+def test_sequential_strategy_deadline(strategy):
+    fake = strategy("sequential", normal=(0.5, 0.9), strict=(0.0, 0.9))
+    with pytest.raises(TimeoutError):
+        asyncio.run(llm.asummarize_with_retry("slow", 30, deadline=0.05))
+    assert fake.started == [False] and fake.cancelled == [False]
+    # the strict retry is cut off at the deadline; the first answer is kept
+    strategy("sequential", normal=(0.0, 0.3), strict=(0.5, 0.9))
+    assert asyncio.run(llm.asummarize_with_retry("late", 30, deadline=0.1)) == ("normal", 0.3, True)
+
+
+def test_sync_runner_calls_inline_under_concurrency():
+    from app.summarize.retry import run_with_retry
+
+    threads = []
+
+    def call(strict):
+        threads.append((threading.current_thread(), strict))
+        time.sleep(0.3)
+        return "ok", 0.9
+
+    results, errors = [], []
+
+    def request():
+        try:
+            results.append(run_with_retry(call, "sequential", 0.6, deadline=1.0))
+        except Exception as e:
+            errors.append(e)
+
+    # more callers than any worker pool: none of them waits for a free thread
+    callers = [threading.Thread(target=request) for _ in range(40)]
+    t0 = time.monotonic()
+    for t in callers:
+        t.start()
+    for t in callers:
+        t.join()
+    assert time.monotonic() - t0 < 1.0
+    assert errors == [] and results == [("ok", 0.9, False)] * 40
+    assert {t for t, _ in threads} == set(callers)
+
+
+def test_sync_runner_pools_only_the_extra_call(strategy):
+    from app.summarize.retry import run_with_retry
+
+    names = []
+
+    def call(strict):
+        names.append((threading.current_thread().name, strict))
+        time.sleep(0.05 if strict else 0.01)
+        return ("strict", 0.9) if strict else ("normal", 0.3)
+
+    assert run_with_retry(call, "parallel", 0.6) == ("strict", 0.9, True)
+    first = [name for name, strict in names if not strict]
+    extra = [name for name, strict in names if strict]
+    assert first == [threading.current_thread().name]
+    assert extra[0].startswith("summarize-retry")
+
+
+def test_astream_summary_follows_retry_strategy_and_metrics(strategy):
+    from app.metrics.registry import SUMMARIZE_SECONDS
+
+    async def collect(text, **kwargs):
+        return [e async for e in llm.astream_summary(text, 30, **kwargs)]
+
+    def observed():
+        return sum(SUMMARIZE_SECONDS.labels("true").snapshot()[0])
+
+    before = observed()
+    fake = strategy("hedged", normal=(0.5, 0.9), strict=(0.01, 0.8), hedge_initial_delay=0.02)
+    events = asyncio.run(collect("h"))
+    # the hedged strict answer wins; the slow stream is cancelled and never sent a token
+    assert events == [
+        ("token", {"text": "strict"}),
+        ("summary", {"summary": "strict", "confidence": 0.8, "retried": True}),
+    ]
+    assert fake.cancelled == [False]
+    assert observed() == before + 1
+    strategy("sequential", normal=(0.5, 0.9), strict=(0.0, 0.9))
+    with pytest.raises(TimeoutError):
+        asyncio.run(collect("slow", deadline=0.05))
+
+
+def test_latency_tracker_percentile():
+    from app.summarize.retry import LatencyTracker
+
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(95) is None
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    assert tracker.percentile(50) == pytest.approx(0.05, abs=0.001)
+    assert tracker.percentile(95) == pytest.approx(0.095, abs=0.001)
@@ -0,0 +1,70 @@
+"""
+Recall@k vs latency of the IVF index against the exact path.
+
+Runs offline on deterministic embed_mock vectors:
+    python -m benchmarks.ann_recall --docs 100000 --nprobe 1,4,16,64
+Prints one JSON object per configuration (exact first).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.rag.embeddings import embed_mock_batch
+from app.rag.index import VectorIndex
+from app.rag.ivf import IVFIndex
+
+
+def _timed_search(index, queries, k, nprobe=None):
+    hits, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits.append({doc_id for doc_id, _ in index.search(q, k, nprobe=nprobe)})
+        lat.append(time.perf_counter() - t0)
+    return hits, np.array(lat) * 1000.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--docs", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nlist", type=int, default=256)
+    ap.add_argument("--nprobe", default="1,2,4,8,16,32,64")
+    args = ap.parse_args()
+
+    ids = [f"doc-{i}" for i in range(args.docs)]
+    vecs = np.asarray(embed_mock_batch([f"document {i}" for i in range(args.docs)]), np.float32)
+    queries = np.asarray(embed_mock_batch([f"query {i}" for i in range(args.queries)]), np.float32)
+
+    exact = VectorIndex()
+    exact.add_many(ids, vecs)
+    ivf = IVFIndex(nlist=args.nlist, min_train=args.docs + 1)  # train by hand, timed
+    ivf.add_many(ids, vecs)
+    t0 = time.perf_counter()
+    ivf.train()
+    train_s = time.perf_counter() - t0
+
+    truth, lat = _timed_search(exact, queries, args.k)
+    base = {"docs": args.docs, "k": args.k}
+    print(json.dumps({**base, "index": "exact", "recall": 1.0, **_latency(lat)}))
+    for nprobe in (int(p) for p in args.nprobe.split(",")):
+        found, lat = _timed_search(ivf, queries, args.k, nprobe=nprobe)
+        recall = round(float(np.mean([len(f & t) / args.k for f, t in zip(found, truth)])), 4)
+        row = {**base, "index": "ivf", "nlist": args.nlist, "nprobe": nprobe}
+        print(json.dumps({**row, "train_s": round(train_s, 3), "recall": recall, **_latency(lat)}))
+
+
+def _latency(lat_ms: np.ndarray) -> dict:
+    return {
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 4),
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Throughput and latency of the store, embedding and agent hot paths.
+
+Runs offline (embed_mock vectors, DummyLLM answers):
+    python -m benchmarks.hot_paths --sizes 1000,10000 --out results.json
+    python -m benchmarks.hot_paths --baseline benchmarks/baseline.json
+Prints one JSON object per measurement. With --baseline, exits 1 when a
+measurement's p50_ms or ops_per_s is worse than the baseline by more than
+--tolerance (p99 is reported but too noisy to gate on).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from app.agents.agent import Agent
+from app.agents.tools import REGISTRY
+from app.rag.embeddings import embed_mock
+from app.rag.store import DocumentStore
+from app.summarize.config import settings
+
+TOPICS = ["vectors", "latency", "retrieval", "agents", "caching", "storage", "streaming", "shards"]
+
+
+def _texts(n: int, start: int = 0) -> List[str]:
+    return [
+        f"document {i} covers {TOPICS[i % len(TOPICS)]} and {TOPICS[(i * 7) % len(TOPICS)]}"
+        for i in range(start, start + n)
+    ]
+
+
+def _stats(lat_s: Sequence[float], ops: int, total_s: float) -> Dict[str, float]:
+    lat_ms = np.asarray(lat_s) * 1000.0
+    return {
+        "ops_per_s": round(ops / total_s, 2) if total_s > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 4),
+    }
+
+
+def _timed(fn: Callable[[int], object], n: int) -> Dict[str, float]:
+    lat = []
+    t0 = time.perf_counter()
+    for i in range(n):
+        s = time.perf_counter()
+        fn(i)
+        lat.append(time.perf_counter() - s)
+    return _stats(lat, n, time.perf_counter() - t0)
+
+
+def bench_store(size: int, queries: int) -> List[Dict]:
+    store = DocumentStore()
+    t0 = time.perf_counter()
+    for start in range(0, size, 10_000):
+        store.add_many(_texts(min(10_000, size - start), start))
+    bulk_s = time.perf_counter() - t0
+    extra = _texts(queries, size)
+    rows = [{"name": "store.add_many", "docs": size, "ops_per_s": round(size / bulk_s, 2)}]
+    rows.append(
+        {"name": "store.add", "docs": size, **_timed(lambda i: store.add(extra[i]), queries)}
+    )
+    rows.append(
+        {
+            "name": "store.query",
+            "docs": size,
+            **_timed(lambda i: store.query(TOPICS[i % len(TOPICS)], limit=3), queries),
+        }
+    )
+    rows.append(
+        {
+            "name": "store.query_vector",
+            "docs": size,
+            **_timed(lambda i: store.query_vector(f"question {i} about vectors", limit=3), queries),
+        }
+    )
+    return rows
+
+
+def bench_embed(n: int) -> List[Dict]:
+    texts = _texts(n)
+    stats = _timed(lambda i: embed_mock(texts[i]), n)
+    return [{"name": "embed_mock", **stats, "us_per_text": round(1e6 / stats["ops_per_s"], 2)}]
+
+
+def bench_agent(n: int) -> List[Dict]:
+    agent = Agent(REGISTRY)
+    texts = {"ping": "ping", "echo": "echo: hello", "calculator": "12*(3+1)"}
+    return [
+        {"name": "agent.run", "tool": tool, **_timed(lambda i, t=text: agent.run(t), n)}
+        for tool, text in texts.items()
+    ]
+
+
+def bench_http(requests: int, concurrency: int, docs: int) -> List[Dict]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.rag.store import STORE
+
+    STORE.clear()
+    STORE.add_many(_texts(docs))
+    calls = {
+        "/rag/query_vector": lambda c, i: c.post(
+            "/rag/query_vector", json={"query": f"question {i} about latency", "limit": 3}
+        ),
+        "/rag/query": lambda c, i: c.post(
+            "/rag/query", json={"query": TOPICS[i % len(TOPICS)], "limit": 3}
+        ),
+        "/agent": lambda c, i: c.post("/agent", json={"text": f"{i}*(3+1)"}),
+        "/agent rag_answer": lambda c, i: c.post("/agent", json={"text": "rag_answer: caching"}),
+    }
+    rows = []
+    with TestClient(app) as client:
+        for name, call in calls.items():
+
+            def one(i: int, call=call) -> float:
+                s = time.perf_counter()
+                r = call(client, i)
+                r.raise_for_status()
+                return time.perf_counter() - s
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                lat = list(pool.map(one, range(requests)))
+            stats = _stats(lat, requests, time.perf_counter() - t0)
+            rows.append({"name": f"http {name}", "concurrency": concurrency, "docs": docs, **stats})
+    STORE.clear()
+    return rows
+
+
+def _key(row: Dict) -> str:
+    # a measurement is identified by everything except its numbers
+    fields = ("name", "docs", "tool", "concurrency")
+    return "|".join(f"{f}={row[f]}" for f in fields if f in row)
+
+
+def regressions(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Human-readable regressions of results against baseline (measurements in both only)."""
+    base = {_key(row): row for row in baseline}
+    out = []
+    for row in results:
+        ref = base.get(_key(row))
+        if ref is None:
+            continue
+        if "p50_ms" in ref and row["p50_ms"] > ref["p50_ms"] * (1 + tolerance):
+            out.append(f"{_key(row)}: p50_ms {row['p50_ms']} > {ref['p50_ms']} (baseline)")
+        if ref.get("ops_per_s") and row["ops_per_s"] < ref["ops_per_s"] / (1 + tolerance):
+            out.append(f"{_key(row)}: ops_per_s {row['ops_per_s']} < {ref['ops_per_s']} (baseline)")
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", default="1000,10000,100000,1000000")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--http-docs", type=int, default=10_000)
+    ap.add_argument("--out", help="write all results as one JSON document")
+    ap.add_argument("--baseline", help="JSON document from --out to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.5)
+    args = ap.parse_args()
+    settings.llm_provider = "dummy"  # offline: mock embeddings, DummyLLM answers
+
+    results: List[Dict] = []
+
+    def emit(rows: List[Dict]) -> None:
+        for row in rows:
+            print(json.dumps(row), flush=True)
+        results.extend(rows)
+
+    emit(bench_embed(5_000))
+    emit(bench_agent(5_000))
+    for size in (int(s) for s in args.sizes.split(",")):
+        emit(bench_store(size, args.queries))
+    emit(bench_http(args.requests, args.concurrency, args.http_docs))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump({"results": results}, fh, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)["results"]
+        failed = regressions(results, baseline, args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Memory and recall impact of quantized vector storage (float32 / float16 / int8).
+
+Runs offline on deterministic embed_mock vectors:
+    python -m benchmarks.quant_recall --docs 100000 --dim 128
+Prints one JSON object per precision with bytes/doc, recall@k vs float32 and latency.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.rag.embeddings import embed_mock_batch
+from app.rag.index import VectorIndex
+from app.rag.quant import PRECISIONS
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--docs", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--rescore", type=int, default=4)
+    args = ap.parse_args()
+
+    ids = [f"doc-{i}" for i in range(args.docs)]
+    texts = [f"document {i}" for i in range(args.docs)]
+    vecs = np.asarray(embed_mock_batch(texts, dim=args.dim), np.float32)
+    queries = np.asarray(
+        embed_mock_batch([f"query {i}" for i in range(args.queries)], dim=args.dim), np.float32
+    )
+
+    truth = None
+    for precision in PRECISIONS:
+        index = VectorIndex(precision=precision, rescore=args.rescore)
+        index.add_many(ids, vecs)
+        found, lat = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            found.append({doc_id for doc_id, _ in index.search(q, args.k)})
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        if truth is None:
+            truth = found
+        recall = float(np.mean([len(f & t) / args.k for f, t in zip(found, truth)]))
+        row = {
+            "precision": precision,
+            "docs": args.docs,
+            "dim": args.dim,
+            "bytes_per_doc": index.nbytes / args.docs,
+            "recall": round(recall, 4),
+            "p50_ms": round(float(np.percentile(lat, 50)), 4),
+            "p99_ms": round(float(np.percentile(lat, 99)), 4),
+        }
+        print(json.dumps(row))
+        index.clear()
+
+
+if __name__ == "__main__":
+    main()